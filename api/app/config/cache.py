@@ -0,0 +1,26 @@
+import os
+
+# Embeddings cache, entries are kept in redis (hot tier) and demoted to minio (cold tier) when evicted
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_MAX_HOT_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_HOT_ENTRIES", 200_000))
+EMBEDDING_CACHE_COLD_PREFIX = os.getenv("EMBEDDING_CACHE_COLD_PREFIX", "embedding-cache")
+# Seconds the embeddings are kept in minio after their demotion
+EMBEDDING_CACHE_COLD_TTL = int(os.getenv("EMBEDDING_CACHE_COLD_TTL", 90 * 24 * 3600))
+
+# LLM reliability results, kept in redis by (model, prompt version, text hash)
+FIAB_CACHE_TTL = int(os.getenv("FIAB_CACHE_TTL", 30 * 24 * 3600))
+
+# Embeddings of the chat questions, kept in memory and in redis by (model, normalized text hash) for a limited time
+QUERY_EMBEDDING_CACHE_ENABLED = os.getenv("QUERY_EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", 10_000))
+QUERY_EMBEDDING_CACHE_TTL = int(os.getenv("QUERY_EMBEDDING_CACHE_TTL", 24 * 3600))
+# Questions missing from the caches within this window (in milliseconds) are embedded with a single request
+QUERY_EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("QUERY_EMBEDDING_BATCH_WINDOW_MS", 5))
+QUERY_EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("QUERY_EMBEDDING_BATCH_MAX_SIZE", 64))
+
+# Answers of the chat in 'collection' mode, kept in a qdrant collection and served again to similar questions
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "false").lower() == "true"
+ANSWER_CACHE_COLLECTION_NAME = os.getenv("ANSWER_CACHE_COLLECTION_NAME", "answer-cache")
+# Minimum cosine similarity between two questions for the answer of the first one to be served to the second one
+ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", 0.95))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", 7 * 24 * 3600))
@@ -0,0 +1,11 @@
+import os
+
+# Identical questions (same index, workflow and normalized message) asked while an answer is being generated
+# subscribe to that generation instead of starting their own
+CHAT_SINGLE_FLIGHT_ENABLED = os.getenv("CHAT_SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+# Maximum duration of a generation in seconds, after which identical questions start a new one
+CHAT_SINGLE_FLIGHT_TTL = int(os.getenv("CHAT_SINGLE_FLIGHT_TTL", 300))
+# Seconds a subscribed question waits for the next event of the generation before giving up
+CHAT_SINGLE_FLIGHT_TIMEOUT = int(os.getenv("CHAT_SINGLE_FLIGHT_TIMEOUT", 60))
+# Seconds the events of a generation are kept in redis once it is finished
+CHAT_SINGLE_FLIGHT_RETENTION = int(os.getenv("CHAT_SINGLE_FLIGHT_RETENTION", 60))
@@ -0,0 +1,10 @@
+import os
+
+# Threads dedicated to each kind of blocking call made from the API event loop, so that a large upload cannot starve
+# the other requests
+OBJECT_STORAGE_WORKERS = int(os.getenv("OBJECT_STORAGE_WORKERS", 8))
+VECTOR_STORE_WORKERS = int(os.getenv("VECTOR_STORE_WORKERS", 8))
+REDIS_WORKERS = int(os.getenv("REDIS_WORKERS", 8))
+
+# Number of files ingested at once by an API process, the other ones wait for a slot
+INGESTION_CONCURRENCY = int(os.getenv("INGESTION_CONCURRENCY", 4))
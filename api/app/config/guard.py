@@ -0,0 +1,10 @@
+import os
+
+# Number of threads dedicated to the llm_guard scans, shared by the chat messages and the ingested documents
+GUARD_WORKERS = int(os.getenv("GUARD_WORKERS", 4))
+
+# Number of verdicts kept in memory per guard, keyed by the hash of the scanned text
+GUARD_CACHE_SIZE = int(os.getenv("GUARD_CACHE_SIZE", 100_000))
+
+# Maximum number of tokens of a chat message
+GUARD_MESSAGE_TOKEN_LIMIT = int(os.getenv("GUARD_MESSAGE_TOKEN_LIMIT", 512))
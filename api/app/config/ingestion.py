@@ -0,0 +1,44 @@
+import os
+
+# Number of worker processes dedicated to documents parsing
+PARSING_WORKERS = int(os.getenv("PARSING_WORKERS", os.cpu_count() or 1))
+
+# Whether the .txt and .md files are chunked natively instead of with unstructured
+NATIVE_TEXT_CHUNKER = os.getenv("NATIVE_TEXT_CHUNKER", "true").lower() == "true"
+
+# Number of pages parsed at once when streaming a pdf, 0 parses the whole pdf at once
+PDF_STREAMING_WINDOW = int(os.getenv("PDF_STREAMING_WINDOW", 20))
+
+# Embedding requests: batches are packed by number of tokens and several of them are sent concurrently
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", 16384))
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", 100))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", 4))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", 6))
+
+# Preprocessed files are read by blocks of bytes (csv) or batches of rows (parquet), each one being recorded while
+# the next one is read
+PREPROCESSED_CSV_BLOCK_SIZE = int(os.getenv("PREPROCESSED_CSV_BLOCK_SIZE", 4 * 1024 * 1024))
+PREPROCESSED_PARQUET_BATCH_SIZE = int(os.getenv("PREPROCESSED_PARQUET_BATCH_SIZE", 2048))
+
+# Qdrant upserts: points are sent by batches, several batches being in flight at once
+QDRANT_UPSERT_BATCH_SIZE = int(os.getenv("QDRANT_UPSERT_BATCH_SIZE", 100))
+QDRANT_UPSERT_CONCURRENCY = int(os.getenv("QDRANT_UPSERT_CONCURRENCY", 4))
+
+# Maximum number of LLM reliability requests in flight per document
+FIAB_CONCURRENCY = int(os.getenv("FIAB_CONCURRENCY", 8))
+
+# 'inline' applies the LLM reliability during the ingestion, 'deferred' indexes the raw chunks right away
+# and lets the background reliability worker upgrade them afterwards
+FIAB_MODE = os.getenv("FIAB_MODE", "inline").lower()
+FIAB_WORKER_BATCH_SIZE = int(os.getenv("FIAB_WORKER_BATCH_SIZE", 32))
+# Seconds the background reliability worker waits when there is nothing to process
+FIAB_WORKER_INTERVAL = int(os.getenv("FIAB_WORKER_INTERVAL", 10))
+# Attempts of the background reliability worker on a chunk, the chunk then keeps its raw text
+FIAB_WORKER_MAX_ATTEMPTS = int(os.getenv("FIAB_WORKER_MAX_ATTEMPTS", 3))
+
+# Directories searched for the hunspell dictionaries (.dic / .aff) loaded by the vocabulary scorer
+VOCABULARY_DICTIONARY_DIRS = os.getenv(
+    "VOCABULARY_DICTIONARY_DIRS", "/usr/share/hunspell:/usr/share/myspell/dicts:/usr/share/myspell"
+).split(":")
+# Number of word verdicts memoized by the vocabulary scorer
+VOCABULARY_CACHE_SIZE = int(os.getenv("VOCABULARY_CACHE_SIZE", 500_000))
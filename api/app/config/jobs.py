@@ -0,0 +1,14 @@
+import os
+
+# 'inline' ingests the uploaded files in the upload request, 'queue' enqueues an ingestion job per file in redis,
+# the jobs being executed by the ingestion workers (python -m app.worker)
+INGESTION_MODE = os.getenv("INGESTION_MODE", "inline").lower()
+
+# Number of attempts of a job before it is marked as failed
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", 3))
+# Seconds after which a job whose worker stopped sending heartbeats is put back in the queue
+JOBS_LEASE_TIMEOUT = int(os.getenv("JOBS_LEASE_TIMEOUT", 120))
+# Seconds the jobs are kept in redis once finished
+JOBS_TTL = int(os.getenv("JOBS_TTL", 7 * 24 * 3600))
+# Number of jobs executed concurrently by a worker process
+JOBS_WORKER_CONCURRENCY = int(os.getenv("JOBS_WORKER_CONCURRENCY", 2))
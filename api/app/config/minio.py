@@ -11,3 +11,25 @@ client = Minio(
 )
 
 COLLECTIONS_BUCKET_NAME = os.getenv("MINIO_COLLECTIONS_BUCKET_NAME")
+
+# Files of at least MINIO_MULTIPART_THRESHOLD bytes are uploaded in parts of MINIO_PART_SIZE bytes (5 MiB minimum)
+MINIO_MULTIPART_THRESHOLD = int(os.getenv("MINIO_MULTIPART_THRESHOLD", 32 * 1024 * 1024))
+MINIO_PART_SIZE = max(int(os.getenv("MINIO_PART_SIZE", 16 * 1024 * 1024)), 5 * 1024 * 1024)
+# Number of parts uploaded at once by the process, all uploads together
+MINIO_UPLOAD_CONCURRENCY = int(os.getenv("MINIO_UPLOAD_CONCURRENCY", 8))
+
+# `stream` serves the downloads through the API, `presigned` redirects the client to a presigned minio url
+MINIO_DOWNLOAD_MODE = os.getenv("MINIO_DOWNLOAD_MODE", "stream")
+# Size in bytes of the chunks streamed to the client
+MINIO_DOWNLOAD_CHUNK_SIZE = int(os.getenv("MINIO_DOWNLOAD_CHUNK_SIZE", 1024 * 1024))
+# Seconds the presigned urls are valid
+MINIO_PRESIGNED_URL_EXPIRY = int(os.getenv("MINIO_PRESIGNED_URL_EXPIRY", 300))
+
+# The presigned urls are signed for the endpoint reached by the clients, which may differ from the one of the API
+presign_client = Minio(
+    endpoint=os.getenv("MINIO_PUBLIC_ENDPOINT", os.getenv("MINIO_ENDPOINT")),
+    access_key=os.getenv("MINIO_ACCESS_KEY"),
+    secret_key=os.getenv("MINIO_SECRET_KEY"),
+    region="fr",
+    secure=os.getenv("MINIO_PUBLIC_SECURE", "false").lower() == "true",
+)
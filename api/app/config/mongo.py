@@ -4,6 +4,7 @@ from logging import info
 from beanie import init_beanie
 from motor.motor_asyncio import AsyncIOMotorClient
 
+from app.models.documents.blob import Blob
 from app.models.documents.collection import Collection
 from app.models.documents.user_feedback import UserFeedback
 
@@ -17,7 +18,7 @@ db = client.get_database(os.getenv('MONGODB_DATABASE_NAME'))
 async def init():
     # Fixme: ensure connexion is ready before starting the app
     # We initialize Beanie to use the database and the models of our app
-    await init_beanie(database=db, document_models=[Collection, UserFeedback])
+    await init_beanie(database=db, document_models=[Blob, Collection, UserFeedback])
 
     # We test the database connection
     ping_response = await db.command("ping")
@@ -1,24 +1,40 @@
 import os
 
-from openai import AsyncOpenAI
+from openai import AsyncAzureOpenAI, AsyncOpenAI
 from openai import AzureOpenAI, OpenAI
 
+
+def create_async_client() -> AsyncOpenAI:
+    """Creates an async client
+
+    The connections of an async client are bound to the event loop that opened them, code running its own
+    event loop (ingestion threads, ...) must use its own client
+
+    Returns:
+        AsyncOpenAI: The async client, an Azure one like the sync client when OPENAI_API_BASE is set
+    """
+    if os.environ.get("OPENAI_API_BASE"):
+        return AsyncAzureOpenAI(
+            api_key=os.environ.get("OPENAI_API_KEY"),
+            azure_endpoint=os.environ.get("OPENAI_API_BASE"),
+            api_version=os.environ.get("OPENAI_API_VERSION"),
+        )
+    return AsyncOpenAI(
+        api_key=os.environ.get("OPENAI_API_KEY")
+    )
+
+
 if os.environ.get("OPENAI_API_BASE"):
     client = AzureOpenAI(
         api_key=os.environ.get("OPENAI_API_KEY"),
         azure_endpoint=os.environ.get("OPENAI_API_BASE"),
         api_version=os.environ.get("OPENAI_API_VERSION"),
     )
-    async_client = AsyncOpenAI(
-        api_key=os.environ.get("OPENAI_API_KEY"),
-        base_url=os.environ.get("OPENAI_API_BASE"),
-    )
     OPENAI_TYPE="azure"
 else:
     client = OpenAI(
         api_key=os.environ.get("OPENAI_API_KEY")
     )
-    async_client = AsyncOpenAI(
-        api_key=os.environ.get("OPENAI_API_KEY")
-    )
     OPENAI_TYPE="openai"
+
+async_client = create_async_client()
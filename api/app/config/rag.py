@@ -7,3 +7,10 @@ MODELS = {
     "llm_model" : os.getenv("MODELS_LLM")
 }
 PRECISION = os.getenv("RAG_PRECISION")
+
+# Context assembly between retrieval and synthesis: the retrieved chunks whose score is below this ratio of the best
+# score are dropped, 0 keeps them all
+CONTEXT_MIN_SCORE_RATIO = float(os.getenv("CONTEXT_MIN_SCORE_RATIO", 0.7))
+# Minimum and maximum length, in characters, of the span repeated between two chunks of the same file to be removed
+CONTEXT_MIN_OVERLAP = int(os.getenv("CONTEXT_MIN_OVERLAP", 32))
+CONTEXT_MAX_OVERLAP = int(os.getenv("CONTEXT_MAX_OVERLAP", 512))
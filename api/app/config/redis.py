@@ -1,3 +1,8 @@
 from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
 
 client = Redis(host="redis-service", decode_responses=True)
+# Client for raw bytes values (embeddings, ...) that must not be decoded
+binary_client = Redis(host="redis-service")
+# Client of the event loop of the API, for the long blocking reads (streams, ...) that would hold a thread
+async_client = AsyncRedis(host="redis-service", decode_responses=True)
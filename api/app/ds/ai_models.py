@@ -10,28 +10,30 @@ class CustomOpenAIEmbedding(BaseEmbedding):
     Args:
         model_name(str) : name of embedding model
         openai_client : client to connect to openai API (self-hosted model)
+        async_openai_client (optional) : async client to connect to openai API, used by the async methods
+            instead of the client when it is given
     """
 
     _model_name: str = PrivateAttr()
     _openai_client = PrivateAttr()
+    _async_openai_client = PrivateAttr()
 
     def __init__(
         self,
         openai_client,
         model_name: str,
+        async_openai_client=None,
         **kwargs: Any,
     ) -> None:
         self._model_name = model_name
         self._openai_client = openai_client
+        self._async_openai_client = async_openai_client
         super().__init__(**kwargs)
 
     @classmethod
     def class_name(cls) -> str:
         return "CustomOpenAIEmbedding"
 
-    async def _aget_query_embedding(self, query: str) -> List[float]:
-        return self._get_query_embedding(query)
-
     def _get_query_embedding(self, query: str) -> List[float]:
         embeddings = self._openai_client.embeddings.create(
             input=query, model=self._model_name  # model = "deployment_name".
@@ -52,7 +54,12 @@ class CustomOpenAIEmbedding(BaseEmbedding):
         return embs
 
     async def _aget_query_embedding(self, query: str) -> List[float]:
-        return self._get_query_embedding(query)
+        return await self._aget_text_embedding(query)
 
     async def _aget_text_embedding(self, text: str) -> List[float]:
-        return self._get_text_embedding(text)
+        if self._async_openai_client is None:
+            return self._get_text_embedding(text)
+        embeddings = await self._async_openai_client.embeddings.create(
+            input=text, model=self._model_name  # model = "deployment_name".
+        )
+        return embeddings.data[0].embedding
@@ -0,0 +1,262 @@
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from qdrant_client.http import models
+
+from app.config.cache import (
+    ANSWER_CACHE_COLLECTION_NAME,
+    ANSWER_CACHE_ENABLED,
+    ANSWER_CACHE_SIMILARITY_THRESHOLD,
+    ANSWER_CACHE_TTL,
+)
+from app.config.logger import logger
+from app.config.qdrant import async_client as async_qdrant_client, client as qdrant_client
+from app.config.redis import client as redis_client
+from app.utils.executors import redis_executor, run_in_executor
+
+
+def version_key(index: str) -> str:
+    return f"answer-cache:version:{index}"
+
+
+def get_index_version(index: str) -> int:
+    """Returns the version of the content of an index, bumped each time files are added to it or removed from it
+
+    Args:
+        index (str): The collection id
+
+    Returns:
+        int: The version, 0 if the index never changed
+    """
+    return int(redis_client.get(version_key(index)) or 0)
+
+
+async def get_index_version_async(index: str) -> Optional[int]:
+    """Returns the version of the content of an index | async version
+
+    Args:
+        index (str): The collection id
+
+    Returns:
+        Optional[int]: The version, None if it cannot be read, the answer cache must then be bypassed
+    """
+    try:
+        return await run_in_executor(redis_executor, get_index_version, index)
+    except Exception as e:
+        logger.warning(f"Answer cache unavailable, the version of the index {index} cannot be read: {e}")
+        return None
+
+
+def bump_index_version(index: str):
+    """Bumps the version of the content of an index, the answers cached for the previous versions are no longer served
+
+    The answers of the previous versions are then removed. Errors are logged, they must not fail the ingestion.
+
+    Args:
+        index (str): The collection id
+    """
+    try:
+        version = redis_client.incr(version_key(index))
+    except Exception as e:
+        logger.error(f"Error while bumping the answer cache version of the index {index}: {e}")
+        return
+    try:
+        if qdrant_client.collection_exists(ANSWER_CACHE_COLLECTION_NAME):
+            qdrant_client.delete(
+                collection_name=ANSWER_CACHE_COLLECTION_NAME,
+                points_selector=models.FilterSelector(
+                    filter=models.Filter(
+                        must=[
+                            models.FieldCondition(key="index", match=models.MatchValue(value=str(index))),
+                            models.FieldCondition(key="version", range=models.Range(lt=version)),
+                        ]
+                    )
+                ),
+            )
+    except Exception as e:
+        logger.warning(f"Error while removing the outdated answers of the index {index}: {e}")
+
+
+async def bump_index_version_async(index: str):
+    """Bumps the version of the content of an index | async version
+
+    Args:
+        index (str): The collection id
+    """
+    await run_in_executor(redis_executor, bump_index_version, index)
+
+
+class AnswerCache:
+    """Semantic cache of the chat answers, keyed by (index, index version, workflow, models, question embedding)
+
+    The answers are stored with their sources in a qdrant collection, a question is answered from the cache when
+    a question of the same index version was asked with a cosine similarity above `similarity_threshold` less than
+    `ttl` seconds ago. Any cache failure is logged and treated as a miss.
+
+    Args:
+        enabled (bool): Whether the cache is used at all
+        collection_name (str): The qdrant collection of the answers, created on the first answer
+        similarity_threshold (float): Minimum cosine similarity between the questions
+        ttl (int): Lifetime of the answers, in seconds
+    """
+
+    def __init__(self, enabled: bool, collection_name: str, similarity_threshold: float, ttl: int) -> None:
+        self.enabled = enabled
+        self.collection_name = collection_name
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self._collection_ready = False
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+        }
+
+    @staticmethod
+    def _filter(index: str, version: int, workflow: str, model_names: Dict[str, str]) -> List[models.Condition]:
+        return [
+            models.FieldCondition(key="index", match=models.MatchValue(value=str(index))),
+            models.FieldCondition(key="version", match=models.MatchValue(value=version)),
+            models.FieldCondition(key="workflow", match=models.MatchValue(value=workflow.lower())),
+            models.FieldCondition(key="embed_model", match=models.MatchValue(value=model_names["embed_model"])),
+            models.FieldCondition(key="llm_model", match=models.MatchValue(value=model_names["llm_model"])),
+        ]
+
+    async def _ensure_collection(self, size: int):
+        if self._collection_ready:
+            return
+        if not await async_qdrant_client.collection_exists(self.collection_name):
+            try:
+                await async_qdrant_client.create_collection(
+                    collection_name=self.collection_name,
+                    vectors_config=models.VectorParams(size=size, distance=models.Distance.COSINE),
+                )
+                await async_qdrant_client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name="index",
+                    field_schema=models.PayloadSchemaType.KEYWORD,
+                )
+            except Exception as e:
+                # Another replica may have created it meanwhile
+                if not await async_qdrant_client.collection_exists(self.collection_name):
+                    raise e
+        self._collection_ready = True
+
+    async def get(
+        self,
+        index: str,
+        version: int,
+        workflow: str,
+        model_names: Dict[str, str],
+        embedding: List[float],
+    ) -> Optional[Dict[str, Any]]:
+        """Returns the answer to the most similar question asked for the same index version, if it is similar enough
+
+        Args:
+            index (str): The collection id
+            version (int): The version of the index
+            workflow (str): The workflow
+            model_names (Dict[str, str]): The names of the models, with the 'embed_model' and 'llm_model' keys
+            embedding (List[float]): The embedding of the question
+
+        Returns:
+            Optional[Dict[str, Any]]: The answer and its sources, None if no question is similar enough
+        """
+        if not self.enabled:
+            return None
+        try:
+            if not self._collection_ready and not await async_qdrant_client.collection_exists(self.collection_name):
+                points = []
+            else:
+                points = await async_qdrant_client.search(
+                    collection_name=self.collection_name,
+                    query_vector=embedding,
+                    query_filter=models.Filter(
+                        must=[
+                            *self._filter(index, version, workflow, model_names),
+                            models.FieldCondition(key="created_at", range=models.Range(gte=time.time() - self.ttl)),
+                        ]
+                    ),
+                    limit=1,
+                    score_threshold=self.similarity_threshold,
+                    with_payload=True,
+                )
+        except Exception as e:
+            logger.warning(f"Answer cache unavailable, the question will be answered: {e}")
+            return None
+
+        if len(points) == 0:
+            self._stats["misses"] += 1
+            return None
+        self._stats["hits"] += 1
+        logger.info(f"Answer cache hit for the index {index}, similarity {points[0].score:.3f}")
+        return {"answer": points[0].payload["answer"], "sources": points[0].payload["sources"]}
+
+    async def set(
+        self,
+        index: str,
+        version: int,
+        workflow: str,
+        model_names: Dict[str, str],
+        embedding: List[float],
+        answer: str,
+        sources: List[Dict[str, Any]],
+    ):
+        """Stores the answer to a question
+
+        Args:
+            index (str): The collection id
+            version (int): The version of the index when the question was asked
+            workflow (str): The workflow
+            model_names (Dict[str, str]): The names of the models, with the 'embed_model' and 'llm_model' keys
+            embedding (List[float]): The embedding of the question
+            answer (str): The answer
+            sources (List[Dict[str, Any]]): The sources of the answer
+        """
+        if not self.enabled:
+            return
+        try:
+            await self._ensure_collection(len(embedding))
+            await async_qdrant_client.upsert(
+                collection_name=self.collection_name,
+                points=[
+                    models.PointStruct(
+                        id=str(uuid.uuid4()),
+                        vector=embedding,
+                        payload={
+                            "index": str(index),
+                            "version": version,
+                            "workflow": workflow.lower(),
+                            "embed_model": model_names["embed_model"],
+                            "llm_model": model_names["llm_model"],
+                            "answer": answer,
+                            "sources": sources,
+                            "created_at": time.time(),
+                        },
+                    )
+                ],
+            )
+            self._stats["stores"] += 1
+        except Exception as e:
+            logger.warning(f"Error while storing the answer in the cache: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Returns the counters of the cache in this API replica
+
+        Returns:
+            Dict[str, Any]: The number of hits, misses and stored answers
+        """
+        return {
+            "enabled": self.enabled,
+            "similarity_threshold": self.similarity_threshold,
+            **self._stats,
+        }
+
+
+answer_cache = AnswerCache(
+    enabled=ANSWER_CACHE_ENABLED,
+    collection_name=ANSWER_CACHE_COLLECTION_NAME,
+    similarity_threshold=ANSWER_CACHE_SIMILARITY_THRESHOLD,
+    ttl=ANSWER_CACHE_TTL,
+)
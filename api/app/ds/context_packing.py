@@ -0,0 +1,140 @@
+from typing import List, Optional
+
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+from app.config.logger import logger
+from app.ds.embedding_batcher import count_tokens
+
+
+def drop_low_score_nodes(nodes: List[NodeWithScore], min_score_ratio: float) -> List[NodeWithScore]:
+    """Drops the nodes whose score is below a ratio of the best score
+
+    Args:
+        nodes (List[NodeWithScore]): The retrieved nodes
+        min_score_ratio (float): Minimum ratio of the best score, 0 keeps all the nodes
+
+    Returns:
+        List[NodeWithScore]: The nodes kept, in the same order
+    """
+    scores = [node.score for node in nodes if node.score is not None]
+    if min_score_ratio <= 0 or len(scores) == 0 or max(scores) <= 0:
+        return nodes
+    min_score = max(scores) * min_score_ratio
+    return [node for node in nodes if node.score is None or node.score >= min_score]
+
+
+def find_overlap(previous_text: str, text: str, min_overlap: int, max_overlap: int) -> int:
+    """Returns the length of the longest start of a text that ends the previous text
+
+    Args:
+        previous_text (str): The text that may end with the start of the text
+        text (str): The text
+        min_overlap (int): Minimum length of the overlap
+        max_overlap (int): Maximum length of the overlap
+
+    Returns:
+        int: The length of the overlap, 0 if there is none
+    """
+    for length in range(min(len(previous_text), len(text), max_overlap), min_overlap - 1, -1):
+        if previous_text.endswith(text[:length]):
+            return length
+    return 0
+
+
+def strip_overlaps(nodes: List[NodeWithScore], min_overlap: int, max_overlap: int) -> List[NodeWithScore]:
+    """Removes the spans of the chunks that repeat the start or the end of a better retrieved chunk of the same file
+
+    The chunks are produced with an overlap, the start of a chunk being the end of the previous one in the file.
+    A chunk is only compared with the chunks before it, so that two chunks never strip each other, and a chunk
+    identical to a better one is dropped. The nodes are copied, the retrieved ones are left untouched.
+
+    Args:
+        nodes (List[NodeWithScore]): The retrieved nodes, the best ones first
+        min_overlap (int): Minimum length of a repeated span, in characters
+        max_overlap (int): Maximum length of a repeated span, in characters
+
+    Returns:
+        List[NodeWithScore]: The nodes, in the same order
+    """
+    texts = [node.node.get_content() for node in nodes]
+    stripped = list(texts)
+    for i, node in enumerate(nodes):
+        filename = node.node.metadata.get("filename")
+        if filename is None:
+            continue
+        for j, previous_node in enumerate(nodes[:i]):
+            if previous_node.node.metadata.get("filename") != filename:
+                continue
+            if texts[j] == texts[i]:
+                stripped[i] = ""
+                break
+            # The better chunk is kept whole, the repeated span is removed from the start or the end of the other
+            if (length := find_overlap(texts[j], stripped[i], min_overlap, max_overlap)) > 0:
+                stripped[i] = stripped[i][length:].lstrip()
+            if (length := find_overlap(stripped[i], texts[j], min_overlap, max_overlap)) > 0:
+                stripped[i] = stripped[i][:-length].rstrip()
+    packed_nodes = []
+    for node, text, stripped_text in zip(nodes, texts, stripped):
+        if stripped_text == text:
+            packed_nodes.append(node)
+        elif len(stripped_text) > 0:
+            packed_node = node.node.copy()
+            packed_node.text = stripped_text
+            packed_nodes.append(NodeWithScore(node=packed_node, score=node.score))
+    return packed_nodes
+
+
+def fit_token_budget(nodes: List[NodeWithScore], max_tokens: Optional[int]) -> List[NodeWithScore]:
+    """Keeps the best nodes whose texts fit in a number of tokens, the best node is always kept
+
+    Args:
+        nodes (List[NodeWithScore]): The nodes, the best ones first
+        max_tokens (int, optional): Maximum number of tokens of the context, None for no limit
+
+    Returns:
+        List[NodeWithScore]: The nodes kept, in the same order
+    """
+    if max_tokens is None or len(nodes) == 0:
+        return nodes
+    kept_nodes, nb_tokens = [], 0
+    for node, node_tokens in zip(nodes, count_tokens([node.node.get_content() for node in nodes])):
+        if len(kept_nodes) > 0 and nb_tokens + node_tokens > max_tokens:
+            break
+        kept_nodes.append(node)
+        nb_tokens += node_tokens
+    return kept_nodes
+
+
+class ContextPacker(BaseNodePostprocessor):
+    """Assembles the context of the synthesis from the retrieved nodes
+
+    The nodes far below the best score are dropped, the spans repeated between chunks of the same file are removed
+    and the best nodes are kept within the token budget of the model.
+
+    Args:
+        max_tokens (int, optional): Maximum number of tokens of the context, None for no limit
+        min_score_ratio (float): Minimum ratio of the best score of the nodes kept, 0 keeps them all
+        min_overlap (int): Minimum length of a repeated span, in characters
+        max_overlap (int): Maximum length of a repeated span, in characters
+    """
+
+    max_tokens: Optional[int] = None
+    min_score_ratio: float = 0.0
+    min_overlap: int = 32
+    max_overlap: int = 512
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ContextPacker"
+
+    def _postprocess_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query_bundle: Optional[QueryBundle] = None,
+    ) -> List[NodeWithScore]:
+        packed_nodes = drop_low_score_nodes(nodes, self.min_score_ratio)
+        packed_nodes = strip_overlaps(packed_nodes, self.min_overlap, self.max_overlap)
+        packed_nodes = fit_token_budget(packed_nodes, self.max_tokens)
+        logger.info(f"Context packing: {len(packed_nodes)} of the {len(nodes)} retrieved chunks kept")
+        return packed_nodes
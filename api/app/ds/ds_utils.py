@@ -1,20 +1,40 @@
 from typing import List, Any
-from app.config.openai import client as openai_client
 from llama_index.core.schema import NodeWithScore
 from app.config.logger import logger
+from app.ds.embedding_batcher import embedding_batcher
+from app.ds.embedding_cache import embedding_cache
+from app.utils.hashing import text_hash
+
 
 def compute_embedding(docs: List[str], model: str) -> List[Any]:
     """This function computes embeddings for a given list of texts
 
+    The embeddings cache is consulted first, only the texts it does not know are sent to the embeddings API
+    by the embedding batcher (token-aware batches, requested concurrently)
+
     Args:
         docs (List[str]): Input texts to embed
         model (str): Embedding model to used
 
     Returns:
-        _type_: _description_
+        List[Any]: The embeddings, in the same order as the texts
     """
-    embeddings = openai_client.embeddings.create(model=model, input=docs)
-    return [e.embedding for e in embeddings.data]
+    embeddings = embedding_cache.get_many(docs, model=model)
+
+    # Identical texts are only embedded once
+    missing = {}
+    for i, embedding in enumerate(embeddings):
+        if embedding is None:
+            missing.setdefault(text_hash(docs[i]), []).append(i)
+
+    if len(missing) > 0:
+        texts = [docs[positions[0]] for positions in missing.values()]
+        computed = embedding_batcher.embed(texts, model=model)
+        embedding_cache.set_many(texts, computed, model=model)
+        for positions, embedding in zip(missing.values(), computed):
+            for i in positions:
+                embeddings[i] = embedding
+    return embeddings
 
 
 
@@ -22,4 +42,4 @@ def node_parser(nodes: List[NodeWithScore]) -> str:
     context = ""
     for node in nodes:
         context += node.text + "\n\n"
-    return context
\ No newline at end of file
+    return context
@@ -0,0 +1,135 @@
+import functools
+import logging
+from typing import Any, List
+
+import openai
+import tiktoken
+from tenacity import before_sleep_log, retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+
+from app.config.ingestion import (
+    EMBEDDING_BATCH_MAX_SIZE,
+    EMBEDDING_BATCH_MAX_TOKENS,
+    EMBEDDING_CONCURRENCY,
+    EMBEDDING_MAX_RETRIES,
+)
+from app.config.logger import logger
+from app.config.openai import client as openai_client
+from app.utils.executors import create_executor
+
+# Errors worth retrying: rate limits (429), timeouts and provider side failures
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+@functools.lru_cache(maxsize=1)
+def get_encoding() -> tiktoken.Encoding | None:
+    """Returns the tiktoken encoding used to count tokens, None if it cannot be loaded
+
+    Returns:
+        tiktoken.Encoding | None: The encoding
+    """
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"Unable to load the tiktoken encoding, tokens will be estimated from characters: {e}")
+        return None
+
+
+def count_tokens(texts: List[str]) -> List[int]:
+    """Counts the tokens of each text
+
+    Args:
+        texts (List[str]): Input texts
+
+    Returns:
+        List[int]: The number of tokens of each text
+    """
+    encoding = get_encoding()
+    if encoding is None:
+        # A token is roughly 4 characters
+        return [len(text) // 4 + 1 for text in texts]
+    return [len(tokens) for tokens in encoding.encode_ordinary_batch(texts)]
+
+
+class EmbeddingBatcher:
+    """Embeds lists of texts with batches packed by number of tokens, several batches being requested concurrently
+
+    The executor is shared by all the ingestions of the process, so that `concurrency` bounds the total number
+    of embedding requests in flight.
+
+    Args:
+        max_batch_tokens (int): Maximum number of tokens per request
+        max_batch_size (int): Maximum number of texts per request
+        concurrency (int): Maximum number of requests in flight
+        max_retries (int): Maximum number of attempts per request
+    """
+
+    def __init__(self, max_batch_tokens: int, max_batch_size: int, concurrency: int, max_retries: int) -> None:
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self._executor = create_executor("embedding", concurrency)
+        self._request = retry(
+            retry=retry_if_exception_type(RETRYABLE_ERRORS),
+            wait=wait_random_exponential(multiplier=1, max=60),
+            stop=stop_after_attempt(max_retries),
+            before_sleep=before_sleep_log(logging.getLogger(__name__), logging.WARNING),
+            reraise=True,
+        )(self._request_batch)
+
+    @staticmethod
+    def _request_batch(texts: List[str], model: str) -> List[Any]:
+        embeddings = openai_client.embeddings.create(model=model, input=texts)
+        return [e.embedding for e in embeddings.data]
+
+    def pack(self, texts: List[str]) -> List[List[str]]:
+        """Packs the texts into batches that fit both the token budget and the maximum batch size
+
+        A text that exceeds the budget on its own gets its own batch.
+
+        Args:
+            texts (List[str]): Input texts
+
+        Returns:
+            List[List[str]]: The batches, in the order of the texts
+        """
+        batches = []
+        batch, batch_tokens = [], 0
+        for text, nb_tokens in zip(texts, count_tokens(texts)):
+            if len(batch) > 0 and (
+                    batch_tokens + nb_tokens > self.max_batch_tokens or len(batch) >= self.max_batch_size
+            ):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += nb_tokens
+        if len(batch) > 0:
+            batches.append(batch)
+        return batches
+
+    def embed(self, texts: List[str], model: str) -> List[Any]:
+        """Computes the embeddings of the texts
+
+        Args:
+            texts (List[str]): Input texts
+            model (str): Embedding model
+
+        Returns:
+            List[Any]: The embeddings, in the same order as the texts
+        """
+        batches = self.pack(texts)
+        logger.info(f"Embedding {len(texts)} texts in {len(batches)} batches")
+        # map keeps the order of the batches whatever the order in which they complete
+        results = self._executor.map(lambda batch: self._request(batch, model), batches)
+        return [embedding for batch_embeddings in results for embedding in batch_embeddings]
+
+
+embedding_batcher = EmbeddingBatcher(
+    max_batch_tokens=EMBEDDING_BATCH_MAX_TOKENS,
+    max_batch_size=EMBEDDING_BATCH_MAX_SIZE,
+    concurrency=EMBEDDING_CONCURRENCY,
+    max_retries=EMBEDDING_MAX_RETRIES,
+)
@@ -0,0 +1,199 @@
+import time
+from io import BytesIO
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from minio.error import S3Error
+
+from app.config.cache import (
+    EMBEDDING_CACHE_COLD_PREFIX,
+    EMBEDDING_CACHE_COLD_TTL,
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_CACHE_MAX_HOT_ENTRIES,
+)
+from app.config.logger import logger
+from app.config.minio import COLLECTIONS_BUCKET_NAME, client as minio_client
+from app.config.redis import binary_client as redis_client
+from app.utils.executors import create_executor
+from app.utils.hashing import text_hash
+from app.utils.minio import remove_objects_from_bucket
+
+LRU_KEY = "embedding-cache:lru"
+COLD_KEY = "embedding-cache:cold"
+STATS_KEY = "embedding-cache:stats"
+
+
+class EmbeddingCache:
+    """Content-addressed cache of the embeddings, keyed by (embedding model, normalized text hash)
+
+    Entries are stored as float32 bytes in redis (hot tier), a sorted set keeps their last access time so that the
+    least recently used ones are demoted to minio (cold tier) once the hot tier exceeds its maximum size. Another
+    sorted set keeps the demotion time of the cold tier entries: only those are looked up in minio, and they are
+    removed `cold_ttl` seconds after their last demotion.
+    Any cache failure is logged and treated as a miss: the cache must never prevent an ingestion.
+
+    Args:
+        enabled (bool): Whether the cache is used at all
+        max_hot_entries (int): Maximum number of entries kept in redis
+        cold_prefix (str): Prefix of the cold tier objects in the collections bucket
+        cold_ttl (int): Lifetime of the cold tier entries after their last demotion, in seconds
+    """
+
+    def __init__(self, enabled: bool, max_hot_entries: int, cold_prefix: str, cold_ttl: int) -> None:
+        self.enabled = enabled
+        self.max_hot_entries = max_hot_entries
+        self.cold_prefix = cold_prefix
+        self.cold_ttl = cold_ttl
+        self._cold_tier_executor = create_executor("embedding_cache", 8)
+
+    @staticmethod
+    def _key(text: str, model: str) -> str:
+        return f"embedding-cache:{model}:{text_hash(text)}"
+
+    def _object_name(self, key: str) -> str:
+        return f"{self.cold_prefix}/{key.split(':', 1)[1].replace(':', '/')}"
+
+    def _get_cold(self, key: str) -> Optional[bytes]:
+        try:
+            response = minio_client.get_object(COLLECTIONS_BUCKET_NAME, self._object_name(key))
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                return None
+            raise e
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    def _put_cold(self, key: str, value: bytes):
+        minio_client.put_object(COLLECTIONS_BUCKET_NAME, self._object_name(key), BytesIO(value), len(value))
+
+    def get_many(self, texts: List[str], model: str) -> List[Optional[List[float]]]:
+        """Returns the cached embeddings of the texts, None for the texts that are not cached
+
+        Args:
+            texts (List[str]): Input texts
+            model (str): Embedding model
+
+        Returns:
+            List[Optional[List[float]]]: The embeddings, in the same order as the texts
+        """
+        if not self.enabled or len(texts) == 0:
+            return [None] * len(texts)
+
+        keys = [self._key(text, model) for text in texts]
+        try:
+            values = redis_client.mget(keys)
+            hot_hits = [key for key, value in zip(keys, values) if value is not None]
+
+            # We look up the hot tier misses that were demoted in the cold tier and promote the ones we find
+            hot_misses = list({key for key, value in zip(keys, values) if value is None})
+            pipeline = redis_client.pipeline(transaction=False)
+            for key in hot_misses:
+                pipeline.zscore(COLD_KEY, key)
+            cold_keys = [key for key, demoted_at in zip(hot_misses, pipeline.execute()) if demoted_at is not None]
+            cold_values = dict(zip(cold_keys, self._cold_tier_executor.map(self._get_cold, cold_keys)))
+            cold_hits = {key: value for key, value in cold_values.items() if value is not None}
+            values = [value if value is not None else cold_hits.get(key) for key, value in zip(keys, values)]
+
+            pipeline = redis_client.pipeline(transaction=False)
+            if len(cold_hits) > 0:
+                pipeline.mset(cold_hits)
+            now = time.time()
+            if len(hot_hits) + len(cold_hits) > 0:
+                pipeline.zadd(LRU_KEY, {key: now for key in [*hot_hits, *cold_hits]})
+            nb_misses = sum(1 for value in values if value is None)
+            pipeline.hincrby(STATS_KEY, "hot_hits", len(hot_hits))
+            pipeline.hincrby(STATS_KEY, "cold_hits", len(values) - len(hot_hits) - nb_misses)
+            pipeline.hincrby(STATS_KEY, "misses", nb_misses)
+            pipeline.execute()
+        except Exception as e:
+            logger.warning(f"Embedding cache unavailable, all embeddings will be computed: {e}")
+            return [None] * len(texts)
+
+        logger.info(f"Embedding cache: {len(texts) - nb_misses} hits, {nb_misses} misses")
+        return [np.frombuffer(value, dtype=np.float32).tolist() if value is not None else None for value in values]
+
+    def set_many(self, texts: List[str], embeddings: List[List[float]], model: str):
+        """Stores the embeddings of the texts in the hot tier, demoting the least recently used entries if needed
+
+        Args:
+            texts (List[str]): Input texts
+            embeddings (List[List[float]]): Their embeddings
+            model (str): Embedding model
+        """
+        if not self.enabled or len(texts) == 0:
+            return
+
+        entries = {
+            self._key(text, model): np.asarray(embedding, dtype=np.float32).tobytes()
+            for text, embedding in zip(texts, embeddings)
+        }
+        try:
+            now = time.time()
+            pipeline = redis_client.pipeline(transaction=False)
+            pipeline.mset(entries)
+            pipeline.zadd(LRU_KEY, {key: now for key in entries.keys()})
+            pipeline.zcard(LRU_KEY)
+            nb_hot_entries = pipeline.execute()[-1]
+
+            if nb_hot_entries > self.max_hot_entries:
+                self._evict(nb_hot_entries - self.max_hot_entries)
+        except Exception as e:
+            logger.warning(f"Error while storing embeddings in the cache: {e}")
+
+    def _evict(self, count: int):
+        """Demotes the `count` least recently used entries of the hot tier to the cold tier
+
+        Args:
+            count (int): Number of entries to demote
+        """
+        evicted = [key.decode() for key, _ in redis_client.zpopmin(LRU_KEY, count)]
+        values = redis_client.mget(evicted)
+        demoted = [(key, value) for key, value in zip(evicted, values) if value is not None]
+        list(self._cold_tier_executor.map(lambda entry: self._put_cold(*entry), demoted))
+        if len(demoted) > 0:
+            redis_client.zadd(COLD_KEY, {key: time.time() for key, _ in demoted})
+        redis_client.delete(*evicted)
+        logger.info(f"Embedding cache: {len(demoted)} entries demoted to the cold tier")
+        self._expire_cold(count)
+
+    def _expire_cold(self, count: int):
+        """Removes at most `count` entries of the cold tier demoted more than `cold_ttl` seconds ago
+
+        Args:
+            count (int): Maximum number of entries to remove
+        """
+        expired = [
+            key.decode() for key in redis_client.zrangebyscore(COLD_KEY, 0, time.time() - self.cold_ttl, 0, count)
+        ]
+        if len(expired) == 0:
+            return
+        remove_objects_from_bucket(COLLECTIONS_BUCKET_NAME, (self._object_name(key) for key in expired))
+        redis_client.zrem(COLD_KEY, *expired)
+        logger.info(f"Embedding cache: {len(expired)} expired entries removed from the cold tier")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Returns the hit / miss counters of the cache, shared by all the API replicas
+
+        Returns:
+            Dict[str, Any]: The counters and the number of entries in each tier
+        """
+        stats = {key.decode(): int(value) for key, value in redis_client.hgetall(STATS_KEY).items()}
+        return {
+            "enabled": self.enabled,
+            "hot_entries": redis_client.zcard(LRU_KEY),
+            "cold_entries": redis_client.zcard(COLD_KEY),
+            "hot_hits": stats.get("hot_hits", 0),
+            "cold_hits": stats.get("cold_hits", 0),
+            "misses": stats.get("misses", 0),
+        }
+
+
+embedding_cache = EmbeddingCache(
+    enabled=EMBEDDING_CACHE_ENABLED,
+    max_hot_entries=EMBEDDING_CACHE_MAX_HOT_ENTRIES,
+    cold_prefix=EMBEDDING_CACHE_COLD_PREFIX,
+    cold_ttl=EMBEDDING_CACHE_COLD_TTL,
+)
@@ -0,0 +1,135 @@
+import asyncio
+import re
+from typing import Callable, List, Optional
+
+from openai import AsyncOpenAI
+
+from app.config.cache import FIAB_CACHE_TTL
+from app.config.ingestion import FIAB_CONCURRENCY
+from app.config.logger import logger
+from app.config.openai import create_async_client
+from app.config.prompts import prompts_config
+from app.config.redis import client as redis_client
+from app.utils.executors import redis_executor, run_in_executor
+from app.utils.hashing import text_hash
+
+
+def get_fiab_prompt(model: str) -> str:
+    """Returns the reliability prompt of a model
+
+    Args:
+        model (str): LLM used for the reliability
+
+    Returns:
+        str: The prompt template
+    """
+    return prompts_config['fiab']['process'][model]['prompt']
+
+
+def fiab_cache_key(text: str, model: str) -> str:
+    """Returns the cache key of a reliability result
+
+    The prompt version is derived from the prompt itself, editing the prompt in prompts.yaml invalidates the cache
+
+    Args:
+        text (str): Input text
+        model (str): LLM used for the reliability
+
+    Returns:
+        str: The cache key
+    """
+    prompt_version = text_hash(get_fiab_prompt(model))[:12]
+    return f"fiab-cache:{model}:{prompt_version}:{text_hash(text)}"
+
+
+async def afiab_document(
+        texts: List[str],
+        model: str,
+        progress: Optional[Callable[[str, str], None]] = None,
+        client: Optional[AsyncOpenAI] = None,
+) -> List[str]:
+    """This function increase parsing quality by using LLM to correct potential mistakes | async version
+
+    The texts already processed with the same model and prompt are taken from the cache, the others are sent
+    to the LLM with at most FIAB_CONCURRENCY requests in flight
+
+    Args:
+        texts (List[str]): Input texts
+        model (str): LLM used for the "parsing"
+        progress (Callable[[str, str], None], optional): Called with (stage, message) each time a text is processed
+        client (AsyncOpenAI, optional): Async client bound to the running event loop, a new one is created if None
+
+    Returns:
+        List[str]: The texts processed by the LLM, in the same order as the input texts
+    """
+    prompt = get_fiab_prompt(model)
+    keys = [fiab_cache_key(text, model) for text in texts]
+    try:
+        outputs = await run_in_executor(redis_executor, redis_client.mget, keys)
+    except Exception as e:
+        logger.warning(f"Reliability cache unavailable: {e}")
+        outputs = [None] * len(texts)
+
+    to_process = [i for i, output in enumerate(outputs) if output is None]
+    logger.info(f"Reliability: {len(texts) - len(to_process)} cached texts, {len(to_process)} texts to process")
+    if len(to_process) == 0:
+        return outputs
+
+    semaphore = asyncio.Semaphore(FIAB_CONCURRENCY)
+    nb_done = len(texts) - len(to_process)
+
+    async def process(i: int, llm_client: AsyncOpenAI):
+        async with semaphore:
+            output = await llm_client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "user", "content": prompt.format(document=texts[i])}
+                ]
+            )
+        return i, re.sub(r"Document fiabilisé:?", "", output.choices[0].message.content)
+
+    async def process_all(llm_client: AsyncOpenAI):
+        nonlocal nb_done
+        for task in asyncio.as_completed([process(i, llm_client) for i in to_process]):
+            i, output = await task
+            outputs[i] = output
+            nb_done += 1
+            if progress is not None:
+                progress("reliability", f"Fiabilisation des chunks : {nb_done}/{len(texts)}")
+
+    if client is not None:
+        await process_all(client)
+    else:
+        async with create_async_client() as llm_client:
+            await process_all(llm_client)
+
+    try:
+        pipeline = redis_client.pipeline(transaction=False)
+        for i in to_process:
+            pipeline.setex(keys[i], FIAB_CACHE_TTL, outputs[i])
+        await run_in_executor(redis_executor, pipeline.execute)
+    except Exception as e:
+        logger.warning(f"Error while storing reliability results in the cache: {e}")
+
+    return outputs
+
+
+def fiab_document(
+        texts: List[str],
+        model: str,
+        progress: Optional[Callable[[str, str], None]] = None,
+) -> List[str]:
+    """This function increase parsing quality by using LLM to correct potential mistakes
+
+    Runs the async version in its own event loop, it must be called from a thread without a running loop
+    (ingestion threads)
+
+    Args:
+        texts (List[str]): Input texts
+        model (str): LLM used for the "parsing"
+        progress (Callable[[str, str], None], optional): Called with (stage, message) each time a text is processed
+
+    Returns:
+        List[str]: The texts processed by the LLM, in the same order as the input texts
+    """
+    return asyncio.run(afiab_document(texts, model=model, progress=progress))
@@ -0,0 +1,178 @@
+import asyncio
+from typing import Dict, List, Tuple
+
+from openai import AsyncOpenAI
+from qdrant_client.http import models
+
+from app.config.ingestion import (
+    FIAB_CONCURRENCY,
+    FIAB_WORKER_BATCH_SIZE,
+    FIAB_WORKER_INTERVAL,
+    FIAB_WORKER_MAX_ATTEMPTS,
+)
+from app.config.logger import logger
+from app.config.openai import create_async_client
+from app.config.qdrant import BASE_COLLECTION_NAME, async_client as async_qdrant_client
+from app.config.redis import client as redis_client
+from app.ds.ds_utils import compute_embedding
+from app.ds.fiab import afiab_document
+from app.utils.executors import redis_executor, run_in_executor
+
+# A claimed point is left to the other workers (other replicas) once its claim expires
+CLAIM_TTL = 600
+# The attempts on a point are forgotten a day after the last one
+ATTEMPTS_TTL = 86400
+
+NEED_FIAB_FILTER = models.Filter(
+    must=[
+        models.FieldCondition(key="need_fiab", match=models.MatchValue(value=True)),
+    ]
+)
+
+
+def claim_points(point_ids: List[str]) -> Dict[str, int]:
+    """Claims points so that a single worker processes them, and counts the attempts on each of them
+
+    Args:
+        point_ids (List[str]): The ids of the points to claim
+
+    Returns:
+        Dict[str, int]: The attempt number of the points claimed by this worker, by id
+    """
+    pipeline = redis_client.pipeline(transaction=False)
+    for point_id in point_ids:
+        pipeline.set(f"fiab-worker:claim:{point_id}", 1, nx=True, ex=CLAIM_TTL)
+    claimed_ids = [point_id for point_id, claimed in zip(point_ids, pipeline.execute()) if claimed]
+    pipeline = redis_client.pipeline(transaction=False)
+    for point_id in claimed_ids:
+        pipeline.incr(f"fiab-worker:attempts:{point_id}")
+        pipeline.expire(f"fiab-worker:attempts:{point_id}", ATTEMPTS_TTL)
+    return dict(zip(claimed_ids, pipeline.execute()[::2]))
+
+
+async def claim_pending_points() -> Tuple[List[models.Record], List[models.Record]]:
+    """Claims up to FIAB_WORKER_BATCH_SIZE points flagged with 'need_fiab'
+
+    The flagged points are scrolled page by page past the ones claimed by the other workers (or by a previous
+    attempt of this one), so that they do not hold back the points behind them
+
+    Returns:
+        Tuple[List[models.Record], List[models.Record]]: The points to upgrade, and the points claimed more than
+            FIAB_WORKER_MAX_ATTEMPTS times, that must no longer be tried
+    """
+    points, failed_points, offset = [], [], None
+    while True:
+        page, offset = await async_qdrant_client.scroll(
+            collection_name=BASE_COLLECTION_NAME,
+            scroll_filter=NEED_FIAB_FILTER,
+            limit=FIAB_WORKER_BATCH_SIZE - len(points),
+            offset=offset,
+            with_payload=True,
+            with_vectors=False,
+        )
+        attempts = await run_in_executor(redis_executor, claim_points, [str(point.id) for point in page])
+        for point in page:
+            if str(point.id) not in attempts:
+                continue
+            if attempts[str(point.id)] > FIAB_WORKER_MAX_ATTEMPTS:
+                failed_points.append(point)
+            else:
+                points.append(point)
+        if len(points) >= FIAB_WORKER_BATCH_SIZE or offset is None:
+            return points, failed_points
+
+
+async def upgrade_pending_points(embedding_model: str, fiab_model: str, client: AsyncOpenAI) -> int:
+    """Applies the LLM reliability to a batch of points flagged with 'need_fiab' and re-embeds them in place
+
+    Each point is processed on its own, a point whose reliability fails is tried again once its claim expires
+
+    Args:
+        embedding_model (str): Model for embedding computing
+        fiab_model (str): LLM used for the reliability
+        client (AsyncOpenAI): Async client of the worker
+
+    Returns:
+        int: The number of points claimed, 0 when there is nothing left to process
+    """
+    points, failed_points = await claim_pending_points()
+    if len(failed_points) > 0:
+        # The points keep their raw text, already indexed
+        logger.error(f"Reliability worker: {len(failed_points)} points failed {FIAB_WORKER_MAX_ATTEMPTS} times")
+        await async_qdrant_client.set_payload(
+            collection_name=BASE_COLLECTION_NAME,
+            payload={"need_fiab": False, "fiab_failed": True},
+            # A filter, unlike a list of ids, does not fail on the points of a file removed in the meantime
+            points=models.Filter(must=[models.HasIdCondition(has_id=[point.id for point in failed_points])]),
+        )
+    if len(points) == 0:
+        # Everything is being processed by other workers, we wait for them
+        return len(failed_points)
+
+    semaphore = asyncio.Semaphore(FIAB_CONCURRENCY)
+
+    async def upgrade_text(text: str) -> str:
+        async with semaphore:
+            return (await afiab_document([text], model=fiab_model, client=client))[0]
+
+    results = await asyncio.gather(*(upgrade_text(point.payload["text"]) for point in points), return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.warning(f"Reliability worker: error while upgrading a point: {result!r}")
+    upgraded = [(point, text) for point, text in zip(points, results) if not isinstance(text, BaseException)]
+    if len(upgraded) == 0:
+        return len(points)
+    points = [point for point, _ in upgraded]
+    texts = [text for _, text in upgraded]
+    embeddings = await asyncio.to_thread(compute_embedding, texts, embedding_model)
+
+    # The file may have been removed in the meantime, we make sure we do not bring its points back
+    existing_ids = {
+        str(point.id) for point in
+        await async_qdrant_client.retrieve(BASE_COLLECTION_NAME, ids=[point.id for point in points], with_payload=False)
+    }
+    upgraded_points = [
+        models.PointStruct(
+            id=point.id,
+            vector=embedding,
+            payload={**point.payload, "text": text, "need_fiab": False},
+        )
+        for point, text, embedding in zip(points, texts, embeddings)
+        if str(point.id) in existing_ids
+    ]
+    if len(upgraded_points) > 0:
+        await async_qdrant_client.upsert(collection_name=BASE_COLLECTION_NAME, points=upgraded_points, wait=True)
+    logger.info(f"Reliability worker: {len(upgraded_points)} points upgraded")
+    return len(results)
+
+
+async def run_fiab_worker(embedding_model: str, fiab_model: str):
+    """Background task upgrading the points indexed without LLM reliability, runs until cancelled
+
+    Args:
+        embedding_model (str): Model for embedding computing
+        fiab_model (str): LLM used for the reliability
+    """
+    try:
+        await async_qdrant_client.create_payload_index(
+            collection_name=BASE_COLLECTION_NAME,
+            field_name="need_fiab",
+            field_schema=models.PayloadSchemaType.BOOL,
+        )
+    except Exception as e:
+        logger.warning(f"Unable to create the 'need_fiab' payload index: {e}")
+
+    logger.info("Reliability worker started")
+    async with create_async_client() as client:
+        while True:
+            try:
+                nb_points = await upgrade_pending_points(
+                    embedding_model=embedding_model, fiab_model=fiab_model, client=client
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Reliability worker: error while upgrading points: {e}")
+                nb_points = 0
+            if nb_points == 0:
+                await asyncio.sleep(FIAB_WORKER_INTERVAL)
@@ -0,0 +1,330 @@
+import asyncio
+import json
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.config.jobs import JOBS_LEASE_TIMEOUT, JOBS_MAX_ATTEMPTS, JOBS_TTL
+from app.config.logger import logger
+from app.config.redis import client as redis_client
+from app.utils.executors import redis_executor, run_in_executor
+
+QUEUE_KEY = "ingestion-jobs:queue"
+JOB_KEY_PREFIX = "ingestion-job:"
+PROCESSING_KEY = "ingestion-jobs:processing"
+
+# A job goes from queued to running, then back to queued when it fails and still has attempts left
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINAL_STATES = (SUCCEEDED, FAILED)
+
+# Seconds between two looks at an empty queue
+CLAIM_POLL_INTERVAL = 0.5
+
+# Moves the next job to the processing list and leases it in a single step, so that a job is never seen in the
+# processing list without its lease. Returns the job id, an empty string if the job expired while it was queued
+CLAIM_JOB_SCRIPT = """
+local job_id = redis.call('lmove', KEYS[1], KEYS[2], 'RIGHT', 'LEFT')
+if not job_id then
+    return false
+end
+local key = ARGV[1] .. job_id
+if redis.call('exists', key) == 0 then
+    redis.call('lrem', KEYS[2], 1, job_id)
+    return ''
+end
+redis.call('set', key .. ':lease', 1, 'EX', ARGV[2])
+redis.call('hincrby', key, 'attempts', 1)
+redis.call('hset', key, 'state', ARGV[3], 'updated_at', ARGV[4])
+return job_id
+"""
+claim_job_script = redis_client.register_script(CLAIM_JOB_SCRIPT)
+
+
+def job_key(job_id: str) -> str:
+    return f"{JOB_KEY_PREFIX}{job_id}"
+
+
+def lease_key(job_id: str) -> str:
+    return f"ingestion-job:{job_id}:lease"
+
+
+def new_job_id() -> str:
+    """Returns the id of a new ingestion job
+
+    Returns:
+        str: The job id
+    """
+    return uuid.uuid4().hex
+
+
+def enqueue_job(
+        job_id: str,
+        index: str,
+        filename: str,
+        display_name: str,
+        bucket_name: str,
+        object_name: str,
+        preprocessed: bool,
+        delete_source: bool,
+        operation: str = "ingest",
+):
+    """Records an ingestion job and puts it in the queue
+
+    The file must already be in the bucket: a worker may pick up the job as soon as it is queued
+
+    Args:
+        job_id (str): The job id, see new_job_id
+        index (str): index of the user or the "collection"
+        filename (str): The name under which the file is ingested
+        display_name (str): The name of the file shown to the user
+        bucket_name (str): The bucket containing the file
+        object_name (str): The object name of the file
+        preprocessed (bool): Whether the file is already preprocessed
+        delete_source (bool): Whether the object is removed once the job is finished
+        operation (str, optional): 'ingest' to ingest a new file, 'update' to replace a file already ingested
+    """
+    now = time.time()
+    pipeline = redis_client.pipeline()
+    pipeline.hset(job_key(job_id), mapping={
+        "id": job_id,
+        "index": index,
+        "filename": filename,
+        "display_name": display_name,
+        "bucket_name": bucket_name,
+        "object_name": object_name,
+        "preprocessed": int(preprocessed),
+        "delete_source": int(delete_source),
+        "operation": operation,
+        "state": QUEUED,
+        "stage": QUEUED,
+        "message": "En attente de traitement...",
+        "attempts": 0,
+        "max_attempts": JOBS_MAX_ATTEMPTS,
+        "timings": json.dumps({}),
+        "created_at": now,
+        "updated_at": now,
+    })
+    pipeline.lpush(QUEUE_KEY, job_id)
+    pipeline.execute()
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Returns an ingestion job
+
+    Args:
+        job_id (str): The job id
+
+    Returns:
+        Optional[Dict[str, Any]]: The job, None if it does not exist (or expired)
+    """
+    job = redis_client.hgetall(job_key(job_id))
+    if len(job) == 0:
+        return None
+    return {
+        **job,
+        "preprocessed": job["preprocessed"] == "1",
+        "delete_source": job["delete_source"] == "1",
+        "attempts": int(job["attempts"]),
+        "max_attempts": int(job["max_attempts"]),
+        "timings": json.loads(job["timings"]),
+        "created_at": float(job["created_at"]),
+        "updated_at": float(job["updated_at"]),
+    }
+
+
+def update_job(job_id: str, **fields: Any):
+    """Updates fields of an ingestion job
+
+    Args:
+        job_id (str): The job id
+        **fields (Any): The fields to update, dicts are stored as json
+    """
+    redis_client.hset(job_key(job_id), mapping={
+        **{key: json.dumps(value) if isinstance(value, dict) else value for key, value in fields.items()},
+        "updated_at": time.time(),
+    })
+
+
+def claim_job(timeout: int) -> Optional[Dict[str, Any]]:
+    """Takes the next job of the queue, waiting at most `timeout` seconds for one
+
+    The job is moved to the processing list and leased to the caller atomically, the caller must call heartbeat
+    while it processes the job
+
+    Args:
+        timeout (int): Seconds to wait for a job
+
+    Returns:
+        Optional[Dict[str, Any]]: The job, None if the queue stayed empty
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        job_id = claim_job_script(
+            keys=[QUEUE_KEY, PROCESSING_KEY],
+            args=[JOB_KEY_PREFIX, JOBS_LEASE_TIMEOUT, RUNNING, time.time()],
+        )
+        if job_id:
+            return get_job(job_id)
+        # The next job is taken right away when the previous one expired while it was queued
+        if job_id is None:
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(CLAIM_POLL_INTERVAL)
+
+
+def heartbeat(job_ids: List[str]):
+    """Extends the lease of running jobs
+
+    Args:
+        job_ids (List[str]): The ids of the jobs processed by the caller
+    """
+    pipeline = redis_client.pipeline(transaction=False)
+    for job_id in job_ids:
+        pipeline.expire(lease_key(job_id), JOBS_LEASE_TIMEOUT)
+    pipeline.execute()
+
+
+def complete_job(job_id: str):
+    """Marks a job as succeeded
+
+    Args:
+        job_id (str): The job id
+    """
+    pipeline = redis_client.pipeline()
+    pipeline.hset(job_key(job_id), mapping={"state": SUCCEEDED, "updated_at": time.time()})
+    pipeline.expire(job_key(job_id), JOBS_TTL)
+    pipeline.lrem(PROCESSING_KEY, 1, job_id)
+    pipeline.delete(lease_key(job_id))
+    pipeline.execute()
+
+
+def fail_job(job_id: str, error: str) -> bool:
+    """Puts a failed job back in the queue, or marks it as failed once it has no attempts left
+
+    Args:
+        job_id (str): The job id
+        error (str): The error of the attempt
+
+    Returns:
+        bool: Whether the job is marked as failed
+    """
+    # Only the caller that removes the job from the processing list handles its failure
+    if redis_client.lrem(PROCESSING_KEY, 1, job_id) == 0:
+        return False
+    job = get_job(job_id)
+    if job is None:
+        return False
+
+    pipeline = redis_client.pipeline()
+    pipeline.delete(lease_key(job_id))
+    final = job["attempts"] >= job["max_attempts"]
+    if final:
+        logger.error(f"Ingestion job {job_id} failed after {job['attempts']} attempts: {error}")
+        pipeline.hset(job_key(job_id), mapping={
+            "state": FAILED, "error": error, "message": "Echec de l'intégration", "updated_at": time.time()
+        })
+        pipeline.expire(job_key(job_id), JOBS_TTL)
+    else:
+        logger.warning(f"Ingestion job {job_id} attempt {job['attempts']} failed, it will be retried: {error}")
+        pipeline.hset(job_key(job_id), mapping={"state": QUEUED, "error": error, "updated_at": time.time()})
+        pipeline.lpush(QUEUE_KEY, job_id)
+    pipeline.execute()
+    return final
+
+
+def requeue_expired_jobs() -> List[str]:
+    """Handles the running jobs whose lease expired (worker killed or restarted) as failed attempts
+
+    Returns:
+        List[str]: The ids of the jobs whose lease expired
+    """
+    expired = []
+    for job_id in redis_client.lrange(PROCESSING_KEY, 0, -1):
+        if redis_client.exists(lease_key(job_id)):
+            continue
+        # The jobs are leased as they enter the processing list, a job without lease was abandoned
+        expired.append(job_id)
+    for job_id in expired:
+        fail_job(job_id, "The worker processing the job stopped")
+    return expired
+
+
+class JobProgress:
+    """Progress callback of an ingestion job: stores the last message in the job and the time spent in each stage
+
+    Args:
+        job_id (str): The job id
+    """
+
+    def __init__(self, job_id: str) -> None:
+        self.job_id = job_id
+        self.timings: Dict[str, float] = {}
+        self._stage = None
+        self._stage_started_at = time.perf_counter()
+
+    def _close_stage(self):
+        if self._stage is not None:
+            elapsed = time.perf_counter() - self._stage_started_at
+            self.timings[self._stage] = round(self.timings.get(self._stage, 0.0) + elapsed, 3)
+        self._stage_started_at = time.perf_counter()
+
+    def __call__(self, stage: str, message: str):
+        if stage != self._stage:
+            self._close_stage()
+            self._stage = stage
+        update_job(self.job_id, stage=stage, message=message, timings=self.timings)
+
+    def close(self):
+        """Records the time spent in the last stage"""
+        self._close_stage()
+        self._stage = None
+        update_job(self.job_id, timings=self.timings)
+
+
+async def follow_jobs(job_ids: List[str], poll_interval: float = 0.5) -> AsyncIterator[Dict[str, Any]]:
+    """Yields the jobs each time their state or message changes, until they are all finished
+
+    Args:
+        job_ids (List[str]): The ids of the jobs to follow
+        poll_interval (float, optional): Seconds between two reads of the jobs
+
+    Returns:
+        AsyncIterator[Dict[str, Any]]: The updated jobs
+    """
+    last_seen = {}
+    pending = list(job_ids)
+    while len(pending) > 0:
+        for job_id in pending:
+            job = await run_in_executor(redis_executor, get_job, job_id)
+            if job is None:
+                raise ValueError(f"Ingestion job {job_id} not found")
+            if last_seen.get(job_id) != (job["state"], job["message"]):
+                last_seen[job_id] = (job["state"], job["message"])
+                yield job
+        pending = [job_id for job_id in pending if last_seen[job_id][0] not in FINAL_STATES]
+        if len(pending) > 0:
+            await asyncio.sleep(poll_interval)
+
+
+async def follow_jobs_progress(job_ids: List[str]) -> AsyncIterator[str]:
+    """Yields the progress messages of jobs until they are all finished, like ProgressStream.follow
+
+    Args:
+        job_ids (List[str]): The ids of the jobs to follow
+
+    Returns:
+        AsyncIterator[str]: The progress messages, prefixed with the name of their file
+
+    Raises:
+        RuntimeError: If one of the jobs failed
+    """
+    failed = []
+    async for job in follow_jobs(job_ids):
+        yield f"{job['display_name']} : {job['message']}"
+        if job["state"] == FAILED:
+            failed.append(job["id"])
+    if len(failed) > 0:
+        raise RuntimeError(f"Ingestion jobs {failed} failed")
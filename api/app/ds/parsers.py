@@ -0,0 +1,313 @@
+import os
+from copy import deepcopy
+from io import BytesIO, StringIO
+from typing import Any, Dict, List
+
+from pdfminer.converter import HTMLConverter
+from pdfminer.high_level import extract_text_to_fp
+from pdfminer.layout import LAParams
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdftypes import resolve1
+from unstructured.chunking.title import chunk_by_title
+from unstructured.documents.elements import Element, Table
+from unstructured.partition.docx import partition_docx
+from unstructured.partition.html import partition_html
+from unstructured.partition.md import partition_md
+from unstructured.partition.odt import partition_odt
+from unstructured.partition.text import partition_text
+from unstructured.staging.base import convert_to_dataframe, elements_from_dicts, elements_to_dicts
+
+from app.config.ingestion import NATIVE_TEXT_CHUNKER
+from app.ds.text_chunker import chunk_text_file
+
+# This module is imported by the parsing worker processes, it must stay free of any client (openai, qdrant, ...)
+# or configuration import that would require the API environment
+
+CHUNKING_PARAMS = {
+    "max_characters": 1024,
+    "overlap": 128,
+    "overlap_all": True,
+    "chunking_strategy": "by_title"
+}
+
+
+def partition_file(filename: str, data) -> List[Any]:
+    """This function allows to load different type of files
+
+    Supported files format : pdf, html, txt, odt, docx, md
+
+    Args:
+        filename (str): filename to get extension
+        data: File-like object containing the uploaded file
+
+    Returns:
+        Parsing elements from unstructured
+
+    """
+    ext = os.path.splitext(filename)[-1].lower()
+    if ext == ".pdf":
+        document = parsing_pdf(data)
+    elif ext == ".html":
+        document = partition_html(
+            file=data,
+            max_characters=CHUNKING_PARAMS["max_characters"],
+            overlap=CHUNKING_PARAMS['overlap'],
+            chunking_strategy=CHUNKING_PARAMS["chunking_strategy"],
+            overlap_all=CHUNKING_PARAMS["overlap_all"],
+        )
+    elif ext == ".txt":
+        document = partition_text(
+            file=data,
+            url=None,
+            max_characters=CHUNKING_PARAMS["max_characters"],
+            overlap=CHUNKING_PARAMS['overlap'],
+            chunking_strategy=CHUNKING_PARAMS["chunking_strategy"],
+            overlap_all=CHUNKING_PARAMS["overlap_all"],
+        )
+    elif ext == ".odt":
+        document = partition_odt(
+            file=data,
+            url=None,
+            max_characters=CHUNKING_PARAMS["max_characters"],
+            overlap=CHUNKING_PARAMS['overlap'],
+            chunking_strategy=CHUNKING_PARAMS["chunking_strategy"],
+            overlap_all=CHUNKING_PARAMS["overlap_all"],
+        )
+    elif ext == ".docx":
+        document = partition_docx(
+            file=data,
+            url=None,
+            max_characters=CHUNKING_PARAMS["max_characters"],
+            overlap=CHUNKING_PARAMS['overlap'],
+            chunking_strategy=CHUNKING_PARAMS["chunking_strategy"],
+            overlap_all=CHUNKING_PARAMS["overlap_all"],
+        )
+    elif ext == ".md":
+        document = partition_md(
+            file=data,
+            url=None,
+            max_characters=CHUNKING_PARAMS["max_characters"],
+            overlap=CHUNKING_PARAMS['overlap'],
+            chunking_strategy=CHUNKING_PARAMS["chunking_strategy"],
+            overlap_all=CHUNKING_PARAMS["overlap_all"],
+        )
+    else:
+        raise ValueError(f"Unsupported file extension: {ext}")
+
+    return document
+
+
+def parsing_pdf(data):
+    """This function makes a parsing of pdf by using a intermediate step by parsing parsing pdf as HTML files
+
+    Args:
+        data: PDF Data from uploaded file
+
+    Returns:
+        Parsing elements from unstructured
+    """
+
+    output_string = StringIO()
+    extract_text_to_fp(
+        data, output_string, laparams=LAParams(), output_type="html", codec=None
+    )
+    content = output_string.getvalue().strip()
+    document = partition_html(
+        text=content,
+        max_characters=CHUNKING_PARAMS["max_characters"],
+        overlap=CHUNKING_PARAMS['overlap'],
+        chunking_strategy=CHUNKING_PARAMS["chunking_strategy"],
+        overlap_all=CHUNKING_PARAMS["overlap_all"],
+    )
+    return document
+
+
+def count_pdf_pages(path: str) -> int:
+    """Returns the number of pages of a pdf without laying out its content
+
+    Args:
+        path (str): Path of the pdf file
+
+    Returns:
+        int: The number of pages
+    """
+    with open(path, "rb") as fp:
+        document = PDFDocument(PDFParser(fp))
+        pages = resolve1(document.catalog.get("Pages"))
+        if isinstance(pages, dict) and isinstance(resolve1(pages.get("Count")), int):
+            return resolve1(pages.get("Count"))
+        # The page tree does not advertise its size, we walk it
+        return sum(1 for _ in PDFPage.create_pages(document))
+
+
+class PdfWindowHTMLConverter(HTMLConverter):
+    """HTMLConverter of a window of pages, the index of the pages is only written after the last window, as it is
+    written once at the end of the document when it is parsed at once
+    """
+
+    def __init__(self, *args, last_window: bool, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.last_window = last_window
+
+    def write_footer(self) -> None:
+        if self.last_window:
+            super().write_footer()
+        else:
+            self.write("</body></html>\n")
+
+
+def parsing_pdf_pages(path: str, first_page: int, last_page: int, last_window: bool = True):
+    """Same partitioning as parsing_pdf, restricted to a window of pages so that only this window is held in memory
+
+    The elements are not chunked here, see PdfWindowChunker which chunks the windows in the document order
+
+    Args:
+        path (str): Path of the pdf file
+        first_page (int): Index of the first page of the window (0-based, included)
+        last_page (int): Index of the last page of the window (0-based, excluded)
+        last_window (bool): Whether the window holds the last page of the document
+
+    Returns:
+        Parsing elements from unstructured
+    """
+
+    output_string = StringIO()
+    with open(path, "rb") as fp:
+        resource_manager = PDFResourceManager(caching=True)
+        # We start the page numbering at the window so that the page anchors match the whole document ones
+        device = PdfWindowHTMLConverter(
+            resource_manager,
+            output_string,
+            codec=None,
+            pageno=first_page + 1,
+            laparams=LAParams(),
+            last_window=last_window,
+        )
+        interpreter = PDFPageInterpreter(resource_manager, device)
+        for page in PDFPage.get_pages(fp, set(range(first_page, last_page))):
+            interpreter.process_page(page)
+        device.close()
+
+    content = output_string.getvalue().strip()
+    if len(content) == 0:
+        return []
+    return partition_html(text=content)
+
+
+class PdfWindowChunker:
+    """Chunks the windows of pages of a pdf, fed in the document order, like the whole document would be
+
+    Only the last chunk of a window depends on the content that follows it (it could have been filled with it, or
+    combined with the next small section), so its elements are carried over and chunked with the next window. The
+    overlap tail of the last emitted chunk is carried as well and prefixed to the first element of the next window
+    """
+
+    def __init__(self):
+        self.carried_elements: List[Element] = []
+        self.overlap_prefix = ""
+
+    def chunk(self, element_dicts: List[Dict[str, Any]], last: bool) -> List[Dict[str, Any]]:
+        """Chunks the elements of the next window
+
+        Args:
+            element_dicts (List[Dict[str, Any]]): The unchunked elements of the window, as returned by parse_pdf_window
+            last (bool): Whether this is the last window of the document, nothing is carried over after it
+
+        Returns:
+            List[Dict[str, Any]]: The chunk records of the window
+        """
+        elements = self.carried_elements + elements_from_dicts(element_dicts)
+        self.carried_elements = []
+        if len(elements) == 0:
+            return []
+        prefixed_elements = elements
+        if self.overlap_prefix:
+            # Same layout as the overlap added by unstructured at the start of a chunk
+            first_element = deepcopy(elements[0])
+            separator = "\n" if isinstance(first_element, Table) else "\n\n"
+            first_element.text = separator.join(text for text in (self.overlap_prefix, first_element.text) if text)
+            prefixed_elements = [first_element] + elements[1:]
+        chunks = chunk_by_title(
+            prefixed_elements,
+            max_characters=CHUNKING_PARAMS["max_characters"],
+            overlap=CHUNKING_PARAMS["overlap"],
+            overlap_all=CHUNKING_PARAMS["overlap_all"],
+        )
+        # The rest of a split oversized element and the tables are chunks on their own whatever follows them
+        if not last and chunks and not chunks[-1].metadata.is_continuation and not isinstance(chunks[-1], Table):
+            carried_elements = chunks.pop().metadata.orig_elements
+            if carried_elements[0] is prefixed_elements[0]:
+                # The whole window fits in this chunk, it is carried over with the same overlap prefix
+                carried_elements = elements
+            self.carried_elements = carried_elements
+        if CHUNKING_PARAMS["overlap_all"] and chunks:
+            self.overlap_prefix = chunks[-1].text[-CHUNKING_PARAMS["overlap"]:].strip()
+        return elements_to_records(chunks)
+
+
+def elements_to_records(elements: List[Any]) -> List[Dict[str, Any]]:
+    """Converts unstructured elements into picklable chunk records
+
+    Args:
+        elements (List[Any]): Parsing elements from unstructured
+
+    Returns:
+        List[Dict[str, Any]]: One record per chunk, with the flattened metadata as keys
+    """
+    if len(elements) == 0:
+        return []
+    return convert_to_dataframe(elements).to_dict(orient="records")
+
+
+def parse_file(filename: str, content: bytes) -> List[Dict[str, Any]]:
+    """Parses and chunks a file, this is the entrypoint of the parsing worker processes
+
+    Args:
+        filename (str): filename to get extension
+        content (bytes): Raw content of the uploaded file
+
+    Returns:
+        List[Dict[str, Any]]: The chunk records
+    """
+    if NATIVE_TEXT_CHUNKER and os.path.splitext(filename)[-1].lower() in (".txt", ".md"):
+        # Plain texts do not need the unstructured elements model
+        return chunk_text_file(filename=filename, content=content, chunking_params=CHUNKING_PARAMS)
+    return elements_to_records(partition_file(filename=filename, data=BytesIO(content)))
+
+
+def parse_pdf_window(path: str, first_page: int, last_page: int, last_window: bool) -> List[Dict[str, Any]]:
+    """Parses a window of pages of a pdf, this is an entrypoint of the parsing worker processes
+
+    The elements are chunked by the consumer with PdfWindowChunker, so that the sections spanning two windows
+    are not cut at the window boundary
+
+    Args:
+        path (str): Path of the pdf file, shared with the worker through the filesystem
+        first_page (int): Index of the first page of the window (0-based, included)
+        last_page (int): Index of the last page of the window (0-based, excluded)
+        last_window (bool): Whether the window holds the last page of the document
+
+    Returns:
+        List[Dict[str, Any]]: The unchunked elements, as dicts
+    """
+    return elements_to_dicts(parsing_pdf_pages(path, first_page, last_page, last_window))
+
+
+def warm_up_worker():
+    """Initializes a parsing worker process
+
+    The heavy modules are already imported with this module, we run a tiny partition so that the lazy
+    resources (nltk data, html parser, ...) are loaded before the first real document reaches the worker
+    """
+    try:
+        partition_text(
+            text="Warm up.",
+            max_characters=CHUNKING_PARAMS["max_characters"],
+            chunking_strategy=CHUNKING_PARAMS["chunking_strategy"],
+        )
+    except Exception:
+        # A failing warm up must not break the pool, the error will surface on the first real document
+        pass
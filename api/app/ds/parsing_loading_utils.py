@@ -1,43 +1,44 @@
 import os
 import re
+import shutil
 import uuid
-from io import StringIO, BytesIO
-from tempfile import SpooledTemporaryFile
-from typing import List
+from tempfile import NamedTemporaryFile, SpooledTemporaryFile
+from typing import Callable, Dict, Iterator, List, Optional
 
-import enchant
 import pandas as pd
 from fastapi import HTTPException, status
-from pdfminer.high_level import extract_text_to_fp
-from pdfminer.layout import LAParams
 from qdrant_client.http import models
-from unstructured.partition.docx import partition_docx
-from unstructured.partition.html import partition_html
-from unstructured.partition.md import partition_md
-from unstructured.partition.odt import partition_odt
-from unstructured.partition.text import partition_text
-from unstructured.staging.base import convert_to_dataframe
 
 import app.ds.ds_utils as ds_utils
+from app.config.ingestion import (
+    FIAB_MODE,
+    PDF_STREAMING_WINDOW,
+    QDRANT_UPSERT_BATCH_SIZE,
+    QDRANT_UPSERT_CONCURRENCY,
+)
 from app.config.logger import logger
-from app.config.openai import client as openai_client
-from app.config.prompts import prompts_config
 from app.config.qdrant import BASE_COLLECTION_NAME
 from app.config.qdrant import client as qdrant_client
+from app.ds.fiab import fiab_document
+from app.ds.parsing_pool import iter_pdf_windows_in_pool, parse_in_pool
+from app.ds.preprocessed_files import PREPROCESSED_EXTENSIONS, iter_preprocessed_batches, prefetch
+from app.ds.text_quality import get_vocabulary_scorer
+from app.utils.executors import create_executor
+from app.utils.hashing import record_hash, text_hash
 from app.utils.input_sanitizers import sanitize_input_docs
 
-CHUNKING_PARAMS = {
-    "max_characters": 1024,
-    "overlap": 128,
-    "overlap_all": True,
-    "chunking_strategy": "by_title"
-}
+# Namespace of the chunks point ids, it must never change: the ids of the points already recorded derive from it
+POINT_ID_NAMESPACE = uuid.UUID("5b0b7a52-4f0e-4c8e-9a53-2f0d6c1e8b47")
+
+# Shared by all the ingestions of the process, so that the number of upserts in flight is bounded
+upsert_executor = create_executor("qdrant_upsert", QDRANT_UPSERT_CONCURRENCY)
 
 
 def load_data_from_file(filename: str, data: SpooledTemporaryFile) -> pd.DataFrame:
     """This function allows to load different type of files
 
-    Supported files format : pdf, text
+    Supported files format : pdf, html, txt, odt, docx, md
+    The parsing itself is dispatched to the parsing process pool so that it does not hold the API process GIL
 
     Args:
         filename (str): filename to get extension
@@ -45,171 +46,229 @@ def load_data_from_file(filename: str, data: SpooledTemporaryFile) -> pd.DataFra
 
 
     Returns:
-        Parsing elements from unstructured
+        pd.DataFrame: The chunk records returned by the parsing pool
 
     """
-    ext = os.path.splitext(filename)[-1].lower()
-    if ext == ".pdf":
-        document = parsing_pdf(data)
-    elif ext == ".html":
-        document = partition_html(
-            file=data,
-            max_characters=CHUNKING_PARAMS["max_characters"],
-            overlap=CHUNKING_PARAMS['overlap'],
-            chunking_strategy=CHUNKING_PARAMS["chunking_strategy"],
-            overlap_all=CHUNKING_PARAMS["overlap_all"],
-        )
-    elif ext == ".txt":
-        document = partition_text(
-            file=data,
-            url=None,
-            max_characters=CHUNKING_PARAMS["max_characters"],
-            overlap=CHUNKING_PARAMS['overlap'],
-            chunking_strategy=CHUNKING_PARAMS["chunking_strategy"],
-            overlap_all=CHUNKING_PARAMS["overlap_all"],
-        )
-    elif ext == ".odt":
-        document = partition_odt(
-            file=data,
-            url=None,
-            max_characters=CHUNKING_PARAMS["max_characters"],
-            overlap=CHUNKING_PARAMS['overlap'],
-            chunking_strategy=CHUNKING_PARAMS["chunking_strategy"],
-            overlap_all=CHUNKING_PARAMS["overlap_all"],
-        )
-    elif ext == ".docx":
-        document = partition_docx(
-            file=data,
-            url=None,
-            max_characters=CHUNKING_PARAMS["max_characters"],
-            overlap=CHUNKING_PARAMS['overlap'],
-            chunking_strategy=CHUNKING_PARAMS["chunking_strategy"],
-            overlap_all=CHUNKING_PARAMS["overlap_all"],
-        )
-    elif ext == ".md":
-        document = partition_md(
-            file=data,
-            url=None,
-            max_characters=CHUNKING_PARAMS["max_characters"],
-            overlap=CHUNKING_PARAMS['overlap'],
-            chunking_strategy=CHUNKING_PARAMS["chunking_strategy"],
-            overlap_all=CHUNKING_PARAMS["overlap_all"],
-        )
+    records = parse_in_pool(filename=filename, content=data.read())
+    if len(records) == 0:
+        logger.warning(f"No content could be extracted from {filename}")
+        return pd.DataFrame(columns=["text", "element_id", "filetype"])
+    return pd.DataFrame.from_records(records)
 
-    return document
+
+def check_voc(text: str, custom_vocabulary: List[str] = [], threshold: float = 0.8) -> bool:
+    """Check if the text contains a ratio of french words
+
+    Args:
+        text (str): Input text for checking
+        custom_vocabulary : Additional vocabulary to test
+        threshold (float, optional): Minimal ration of french words. Defaults to 0.8.
+
+    Returns:
+        bool: a Boolean to indicates the "quality" of the text
+    """
+    return bool(
+        get_vocabulary_scorer().need_fiab(
+            pd.Series([text]), custom_vocabulary=custom_vocabulary, threshold=threshold
+        ).iloc[0]
+    )
 
 
-def parsing_pdf(data: SpooledTemporaryFile):
-    """This function makes a parsing of pdf by using a intermediate step by parsing parsing pdf as HTML files
+def clean_text(text: str) -> str:
+    """This function clean text of extraspace
 
     Args:
+        text (str): Input text for cleaning
+
+    Returns:
+        str: clean text
+    """
+    return re.sub("\n", " \n", text)
+
+
+def load_pdf_by_windows(filename: str, data: SpooledTemporaryFile) -> Iterator[pd.DataFrame]:
+    """This function loads a pdf window of pages after window of pages
+
+    The file is spilled to disk once so that the parsing workers can read the pages they need,
+    each window is parsed in the parsing process pool and yielded as soon as it is available
+
+    Args:
+        filename (str): The name of the uploaded file
         data (SpooledTemporaryFile): PDF Data from uploaded file
 
     Returns:
-        Parsing elements from unstructured
+        Iterator[pd.DataFrame]: The chunk records of each window
     """
+    with NamedTemporaryFile(suffix=".pdf", delete=False) as tmp_file:
+        shutil.copyfileobj(data, tmp_file)
+    try:
+        for records in iter_pdf_windows_in_pool(tmp_file.name, window_size=PDF_STREAMING_WINDOW):
+            if len(records) > 0:
+                yield pd.DataFrame.from_records(records)
+    except Exception as e:
+        logger.error(f"Error while parsing {filename} by windows of pages")
+        raise e
+    finally:
+        os.remove(tmp_file.name)
+
+
+def prepare_document(
+        document: pd.DataFrame,
+        filename: str,
+        fiab_model: str,
+        apply_fiab: bool,
+        progress: Optional[Callable[[str, str], None]] = None,
+) -> pd.DataFrame:
+    """This function cleans and checks parsed chunks, and applies LLM reliability on the low quality ones
 
-    output_string = StringIO()
-    extract_text_to_fp(
-        data, output_string, laparams=LAParams(), output_type="html", codec=None
-    )
-    content = output_string.getvalue().strip()
-    document = partition_html(
-        text=content,
-        max_characters=CHUNKING_PARAMS["max_characters"],
-        overlap=CHUNKING_PARAMS['overlap'],
-        chunking_strategy=CHUNKING_PARAMS["chunking_strategy"],
-        overlap_all=CHUNKING_PARAMS["overlap_all"],
-    )
+    Args:
+        document (pd.DataFrame): The parsed chunks
+        filename (str): The name of the uploaded file
+        fiab_model (str): LLM used for the reliability
+        apply_fiab (bool): Parameter to activate reliability
+        progress (Callable[[str, str], None], optional): Called with (stage, message) as the reliability progresses
+
+    Returns:
+        pd.DataFrame: The chunks ready to be recorded
+    """
+    if "filename" not in document.columns:
+        document["filename"] = filename
+    logger.info("Ingestion step 2 : Reliability")
+    document["text"] = document.text.apply(clean_text)
+    # The hash of the text before reliability identifies the chunk, whatever the LLM outputs
+    # (the text hash normalizes the whitespaces, it is the same before and after clean_text)
+    if "chunk_hash" not in document.columns:
+        document["chunk_hash"] = document.text.apply(text_hash)
+    # Check document input
+    document["security_check"] = sanitize_input_docs(document.text.to_list())
+    if apply_fiab:
+        document["need_fiab"] = get_vocabulary_scorer().need_fiab(document.text)
+        if FIAB_MODE == "deferred":
+            # The chunks are recorded as is with their 'need_fiab' flag, the reliability worker will upgrade them
+            return document
+        to_fiab = document[document["need_fiab"]]
+        if len(to_fiab) > 0:
+            to_fiab["text"] = fiab_document(
+                to_fiab.text.to_list(), model=fiab_model, progress=progress
+            )
+            to_fiab["need_fiab"] = False
+            to_keep = document[~document["need_fiab"]]
+            document = pd.concat((to_fiab, to_keep))
     return document
 
 
-def split_dataframe(df: pd.DataFrame, chunk_size: int = 100) -> List[pd.DataFrame]:
-    """This function split dataframe for embedding computation
+def iter_parsed_documents(filename: str, data: SpooledTemporaryFile) -> Iterator[pd.DataFrame]:
+    """This function parses a file, by windows of pages for the pdf files (see PDF_STREAMING_WINDOW)
 
     Args:
-        df (pd.DataFrame): Input dataframe containing text to embed
-        chunk_size (int, optional): size of each partition. Defaults to 100.
+        filename (str): The name of the uploaded file
+        data (SpooledTemporaryFile): Data associated to the uploaded file
 
     Returns:
-        List[pd.DataFrame]: Splited dataframe
+        Iterator[pd.DataFrame]: The parsed chunks, in one or several parts
     """
-    chunks = list()
-    num_chunks = len(df) // chunk_size + 1
-    for i in range(num_chunks):
-        chunks.append(df[i * chunk_size: (i + 1) * chunk_size])
-    return chunks
+    if os.path.splitext(filename)[-1].lower() == ".pdf" and PDF_STREAMING_WINDOW > 0:
+        yield from load_pdf_by_windows(filename=filename, data=data)
+    else:
+        yield load_data_from_file(filename=filename, data=data)
 
 
-def fiab_document(texts: List[str], model: str) -> List[str]:
-    """This function increase parsing quality by using LLM to correct potential mistakes
+def get_recorded_chunk_hashes(index: str, filename: str) -> Dict[str, Optional[str]]:
+    """Returns the chunk hash of each point recorded for a file
 
     Args:
-        texts (List[str]): Input texts
-        model (str, optional): LLM used for the "parsing". Defaults to "mistral-7b-awq".
+        index (str): index of the user or the "collection"
+        filename (str): The name under which the file was ingested
 
     Returns:
-        List[str]: _description_
+        Dict[str, Optional[str]]: The chunk hash by point id, None for the points recorded without chunk hash
     """
-    prompt = prompts_config['fiab']['process'][model]['prompt']
-    inputs = [prompt.format(document=t) for t in texts]
-    # output = openai_client.completions.create(
-    #     prompt=inputs, model=model, max_tokens=1024, temperature=0.0, top_p=0.01
-    # )
-    # return [re.sub(r"Document fiabilisé:?", "", t.text) for t in output.choices]
-    outputs = []
-    for input in inputs:
-        output = openai_client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "user", "content": input}
-            ]
+    scroll_filter = models.Filter(
+        must=[
+            models.FieldCondition(key="index", match=models.MatchValue(value=str(index))),
+            models.FieldCondition(key="filename", match=models.MatchValue(value=str(filename))),
+        ]
+    )
+    chunk_hashes = {}
+    offset = None
+    while True:
+        points, offset = qdrant_client.scroll(
+            collection_name=BASE_COLLECTION_NAME,
+            scroll_filter=scroll_filter,
+            limit=1000,
+            offset=offset,
+            with_payload=["chunk_hash"],
+            with_vectors=False,
         )
-        outputs.append( output.choices[0])
-    return [re.sub(r"Document fiabilisé:?", "", t.message.content) for t in outputs]
+        chunk_hashes.update({str(point.id): point.payload.get("chunk_hash") for point in points})
+        if offset is None:
+            return chunk_hashes
 
 
-def check_voc(text: str, custom_vocabulary: List[str] = [], threshold: float = 0.8) -> bool:
-    """Check if the text contains a ratio of french words
+def copy_recorded_chunks(source_index: str, source_filename: str, index: str, filename: str) -> int:
+    """Records the chunks of a file already ingested under another index or name, without parsing nor embedding it
+
+    The points keep their vector and payload, only their index, filename and id change
 
     Args:
-        text (str): Input text for checking
-        custom_vocabulary : Additional vocabulary to test
-        threshold (float, optional): Minimal ration of french words. Defaults to 0.8.
+        source_index (str): index under which the chunks were recorded
+        source_filename (str): name under which the chunks were recorded
+        index (str): index of the user or the "collection"
+        filename (str): The name under which the file is ingested
 
     Returns:
-        bool: a Boolean to indicates the "quality" of the text
+        int: The number of chunks recorded
     """
-    fr_voc = enchant.Dict("fr_FR")
-    en_voc = enchant.Dict("en_US")
-    score = 0
-    if len(text) > 0:
-        for w in text.split():
-            if fr_voc.check(w.lower()):
-                score += 1
-            elif en_voc.check(w.lower()):
-                score += 1
-            elif w.lower() in custom_vocabulary:
-                score += 1
-        mean_score = score / len(text.split())
-        if mean_score < threshold:
-            return True
-        else:
-            return False
-    else:
-        return False
+    scroll_filter = models.Filter(
+        must=[
+            models.FieldCondition(key="index", match=models.MatchValue(value=str(source_index))),
+            models.FieldCondition(key="filename", match=models.MatchValue(value=str(source_filename))),
+        ]
+    )
+    nb_chunks = 0
+    offset = None
+    while True:
+        points, offset = qdrant_client.scroll(
+            collection_name=BASE_COLLECTION_NAME,
+            scroll_filter=scroll_filter,
+            limit=1000,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        # The points recorded without chunk hash get the hash of their text
+        chunk_hashes = [point.payload.get("chunk_hash") or text_hash(point.payload["text"]) for point in points]
+        upsert_points([
+            models.PointStruct(
+                id=point_id,
+                vector=point.vector,
+                payload={**point.payload, "index": index, "filename": filename, "chunk_hash": chunk_hash},
+            )
+            for point, point_id, chunk_hash in zip(
+                points, point_ids(index, filename, chunk_hashes), chunk_hashes
+            )
+        ])
+        nb_chunks += len(points)
+        if offset is None:
+            return nb_chunks
 
 
-def clean_text(text: str) -> str:
-    """This function clean text of extraspace
+def record_document(document: pd.DataFrame, filename: str, embedding_model: str, index: str, preprocessed: bool):
+    """This function records a document into Qdrant
 
     Args:
-        text (str): Input text for cleaning
-
-    Returns:
-        str: clean text
+        document (pd.DataFrame): The chunks to record
+        filename (str): The name under which the file is ingested
+        embedding_model (str): Model for embedding computing
+        index (str): index of the user or the "collection"
+        preprocessed (bool): Whether the document comes from a preprocessed file
     """
-    return re.sub("\n", " \n", text)
+    logger.info("Step 2 : Recording")
+    logger.info(document)
+    if len(document) > 0:
+        record_in_qdrant(
+            df=document, filename=filename, embedding_model=embedding_model, index=index, preprocessed=preprocessed
+        )
 
 
 def ingest_data(
@@ -219,11 +278,15 @@ def ingest_data(
         embedding_model: str,
         fiab_model: str,
         apply_fiab: bool = False,
-        preprocessed: bool = False
+        preprocessed: bool = False,
+        progress: Optional[Callable[[str, str], None]] = None,
 ):
     """This function ingest data into Qdrant database by applying special parsing for a given type of document.
     It applies also LLM reliability to increase parsing quality
 
+    Pdf files are streamed by windows of PDF_STREAMING_WINDOW pages: each window is recorded while the next ones
+    are being parsed. Preprocessed files (csv or parquet) are streamed by batches of rows the same way
+
     Args:
         filename (str): The name of the uploaded file
         data (SpooledTemporaryFile): Data associated to the uploaded file
@@ -231,52 +294,104 @@ def ingest_data(
         generate_for_eval (bool, optional): Generation of question answer. This functionnality is only for admin purpose. Defaults to False.
         apply_fiab (bool, optional): Parameter to activate reliability. Defaults to False
         preprocess (boon optional)
+        progress (Callable[[str, str], None], optional): Called with (stage, message) as the ingestion progresses
     """
+    progress = progress if progress is not None else lambda stage, message: None
     data.seek(0)
     logger.info("Ingestion step 1 : Parsing")
-    if preprocessed or os.path.splitext(filename)[-1].lower() == ".csv":
-        if os.path.splitext(filename)[-1].lower() == ".csv":
-            buffer = BytesIO(data.read())
-            document = pd.read_csv(buffer)
-            document = document.dropna()
-        else:
-            logger.error("Only CSV are accepted as preprocess file")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Only CSV are accepted as preprocess file",
+    progress("parsing", "Lecture du fichier...")
+    extension = os.path.splitext(filename)[-1].lower()
+    if preprocessed or extension in PREPROCESSED_EXTENSIONS:
+        # Each batch is recorded while the next one is read
+        nb_chunks = 0
+        for document in prefetch(iter_preprocessed_batches(filename=filename, data=data)):
+            record_document(
+                document, filename=filename, embedding_model=embedding_model, index=index, preprocessed=preprocessed
+            )
+            nb_chunks += len(document)
+            progress("recording", f"{nb_chunks} chunks enregistrés...")
+    elif extension == ".pdf" and PDF_STREAMING_WINDOW > 0:
+        nb_chunks = 0
+        for window in load_pdf_by_windows(filename=filename, data=data):
+            document = prepare_document(
+                window, filename=filename, fiab_model=fiab_model, apply_fiab=apply_fiab, progress=progress
+            )
+            record_document(
+                document, filename=filename, embedding_model=embedding_model, index=index, preprocessed=preprocessed
             )
+            nb_chunks += len(document)
+            progress("recording", f"{nb_chunks} chunks enregistrés...")
     else:
-        document = convert_to_dataframe(
-            load_data_from_file(filename=filename, data=data)
+        document = load_data_from_file(filename=filename, data=data)
+        document = prepare_document(
+            document, filename=filename, fiab_model=fiab_model, apply_fiab=apply_fiab, progress=progress
         )
-        if "filename" not in document.columns:
-            document["filename"] = filename
-        logger.info("Ingestion step 2 : Reliability")
-        document["text"] = document.text.apply(clean_text)
-        # Check document input
-        document["security_check"] = document.text.apply(sanitize_input_docs)
-        if apply_fiab:
-            document["need_fiab"] = document.text.apply(check_voc)
-            to_fiab = document[document["need_fiab"]]
-            if len(to_fiab) > 0:
-                to_fiab["text"] = fiab_document(
-                    to_fiab.text.to_list(), model=fiab_model
-                )
-                to_keep = document[~document["need_fiab"]]
-                document = pd.concat((to_fiab, to_keep))
-    logger.info("Step 2 : Recording")
-    logger.info(document)
-    chunks = split_dataframe(document, chunk_size=100)
-    for chunk in chunks:
-        if len(chunk) > 0:
-            record_in_qdrant(df=chunk, embedding_model=embedding_model, index=index, preprocessed=preprocessed)
+        progress("recording", "Enregistrement des chunks...")
+        record_document(
+            document, filename=filename, embedding_model=embedding_model, index=index, preprocessed=preprocessed
+        )
+    progress("completed", "Fichier intégré")
+
+
+def point_ids(index: str, filename: str, chunk_hashes: List[str]) -> List[str]:
+    """Returns the deterministic ids of chunks points
+
+    The id only depends on the index, the file and the chunk content, so that ingesting the same file again
+    overwrites its points instead of duplicating them
+
+    Args:
+        index (str): index of the documents
+        filename (str): The name under which the file is ingested
+        chunk_hashes (List[str]): The hash of each chunk, see record_in_qdrant
+
+    Returns:
+        List[str]: The point ids, in the same order as the chunks
+    """
+    return [
+        str(uuid.uuid5(POINT_ID_NAMESPACE, f"{index}/{filename}/{chunk_hash}"))
+        for chunk_hash in chunk_hashes
+    ]
+
+
+def upsert_points(points: List[models.PointStruct]):
+    """Upserts points into Qdrant by batches, with several batches in flight
+
+    All the batches but the last one are sent without waiting for their indexing. The last one is sent once the
+    others are acknowledged and waits for its indexing: Qdrant applies the updates of the collection in order,
+    so the points are all searchable when this function returns
 
+    Args:
+        points (List[models.PointStruct]): The points to upsert
+    """
+    batches = [
+        points[i:i + QDRANT_UPSERT_BATCH_SIZE] for i in range(0, len(points), QDRANT_UPSERT_BATCH_SIZE)
+    ]
+    if len(batches) == 0:
+        return
+
+    def upsert(batch: List[models.PointStruct], wait: bool):
+        operation_info = qdrant_client.upsert(collection_name=BASE_COLLECTION_NAME, wait=wait, points=batch)
+        if operation_info.status not in (models.UpdateStatus.ACKNOWLEDGED, models.UpdateStatus.COMPLETED):
+            logger.error("Upload failed")
+            raise Exception("Upload failed")
 
-def record_in_qdrant(df: pd.DataFrame, embedding_model: str, index: str, preprocessed: bool):
+    # map raises the first error of the batches
+    list(upsert_executor.map(lambda batch: upsert(batch, wait=False), batches[:-1]))
+    upsert(batches[-1], wait=True)
+
+
+def record_in_qdrant(df: pd.DataFrame, filename: str, embedding_model: str, index: str, preprocessed: bool):
     """Record a dataframe into Qdrant database with its embedding
 
+    The embeddings of the whole dataframe are computed at once, so that the embedding batcher can pack them by
+    tokens and request them concurrently. The points ids are derived from the file and the chunks hash: the hash of
+    the text, before reliability, for the parsed chunks, the chunks of a file sharing the same text being recorded
+    once, and the hash of the whole row for the rows of a preprocessed file, which may share a text with different
+    metadata
+
     Args:
         df (pd.DataFrame): Input Dataframe
+        filename (str): The name under which the file is ingested
         embedding_model (str): Model for embedding computing
         index (str): index of the documents (persistent database or not)
         preprocessed (bool)
@@ -284,23 +399,93 @@ def record_in_qdrant(df: pd.DataFrame, embedding_model: str, index: str, preproc
     """
     if "text" not in df.columns:
         raise ValueError("Text must be in df columns")
+    if "chunk_hash" not in df.columns:
+        if preprocessed or os.path.splitext(filename)[-1].lower() in PREPROCESSED_EXTENSIONS:
+            df["chunk_hash"] = [record_hash(record) for record in df.to_dict(orient="records")]
+        else:
+            df["chunk_hash"] = df.text.apply(text_hash)
     df["index"] = index
-    df = df.reset_index(drop=True)  # Sync for the loop
-    text = df.text.to_list()
-    embs = ds_utils.compute_embedding(text, model=embedding_model)
-    columns_to_keep = df.columns if preprocessed else ['text', 'element_id', 'index', 'filetype', 'filename']
-    df_dict = [row.to_dict() for _, row in df[columns_to_keep].iterrows()]
-    docs = [
-        models.PointStruct(
-            id=str(uuid.uuid4()),
-            vector=embs[i],
-            payload=df_dict[i],
-        )
-        for i in range(len(df_dict))
+    df["point_id"] = point_ids(index, filename, df.chunk_hash)
+    df = df.drop_duplicates(subset="point_id")
+    embs = ds_utils.compute_embedding(df.text.to_list(), model=embedding_model)
+    columns_to_keep = [
+        column for column in df.columns if column != "point_id"
+    ] if preprocessed else ['text', 'element_id', 'index', 'filetype', 'filename', 'chunk_hash']
+    if not preprocessed and "need_fiab" in df.columns:
+        columns_to_keep = [*columns_to_keep, "need_fiab"]
+    payloads = df[columns_to_keep].to_dict(orient="records")
+    points = [
+        models.PointStruct(id=point_id, vector=emb, payload=payload)
+        for point_id, emb, payload in zip(df.point_id, embs, payloads)
     ]
-    operation_info = qdrant_client.upsert(
-        collection_name=BASE_COLLECTION_NAME, wait=True, points=docs
-    )
-    if operation_info.status.value != "completed":
-        logger.error("Upload failed")
-        raise Exception("Upload failed")
+    upsert_points(points)
+
+
+def update_data(
+        filename: str,
+        data: SpooledTemporaryFile,
+        index: str,
+        embedding_model: str,
+        fiab_model: str,
+        apply_fiab: bool = False,
+        progress: Optional[Callable[[str, str], None]] = None,
+) -> Dict[str, int]:
+    """This function replaces a file already ingested into Qdrant by its new version
+
+    The new version is parsed and its chunks are compared, by chunk hash, with the points recorded for the file:
+    only the new chunks go through the reliability and the embedding, the points of the chunks that vanished are
+    removed and the others are left untouched
+
+    Args:
+        filename (str): The name under which the file was ingested
+        data (SpooledTemporaryFile): Data associated to the new version of the file
+        index (str): index of the user or the "collection"
+        embedding_model (str): Model for embedding computing
+        fiab_model (str): LLM used for the reliability
+        apply_fiab (bool, optional): Parameter to activate reliability. Defaults to False
+        progress (Callable[[str, str], None], optional): Called with (stage, message) as the update progresses
+
+    Returns:
+        Dict[str, int]: The number of chunks added, removed and unchanged
+    """
+    progress = progress if progress is not None else lambda stage, message: None
+    if os.path.splitext(filename)[-1].lower() in PREPROCESSED_EXTENSIONS:
+        logger.error("Preprocessed files cannot be updated")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Preprocessed files cannot be updated, they must be removed and uploaded again",
+        )
+    data.seek(0)
+    progress("parsing", "Lecture du fichier...")
+    recorded = get_recorded_chunk_hashes(index, filename)
+    recorded_hashes = set(recorded.values())
+
+    chunk_hashes = set()
+    nb_added = 0
+    for document in iter_parsed_documents(filename=filename, data=data):
+        document["chunk_hash"] = document.text.apply(text_hash)
+        chunk_hashes.update(document.chunk_hash)
+        document = document[~document.chunk_hash.isin(recorded_hashes)].copy()
+        if len(document) == 0:
+            continue
+        document = prepare_document(
+            document, filename=filename, fiab_model=fiab_model, apply_fiab=apply_fiab, progress=progress
+        )
+        record_document(document, filename=filename, embedding_model=embedding_model, index=index, preprocessed=False)
+        nb_added += document.chunk_hash.nunique()
+        progress("recording", f"{nb_added} chunks modifiés enregistrés...")
+
+    vanished = [point_id for point_id, chunk_hash in recorded.items() if chunk_hash not in chunk_hashes]
+    if len(vanished) > 0:
+        qdrant_client.delete(
+            collection_name=BASE_COLLECTION_NAME,
+            points_selector=models.PointIdsList(points=vanished),
+            wait=True,
+        )
+    logger.info(f"{filename} updated: {nb_added} chunks added, {len(vanished)} removed")
+    progress("completed", f"Fichier mis à jour : {nb_added} chunks ajoutés, {len(vanished)} supprimés")
+    return {
+        "added": nb_added,
+        "removed": len(vanished),
+        "unchanged": len(recorded) - len(vanished),
+    }
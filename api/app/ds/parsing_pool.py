@@ -0,0 +1,95 @@
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List
+
+from app.config.ingestion import PARSING_WORKERS
+from app.config.logger import logger
+from app.ds.parsers import PdfWindowChunker, count_pdf_pages, parse_file, parse_pdf_window, warm_up_worker
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def get_parsing_pool() -> ProcessPoolExecutor:
+    """Returns the process pool used to parse documents, creating it on first use
+
+    The workers are spawned (not forked) since the API process holds threads and network clients,
+    and each of them preloads unstructured / pdfminer before accepting documents
+
+    Returns:
+        ProcessPoolExecutor: The parsing pool
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            logger.info(f"Starting the parsing pool with {PARSING_WORKERS} workers")
+            _pool = ProcessPoolExecutor(
+                max_workers=PARSING_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=warm_up_worker,
+            )
+        return _pool
+
+
+def start_parsing_pool():
+    """Starts the parsing pool and its workers so that the first upload does not pay their start-up time"""
+    pool = get_parsing_pool()
+    # The executor spawns its processes lazily, we submit a no-op task per worker to get them all running
+    for future in [pool.submit(warm_up_worker) for _ in range(PARSING_WORKERS)]:
+        future.result()
+
+
+def shutdown_parsing_pool():
+    """Stops the parsing pool workers"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def parse_in_pool(filename: str, content: bytes) -> List[Dict[str, Any]]:
+    """Parses and chunks a file in the parsing pool, blocking the calling thread until the records are available
+
+    Args:
+        filename (str): filename to get extension
+        content (bytes): Raw content of the uploaded file
+
+    Returns:
+        List[Dict[str, Any]]: The chunk records
+    """
+    return get_parsing_pool().submit(parse_file, filename, content).result()
+
+
+def iter_pdf_windows_in_pool(path: str, window_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Parses a pdf by windows of pages in the parsing pool and yields their chunk records in the document order
+
+    At most one window per worker is submitted ahead of the one being consumed, so the memory held is
+    proportional to the window size and not to the document size. The windows are partitioned by the workers and
+    chunked here in the document order, see PdfWindowChunker
+
+    Args:
+        path (str): Path of the pdf file, shared with the workers through the filesystem
+        window_size (int): Number of pages per window
+
+    Returns:
+        Iterator[List[Dict[str, Any]]]: The chunk records of each window
+    """
+    pool = get_parsing_pool()
+    nb_pages = pool.submit(count_pdf_pages, path).result()
+    windows = deque((first, min(first + window_size, nb_pages)) for first in range(0, nb_pages, window_size))
+    in_flight = deque()
+    chunker = PdfWindowChunker()
+    try:
+        while windows or in_flight:
+            while windows and len(in_flight) < PARSING_WORKERS:
+                first_page, last_page = windows.popleft()
+                in_flight.append(pool.submit(parse_pdf_window, path, first_page, last_page, last_page == nb_pages))
+            elements = in_flight.popleft().result()
+            yield chunker.chunk(elements, last=not windows and not in_flight)
+    finally:
+        # The consumer may stop early (error while recording), we don't keep parsing for nothing
+        for future in in_flight:
+            future.cancel()
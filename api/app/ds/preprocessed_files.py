@@ -0,0 +1,166 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, Iterator, TypeVar
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from fastapi import HTTPException, status
+
+from app.config.ingestion import PREPROCESSED_CSV_BLOCK_SIZE, PREPROCESSED_PARQUET_BATCH_SIZE
+from app.config.logger import logger
+
+PREPROCESSED_EXTENSIONS = (".csv", ".parquet")
+
+T = TypeVar("T")
+
+
+def check_text_column(schema: pa.Schema, filename: str):
+    """Checks that a preprocessed file has the text column
+
+    Args:
+        schema (pa.Schema): Schema of the file
+        filename (str): The name of the uploaded file
+
+    Raises:
+        HTTPException: If the text column is missing
+    """
+    if "text" not in schema.names:
+        logger.error(f"The preprocessed file {filename} has no 'text' column")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Preprocessed files must have a 'text' column",
+        )
+
+
+def infer_csv_column_types(
+    filename: str,
+    data: BinaryIO,
+    read_options: pa_csv.ReadOptions,
+) -> Dict[str, pa.DataType]:
+    """Infers the types of the columns of a preprocessed csv, reading it whole once without keeping its rows
+
+    The types are first inferred from the first block. A column whose values of a later block do not fit its type
+    is widened (integers to floats, then text) and the file is read again, so that the ingestion never fails
+    with its first blocks already recorded. The text, the empty columns and the dates are read as text: the values
+    are recorded as they appear in the file, like pandas does
+
+    Args:
+        filename (str): The name of the uploaded file
+        data (BinaryIO): Data associated to the uploaded file
+        read_options (pa_csv.ReadOptions): Options of the csv reader
+
+    Returns:
+        Dict[str, pa.DataType]: The type of each column
+    """
+    data.seek(0)
+    schema = pa_csv.open_csv(data, read_options=read_options).schema
+    check_text_column(schema, filename)
+    column_types = {
+        field.name: pa.string()
+        if field.name == "text" or pa.types.is_null(field.type) or pa.types.is_temporal(field.type)
+        else field.type
+        for field in schema
+    }
+    while True:
+        data.seek(0)
+        reader = pa_csv.open_csv(
+            data,
+            read_options=read_options,
+            convert_options=pa_csv.ConvertOptions(column_types=column_types, strings_can_be_null=True),
+        )
+        try:
+            for _ in reader:
+                pass
+            return column_types
+        except pa.ArrowInvalid as e:
+            match = re.search(r"CSV column #(\d+)", str(e))
+            if match is None or pa.types.is_string(column_types[schema.names[int(match.group(1))]]):
+                raise e
+            name = schema.names[int(match.group(1))]
+            column_types[name] = pa.float64() if pa.types.is_integer(column_types[name]) else pa.string()
+            logger.warning(f"The column {name} of {filename} is read as {column_types[name]}: {e}")
+
+
+def iter_csv_batches(filename: str, data: BinaryIO) -> Iterator[pd.DataFrame]:
+    """Reads a preprocessed csv block by block, with the types of infer_csv_column_types
+
+    Args:
+        filename (str): The name of the uploaded file
+        data (BinaryIO): Data associated to the uploaded file
+
+    Returns:
+        Iterator[pd.DataFrame]: The rows of each block, without the incomplete rows
+    """
+    read_options = pa_csv.ReadOptions(block_size=PREPROCESSED_CSV_BLOCK_SIZE)
+    column_types = infer_csv_column_types(filename, data, read_options)
+
+    data.seek(0)
+    # Empty values are missing values, like in pandas, so that dropna removes the incomplete rows
+    reader = pa_csv.open_csv(
+        data,
+        read_options=read_options,
+        convert_options=pa_csv.ConvertOptions(column_types=column_types, strings_can_be_null=True),
+    )
+    for batch in reader:
+        yield batch.to_pandas().dropna()
+
+
+def iter_parquet_batches(filename: str, data: BinaryIO) -> Iterator[pd.DataFrame]:
+    """Reads a preprocessed parquet file batch of rows by batch of rows
+
+    Args:
+        filename (str): The name of the uploaded file
+        data (BinaryIO): Data associated to the uploaded file
+
+    Returns:
+        Iterator[pd.DataFrame]: The rows of each batch, without the incomplete rows
+    """
+    parquet_file = pq.ParquetFile(data)
+    check_text_column(parquet_file.schema_arrow, filename)
+    for batch in parquet_file.iter_batches(batch_size=PREPROCESSED_PARQUET_BATCH_SIZE):
+        yield batch.to_pandas().dropna()
+
+
+def iter_preprocessed_batches(filename: str, data: BinaryIO) -> Iterator[pd.DataFrame]:
+    """Reads a preprocessed file (csv or parquet) batch by batch, so that the memory used does not depend on its size
+
+    Args:
+        filename (str): The name of the uploaded file
+        data (BinaryIO): Data associated to the uploaded file
+
+    Returns:
+        Iterator[pd.DataFrame]: The rows of each batch, without the incomplete rows
+    """
+    extension = os.path.splitext(filename)[-1].lower()
+    if extension == ".csv":
+        yield from iter_csv_batches(filename, data)
+    elif extension == ".parquet":
+        yield from iter_parquet_batches(filename, data)
+    else:
+        logger.error("Only CSV and Parquet are accepted as preprocess file")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Only CSV and Parquet are accepted as preprocess file",
+        )
+
+
+def prefetch(iterator: Iterator[T]) -> Iterator[T]:
+    """Iterates over an iterator with one item of advance, computed in a background thread
+
+    The next item (next batch read, next window parsed...) is produced while the caller processes the current one
+
+    Args:
+        iterator (Iterator[T]): The iterator, it is never advanced by two threads at once
+
+    Returns:
+        Iterator[T]: The items of the iterator
+    """
+    end = object()
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch") as executor:
+        next_item = executor.submit(next, iterator, end)
+        while (item := next_item.result()) is not end:
+            next_item = executor.submit(next, iterator, end)
+            yield item
@@ -0,0 +1,242 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from cachetools import TTLCache
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.embeddings import BaseEmbedding
+from tenacity import before_sleep_log, retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+
+from app.config.cache import (
+    QUERY_EMBEDDING_BATCH_MAX_SIZE,
+    QUERY_EMBEDDING_BATCH_WINDOW_MS,
+    QUERY_EMBEDDING_CACHE_ENABLED,
+    QUERY_EMBEDDING_CACHE_SIZE,
+    QUERY_EMBEDDING_CACHE_TTL,
+)
+from app.config.ingestion import EMBEDDING_MAX_RETRIES
+from app.config.logger import logger
+from app.config.openai import async_client as async_openai_client
+from app.config.redis import binary_client as redis_client
+from app.ds.embedding_batcher import RETRYABLE_ERRORS
+from app.utils.executors import redis_executor, run_in_executor
+from app.utils.hashing import text_hash
+
+
+class QueryEmbeddingService:
+    """Embeds the chat questions, memoized by (embedding model, normalized text hash)
+
+    Embeddings are looked up in an in-process TTL/LRU cache, then in redis where they expire after `ttl` seconds.
+    The questions missing from both caches within `batch_window` seconds are embedded with a single request, and
+    identical questions waiting for the same embedding share it. Any redis failure is logged and treated as a miss.
+    Must be used from the event loop of the API.
+
+    Args:
+        enabled (bool): Whether the caches are used, the micro-batching is always used
+        cache_size (int): Maximum number of embeddings kept in memory
+        ttl (int): Lifetime of the embeddings in memory and in redis, in seconds
+        batch_window (float): Time during which the missing questions are gathered, in seconds
+        batch_max_size (int): Maximum number of questions per request, a full batch is requested immediately
+    """
+
+    def __init__(self, enabled: bool, cache_size: int, ttl: int, batch_window: float, batch_max_size: int) -> None:
+        self.enabled = enabled
+        self.ttl = ttl
+        self.batch_window = batch_window
+        self.batch_max_size = batch_max_size
+        self._local = TTLCache(maxsize=cache_size, ttl=ttl)
+        # Questions waiting for the next batch, by key, with the future shared by all the requests asking for them
+        self._pending: Dict[str, Tuple[str, str, asyncio.Future]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flushes: Set[asyncio.Task] = set()
+        self._request = retry(
+            retry=retry_if_exception_type(RETRYABLE_ERRORS),
+            wait=wait_random_exponential(multiplier=0.5, max=10),
+            stop=stop_after_attempt(EMBEDDING_MAX_RETRIES),
+            before_sleep=before_sleep_log(logging.getLogger(__name__), logging.WARNING),
+            reraise=True,
+        )(self._request_batch)
+        self._stats = {
+            "memory_hits": 0,
+            "redis_hits": 0,
+            "coalesced": 0,
+            "misses": 0,
+            "requests": 0,
+        }
+
+    @staticmethod
+    def _key(text: str, model: str) -> str:
+        return f"query-embedding:{model}:{text_hash(text)}"
+
+    @staticmethod
+    async def _request_batch(texts: List[str], model: str) -> List[List[float]]:
+        embeddings = await async_openai_client.embeddings.create(model=model, input=texts)
+        return [e.embedding for e in embeddings.data]
+
+    def _get_redis(self, keys: List[str]) -> List[Optional[List[float]]]:
+        try:
+            values = redis_client.mget(keys)
+        except Exception as e:
+            logger.warning(f"Query embedding cache unavailable, the questions will be embedded: {e}")
+            return [None] * len(keys)
+        return [np.frombuffer(value, dtype=np.float32).tolist() if value is not None else None for value in values]
+
+    def _set_redis(self, entries: Dict[str, List[float]]):
+        try:
+            pipeline = redis_client.pipeline(transaction=False)
+            for key, embedding in entries.items():
+                pipeline.set(key, np.asarray(embedding, dtype=np.float32).tobytes(), ex=self.ttl)
+            pipeline.execute()
+        except Exception as e:
+            logger.warning(f"Error while storing query embeddings in the cache: {e}")
+
+    async def embed(self, text: str, model: str) -> List[float]:
+        """Returns the embedding of a question, from the caches or from the next batch
+
+        Args:
+            text (str): The question
+            model (str): Embedding model
+
+        Returns:
+            List[float]: The embedding
+        """
+        key = self._key(text, model)
+        if self.enabled and (embedding := self._local.get(key)) is not None:
+            self._stats["memory_hits"] += 1
+            return embedding
+
+        if (pending := self._pending.get(key)) is not None:
+            self._stats["coalesced"] += 1
+            future = pending[2]
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[key] = (text, model, future)
+            if len(self._pending) >= self.batch_max_size:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = asyncio.get_running_loop().call_later(self.batch_window, self._flush)
+        # The future is shared, a cancelled request must not cancel it for the others
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        """Sends the pending questions as a batch"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, {}
+        if len(batch) > 0:
+            task = asyncio.create_task(self._embed_batch(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _embed_batch(self, batch: Dict[str, Tuple[str, str, asyncio.Future]]):
+        """Resolves the futures of a batch, from redis or from a single embeddings request per model
+
+        Args:
+            batch (Dict[str, Tuple[str, str, asyncio.Future]]): The pending questions, by key
+        """
+        try:
+            keys = list(batch)
+            cached = [None] * len(keys)
+            if self.enabled:
+                cached = await run_in_executor(redis_executor, self._get_redis, keys)
+            embeddings = {key: embedding for key, embedding in zip(keys, cached) if embedding is not None}
+            self._stats["redis_hits"] += len(embeddings)
+
+            missing_by_model: Dict[str, List[str]] = {}
+            for key in keys:
+                if key not in embeddings:
+                    missing_by_model.setdefault(batch[key][1], []).append(key)
+            computed = {}
+            for model, model_keys in missing_by_model.items():
+                start = time.perf_counter()
+                model_embeddings = await self._request([batch[key][0] for key in model_keys], model)
+                logger.info(
+                    f"Embedded {len(model_keys)} questions in a single request in {time.perf_counter() - start:.3f}s"
+                )
+                computed.update(zip(model_keys, model_embeddings))
+                self._stats["misses"] += len(model_keys)
+                self._stats["requests"] += 1
+            embeddings.update(computed)
+
+            if self.enabled:
+                self._local.update(embeddings)
+            for key, (_, _, future) in batch.items():
+                if not future.done():
+                    future.set_result(embeddings[key])
+            # The questions do not wait for redis
+            if self.enabled and len(computed) > 0:
+                await run_in_executor(redis_executor, self._set_redis, computed)
+        except Exception as e:
+            for _, _, future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Returns the counters of the service in this API replica
+
+        Returns:
+            Dict[str, Any]: The hits of each cache, the questions that shared a pending embedding, the questions
+                embedded and the number of embeddings requests
+        """
+        return {
+            "enabled": self.enabled,
+            "memory_entries": len(self._local),
+            **self._stats,
+        }
+
+
+query_embedding_service = QueryEmbeddingService(
+    enabled=QUERY_EMBEDDING_CACHE_ENABLED,
+    cache_size=QUERY_EMBEDDING_CACHE_SIZE,
+    ttl=QUERY_EMBEDDING_CACHE_TTL,
+    batch_window=QUERY_EMBEDDING_BATCH_WINDOW_MS / 1000,
+    batch_max_size=QUERY_EMBEDDING_BATCH_MAX_SIZE,
+)
+
+
+class QueryEmbeddingServiceEmbedding(BaseEmbedding):
+    """Embedding model class for LlamaIndex whose async query embeddings go through the query embedding service
+
+    The other embeddings, and the sync query embeddings, are computed by the wrapped embedding model.
+
+    Args:
+        embed_model (BaseEmbedding): The wrapped embedding model
+        model_name (str): Name of the embedding model
+        service (QueryEmbeddingService): The query embedding service
+    """
+
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _service: QueryEmbeddingService = PrivateAttr()
+
+    def __init__(
+        self,
+        embed_model: BaseEmbedding,
+        model_name: str,
+        service: QueryEmbeddingService = query_embedding_service,
+        **kwargs: Any,
+    ) -> None:
+        self._embed_model = embed_model
+        self._service = service
+        super().__init__(model_name=model_name, **kwargs)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "QueryEmbeddingServiceEmbedding"
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed_model.get_query_embedding(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return await self._service.embed(query, model=self.model_name)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed_model.get_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._embed_model.get_text_embedding_batch(texts)
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return await self._embed_model.aget_text_embedding(text)
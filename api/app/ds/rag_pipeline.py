@@ -1,4 +1,6 @@
+import copy
 import os
+import threading
 from abc import ABC, abstractmethod
 from llama_index.core import VectorStoreIndex
 from llama_index.core.prompts import PromptTemplate
@@ -16,39 +18,34 @@ from llama_index.core.query_pipeline import QueryPipeline, InputComponent, FnCom
 from llama_index.core import get_response_synthesizer
 from llama_index.core.response_synthesizers import ResponseMode
 from llama_index.core.schema import NodeWithScore
-from app.config.openai import client as openai_client
+from app.config.openai import client as openai_client, async_client as async_openai_client
 import app.ds.ai_models as ai_models
 from app.config.qdrant import client as qdrant_client, async_client as async_qdrant_client
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
 from app.config.prompts import prompts_config
+from app.config.rag import CONTEXT_MAX_OVERLAP, CONTEXT_MIN_OVERLAP, CONTEXT_MIN_SCORE_RATIO
+from app.ds.context_packing import ContextPacker
 from app.ds.ds_utils import node_parser
+from app.ds.query_embedding import QueryEmbeddingServiceEmbedding
 from app.config.openai import OPENAI_TYPE
 
-def get_rag_pipeline(
-    workflow: str,
-    collection_name: str,
-    filters: Dict[Any, Any],
-    model_names, 
-):
-    """
-    This function return a "RAG_pipeline" object for a given workflow
+def get_context_packer(params: Dict[str, Any]) -> ContextPacker:
+    """Returns the context packer of a model, with the token budget of its prompt parameters
+
+    Args:
+        params (Dict[str, Any]): The prompt parameters of the model, from prompts.yaml
+
+    Returns:
+        ContextPacker: The context packer, without token budget if the model has no 'context_max_tokens'
     """
-    if workflow.lower() == "classique":
-        return NaiveRAGPipeline(
-            collection_name=collection_name,
-            embed_model_name=model_names["embed_model"],
-            llm_model_name=model_names["llm_model"],
-            filters=filters,
-        )
-    elif workflow.lower() == "check":
-        return CheckerRAGPipeline(
-            collection_name=collection_name,
-            embed_model_name=model_names["embed_model"],
-            llm_model_name=model_names["llm_model"],
-            filters=filters,
-        )
-    else:
-        return {"Message": "Please Provide a correct workflow"}
+    return ContextPacker(
+        max_tokens=int(params["context_max_tokens"]) if params.get("context_max_tokens") else None,
+        min_score_ratio=CONTEXT_MIN_SCORE_RATIO,
+        min_overlap=CONTEXT_MIN_OVERLAP,
+        max_overlap=CONTEXT_MAX_OVERLAP,
+    )
+
+
 class RAGPipeline(ABC):
     """
     An abstract class to represent a RAG pipeline.
@@ -59,13 +56,45 @@ class RAGPipeline(ABC):
         Allows to retrieve document for a given query in a given index
     query()
         Queries a rag pipeline for a query
+    aretrieve(), aquery()
+        Async versions, on the async qdrant and LLM clients
     """
+    filters: Dict[Any, Any] = {}
+
     @abstractmethod
     def query(self):
         pass
     @abstractmethod
     def retrieve(self):
         pass
+    @abstractmethod
+    async def aquery(self):
+        pass
+    @abstractmethod
+    async def aretrieve(self):
+        pass
+
+    def bind(self, filters: Dict[Any, Any]) -> "RAGPipeline":
+        """Returns the pipeline restricted to the given filters, sharing the models, the vector store and the index
+
+        Args:
+            filters (Dict[Any, Any]): The metadata filters of the request
+
+        Returns:
+            RAGPipeline: A shallow copy of the pipeline with its own filters
+        """
+        bound_pipeline = copy.copy(self)
+        bound_pipeline.filters = filters
+        return bound_pipeline
+
+    def get_metadata_filters(self) -> MetadataFilters:
+        return MetadataFilters(
+            filters=[
+                MetadataFilter(key=key, value=value)
+                for key, value in self.filters.items()
+            ],
+            condition=FilterCondition.AND,
+        )
 
 
 
@@ -75,21 +104,25 @@ class NaiveRAGPipeline(RAGPipeline):
         collection_name: str,
         embed_model_name: str,
         llm_model_name: str,
-        filters: dict,
+        filters: dict = None,
     ) -> None:
         self.collection_name = collection_name
         
         if OPENAI_TYPE == "custom":
             self.embed_model = ai_models.CustomOpenAIEmbedding(
-                openai_client=openai_client, model_name=embed_model_name
+                openai_client=openai_client,
+                model_name=embed_model_name,
+                async_openai_client=async_openai_client,
             )
         if OPENAI_TYPE == "openai":
             self.embed_model = OpenAIEmbedding(
                 model=embed_model_name, 
                 timeout=60
             )
+        # The questions are embedded by the query embedding service (caches and micro-batching)
+        self.embed_model = QueryEmbeddingServiceEmbedding(embed_model=self.embed_model, model_name=embed_model_name)
 
-        self.filters = filters
+        self.filters = filters or {}
         self.params = prompts_config['rag']['classique'][llm_model_name]
 
         if OPENAI_TYPE == "custom":
@@ -103,45 +136,33 @@ class NaiveRAGPipeline(RAGPipeline):
         if OPENAI_TYPE == "openai":
             self.llm_model = OpenAI(model=llm_model_name,timeout=60,temperature=self.params["temperature"],top_p=self.params["top_p"])
 
-    def get_index(self):
-        vector_store = QdrantVectorStore(
-            client=qdrant_client, collection_name=self.collection_name
+        # The vector store and the index do not depend on the filters, they are built once for all the requests
+        self.vector_store = QdrantVectorStore(
+            client=qdrant_client, aclient=async_qdrant_client, collection_name=self.collection_name
         )
-
-        llama_index_filters = MetadataFilters(
-            filters=[
-                MetadataFilter(key=key, value=value)
-                for key, value in self.filters.items()
-            ],
-            condition=FilterCondition.AND,
-        )
-        index = VectorStoreIndex.from_vector_store(
-            vector_store=vector_store,
+        self.index = VectorStoreIndex.from_vector_store(
+            vector_store=self.vector_store,
             embed_model=self.embed_model,
-            filters=llama_index_filters,
         )
-        return index
+        self.text_qa_template = PromptTemplate(self.params["prompt"])
+        self.context_packer = get_context_packer(self.params)
+
+    def get_index(self):
+        return self.index
 
     def get_query_engine(self, precision: int = 5, streaming=True):
         index = self.get_index()
-        llama_index_filters = MetadataFilters(
-            filters=[
-                MetadataFilter(key=key, value=value)
-                for key, value in self.filters.items()
-            ],
-            condition=FilterCondition.AND,
-        )
+        llama_index_filters = self.get_metadata_filters()
         query_engine = index.as_query_engine(
             llm=self.llm_model,
             filters=llama_index_filters,
             similarity_top_k=precision,
             streaming=streaming,
+            node_postprocessors=[self.context_packer],
         )
         query_engine.update_prompts(
             {
-                "response_synthesizer:text_qa_template": PromptTemplate(
-                    self.params["prompt"]
-                )
+                "response_synthesizer:text_qa_template": self.text_qa_template
             }
         )
         return query_engine
@@ -155,6 +176,14 @@ class NaiveRAGPipeline(RAGPipeline):
     def retrieve(self, message, precision : int = 5):
         retriever = self.get_index().as_retriever(similarity_top_k=precision)
         return retriever.retrieve(message)
+
+    async def aquery(self, message: str, precision: int = 5):
+        query_engine = self.get_query_engine(precision=precision)
+        return await query_engine.aquery(message)
+
+    async def aretrieve(self, message, precision : int = 5):
+        retriever = self.get_index().as_retriever(similarity_top_k=precision)
+        return await retriever.aretrieve(message)
     
 class CheckerRAGPipeline(RAGPipeline):
     def __init__(
@@ -162,19 +191,23 @@ class CheckerRAGPipeline(RAGPipeline):
         collection_name: str,
         embed_model_name: str,
         llm_model_name: str,
-        filters: dict,
+        filters: dict = None,
     ) -> None:
         self.collection_name = collection_name
         if OPENAI_TYPE == "custom":
             self.embed_model = ai_models.CustomOpenAIEmbedding(
-                openai_client=openai_client, model_name=embed_model_name
+                openai_client=openai_client,
+                model_name=embed_model_name,
+                async_openai_client=async_openai_client,
             )
         if OPENAI_TYPE == "openai":
             self.embed_model = OpenAIEmbedding(
                 model=embed_model_name, 
                 timeout=60
             )
-        self.filters = filters
+        # The questions are embedded by the query embedding service (caches and micro-batching)
+        self.embed_model = QueryEmbeddingServiceEmbedding(embed_model=self.embed_model, model_name=embed_model_name)
+        self.filters = filters or {}
         self.qa_params = prompts_config['rag']['classique'][llm_model_name]
         self.check_params = prompts_config['rag']['check'][llm_model_name]
         if OPENAI_TYPE == "custom":
@@ -188,42 +221,32 @@ class CheckerRAGPipeline(RAGPipeline):
         if OPENAI_TYPE == "openai":
             self.llm_model = OpenAI(model=llm_model_name,timeout=60,temperature=self.qa_params["temperature"],top_p=self.qa_params["top_p"])
 
-    def get_index(self):
-        vector_store = QdrantVectorStore(
-            client=qdrant_client, collection_name=self.collection_name
+        # The vector store, the index and the prompts do not depend on the filters, they are built once
+        self.vector_store = QdrantVectorStore(
+            client=qdrant_client, aclient=async_qdrant_client, collection_name=self.collection_name
         )
-
-        llama_index_filters = MetadataFilters(
-            filters=[
-                MetadataFilter(key=key, value=value)
-                for key, value in self.filters.items()
-            ],
-            condition=FilterCondition.AND,
-        )
-        index = VectorStoreIndex.from_vector_store(
-            vector_store=vector_store,
+        self.index = VectorStoreIndex.from_vector_store(
+            vector_store=self.vector_store,
             embed_model=self.embed_model,
-            filters=llama_index_filters,
         )
-        return index
+        self.text_qa_template = PromptTemplate(self.qa_params["prompt"])
+        self.check_prompt_template = PromptTemplate(self.check_params["prompt"])
+        self.context_packer = get_context_packer(self.qa_params)
+
+    def get_index(self):
+        return self.index
 
     def get_query_engine(self, precision: int = 5, streaming=True):
         input_component = InputComponent()
         index = self.get_index()
-        llama_index_filters = MetadataFilters(
-            filters=[
-                MetadataFilter(key=key, value=value)
-                for key, value in self.filters.items()
-            ],
-            condition=FilterCondition.AND,
-        )
+        llama_index_filters = self.get_metadata_filters()
         retriever = index.as_retriever(
             similarity_top_k=precision, filters=llama_index_filters
         )
         node_parsing_component = FnComponent(fn=node_parser, output_key="context_str")
         response_synthesizer = get_response_synthesizer(
             response_mode="compact",
-            text_qa_template=PromptTemplate(self.qa_params["prompt"]),
+            text_qa_template=self.text_qa_template,
             llm=self.llm_model,
             streaming=streaming,
         ).as_query_component()
@@ -231,8 +254,9 @@ class CheckerRAGPipeline(RAGPipeline):
         query_engine = QueryPipeline(
             modules={
                 "input": input_component,
-                "check_prompt_template": PromptTemplate(self.check_params["prompt"]),
+                "check_prompt_template": self.check_prompt_template,
                 "retriever": retriever,
+                "context_packer": self.context_packer,
                 "llm1": self.llm_model,
                 "node_parser": node_parsing_component,
                 "response_synthesizer": response_synthesizer,
@@ -240,13 +264,14 @@ class CheckerRAGPipeline(RAGPipeline):
         )
         query_engine.add_chain(["input", "retriever"])
         query_engine.add_link("input", "check_prompt_template", dest_key="query_str")
-        query_engine.add_link("retriever", "node_parser")
+        query_engine.add_link("retriever", "context_packer", dest_key="nodes")
+        query_engine.add_link("context_packer", "node_parser")
         query_engine.add_link(
             "node_parser", "check_prompt_template", dest_key="context_str"
         )
         query_engine.add_link("check_prompt_template", "llm1")
         query_engine.add_link("llm1", "response_synthesizer", dest_key="query_str")
-        query_engine.add_link("retriever", "response_synthesizer", dest_key="nodes")
+        query_engine.add_link("context_packer", "response_synthesizer", dest_key="nodes")
         return query_engine
 
     def query(self, message: str, precision: int = 5):
@@ -255,4 +280,98 @@ class CheckerRAGPipeline(RAGPipeline):
     
     def retrieve(self, message, precision : int = 5):
         retriever = self.get_index().as_retriever(similarity_top_k=precision)
-        return retriever.retrieve(message)
\ No newline at end of file
+        return retriever.retrieve(message)
+
+    async def aquery(self, message: str, precision: int = 5):
+        query_engine = self.get_query_engine(precision=precision)
+        return await query_engine.arun(query_str=message)
+
+    async def aretrieve(self, message, precision : int = 5):
+        retriever = self.get_index().as_retriever(similarity_top_k=precision)
+        return await retriever.aretrieve(message)
+
+
+RAG_PIPELINES = {
+    "classique": NaiveRAGPipeline,
+    "check": CheckerRAGPipeline,
+}
+
+
+class RAGPipelineRegistry:
+    """Keeps one pipeline per (workflow, collection, models) for the whole process
+
+    The models, the vector store, the index and the prompts of a pipeline are built on first use, the requests
+    only bind their own filters to the shared pipeline.
+    """
+
+    def __init__(self) -> None:
+        self._pipelines: Dict[Tuple[str, str, str, str], RAGPipeline] = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._builds = 0
+
+    def get(self, workflow: str, collection_name: str, model_names: Dict[str, str]) -> RAGPipeline | None:
+        """Returns the shared pipeline of a workflow, built if it is the first request for it
+
+        Args:
+            workflow (str): The workflow, 'classique' or 'check'
+            collection_name (str): The qdrant collection
+            model_names (Dict[str, str]): The names of the models, with the 'embed_model' and 'llm_model' keys
+
+        Returns:
+            RAGPipeline | None: The shared pipeline, without filters, None if the workflow does not exist
+        """
+        workflow = workflow.lower()
+        if workflow not in RAG_PIPELINES:
+            return None
+        key = (workflow, collection_name, model_names["embed_model"], model_names["llm_model"])
+        if (pipeline := self._pipelines.get(key)) is None:
+            with self._lock:
+                if (pipeline := self._pipelines.get(key)) is None:
+                    pipeline = RAG_PIPELINES[workflow](
+                        collection_name=collection_name,
+                        embed_model_name=model_names["embed_model"],
+                        llm_model_name=model_names["llm_model"],
+                    )
+                    self._pipelines[key] = pipeline
+                    self._builds += 1
+                    return pipeline
+        with self._lock:
+            self._hits += 1
+        return pipeline
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Returns the number of pipelines built and of requests served by an existing pipeline
+
+        Returns:
+            Dict[str, Any]: The counters and the keys of the pipelines
+        """
+        with self._lock:
+            return {
+                "builds": self._builds,
+                "hits": self._hits,
+                "pipelines": ["/".join(key) for key in self._pipelines],
+            }
+
+
+rag_pipeline_registry = RAGPipelineRegistry()
+
+
+def get_rag_pipeline(
+    workflow: str,
+    collection_name: str,
+    filters: Dict[Any, Any],
+    model_names, 
+):
+    """
+    This function return a "RAG_pipeline" object for a given workflow, bound to the filters of the request
+    """
+    if (pipeline := rag_pipeline_registry.get(workflow, collection_name, model_names)) is None:
+        return {"Message": "Please Provide a correct workflow"}
+    return pipeline.bind(filters)
+
+
+def warm_up_rag_pipelines(collection_name: str, model_names: Dict[str, str]):
+    """Builds the pipelines of all the workflows, so that the first message does not pay for it"""
+    for workflow in RAG_PIPELINES:
+        rag_pipeline_registry.get(workflow, collection_name, model_names)
@@ -0,0 +1,230 @@
+import asyncio
+import uuid
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from app.config.chat import (
+    CHAT_SINGLE_FLIGHT_ENABLED,
+    CHAT_SINGLE_FLIGHT_RETENTION,
+    CHAT_SINGLE_FLIGHT_TIMEOUT,
+    CHAT_SINGLE_FLIGHT_TTL,
+)
+from app.config.logger import logger
+from app.config.redis import async_client as redis_client
+from app.utils.hashing import text_hash
+
+# Deletes the lock of a generation only if it still belongs to it
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+@dataclass
+class Flight:
+    """A generation shared by identical questions
+
+    Args:
+        key (str): The lock of the generation, held by its leader
+        flight_id (str): The id of the generation
+        leader (bool): Whether the request must generate the answer
+    """
+    key: str
+    flight_id: str
+    leader: bool
+
+    @property
+    def stream(self) -> str:
+        return f"chat-flight:stream:{self.flight_id}"
+
+
+class ChatSingleFlight:
+    """Coalesces identical chat questions, keyed by (index, workflow, normalized message), into a single generation
+
+    The first request takes a lock in redis and becomes the leader: its generation runs in the background and
+    publishes the events of the response in a redis stream, so that a client leaving does not stop the others.
+    The requests for the same question, on any replica, read the stream from its start, while the leader reads the
+    events in process. Any redis failure is logged and the question is answered by its own request.
+
+    Args:
+        enabled (bool): Whether the questions are coalesced at all
+        ttl (int): Maximum duration of a generation, in seconds
+        timeout (int): Maximum wait for the next event of a generation, in seconds
+        retention (int): Lifetime of the events of a generation once it is finished, in seconds
+    """
+
+    def __init__(self, enabled: bool, ttl: int, timeout: int, retention: int) -> None:
+        self.enabled = enabled
+        self.ttl = ttl
+        self.timeout = timeout
+        self.retention = retention
+        self._release_lock = redis_client.register_script(RELEASE_LOCK_SCRIPT)
+        self._generations: Set[asyncio.Task] = set()
+        self._stats = {
+            "leaders": 0,
+            "followers": 0,
+            "fallbacks": 0,
+        }
+
+    @staticmethod
+    def _key(index: str, workflow: str, message: str) -> str:
+        return f"chat-flight:{index}:{workflow.lower()}:{text_hash(message)}"
+
+    async def join(self, index: str, workflow: str, message: str) -> Optional[Flight]:
+        """Joins the generation of a question, as its leader if there is none in progress
+
+        Args:
+            index (str): The collection id or the token
+            workflow (str): The workflow
+            message (str): The question
+
+        Returns:
+            Optional[Flight]: The generation, None if the question must be answered without coalescing
+        """
+        if not self.enabled:
+            return None
+        key = self._key(index, workflow, message)
+        flight_id = uuid.uuid4().hex
+        try:
+            # The lock may be released between the two calls, the question then tries again to lead
+            for _ in range(3):
+                if await redis_client.set(key, flight_id, nx=True, ex=self.ttl):
+                    self._stats["leaders"] += 1
+                    return Flight(key=key, flight_id=flight_id, leader=True)
+                if (leader_flight_id := await redis_client.get(key)) is not None:
+                    return Flight(key=key, flight_id=leader_flight_id, leader=False)
+        except Exception as e:
+            logger.warning(f"Chat single flight unavailable, the question will be answered on its own: {e}")
+        return None
+
+    def lead(self, flight: Flight, events: AsyncIterator[str]) -> AsyncIterator[str]:
+        """Runs the generation of the leader in the background, its events are published for all the requests
+
+        Args:
+            flight (Flight): The generation, led by the request
+            events (AsyncIterator[str]): The events of the response
+
+        Returns:
+            AsyncIterator[str]: The events of the response, they do not depend on redis
+        """
+        local_events = asyncio.Queue()
+        task = asyncio.create_task(self._publish(flight, events, local_events))
+        self._generations.add(task)
+        task.add_done_callback(self._generations.discard)
+        return self._follow_local(local_events)
+
+    async def abort(self, flight: Flight, error: BaseException):
+        """Ends a generation whose leader failed before generating, its followers answer on their own
+
+        Args:
+            flight (Flight): The generation, led by the request
+            error (BaseException): The error of the leader
+        """
+        await self._end(flight, {"error": repr(error)})
+
+    async def subscribe(self, flight: Flight) -> Optional[AsyncIterator[str]]:
+        """Subscribes to the generation of another request, once it produced its first event
+
+        Args:
+            flight (Flight): The generation, led by another request
+
+        Returns:
+            Optional[AsyncIterator[str]]: The events of the response, None if the leader failed before producing any
+                event, the question must then be answered by the request
+        """
+        try:
+            entries = await self._read(flight, "0")
+        except Exception as e:
+            logger.warning(f"Error while subscribing to the chat generation {flight.flight_id}: {e}")
+            entries = []
+        if len(entries) == 0 or "event" not in entries[0][1]:
+            self._stats["fallbacks"] += 1
+            return None
+        self._stats["followers"] += 1
+        return self._follow(flight, entries, "0")
+
+    async def _read(self, flight: Flight, last_id: str) -> List[Tuple[str, Dict[str, str]]]:
+        response = await redis_client.xread({flight.stream: last_id}, count=100, block=self.timeout * 1000)
+        return response[0][1] if response else []
+
+    async def _follow(
+        self,
+        flight: Flight,
+        entries: List[Tuple[str, Dict[str, str]]],
+        last_id: str,
+    ) -> AsyncIterator[str]:
+        while True:
+            for entry_id, fields in entries:
+                if "event" not in fields:
+                    if "error" in fields:
+                        logger.warning(f"The chat generation {flight.flight_id} failed: {fields['error']}")
+                    return
+                yield fields["event"]
+                last_id = entry_id
+            entries = await self._read(flight, last_id)
+            if len(entries) == 0:
+                logger.warning(f"No event of the chat generation {flight.flight_id} for {self.timeout}s")
+                return
+
+    @staticmethod
+    async def _follow_local(local_events: asyncio.Queue) -> AsyncIterator[str]:
+        while (event := await local_events.get()) is not None:
+            yield event
+
+    async def _publish(self, flight: Flight, events: AsyncIterator[str], local_events: asyncio.Queue):
+        end = {"end": "1"}
+        try:
+            is_first = True
+            async for event in events:
+                local_events.put_nowait(event)
+                if "error" in end:
+                    continue
+                try:
+                    await redis_client.xadd(flight.stream, {"event": event})
+                    if is_first:
+                        # The events of a generation whose leader died disappear with its lock
+                        await redis_client.expire(flight.stream, self.ttl + self.retention)
+                        is_first = False
+                except Exception as e:
+                    # The leader still gets the whole response, the followers stop at the last event published
+                    logger.warning(f"Error while publishing the chat generation {flight.flight_id}: {e}")
+                    end = {"error": repr(e)}
+        except Exception as e:
+            logger.exception(f"The chat generation {flight.flight_id} failed")
+            end = {"error": repr(e)}
+        finally:
+            local_events.put_nowait(None)
+            await self._end(flight, end)
+
+    async def _end(self, flight: Flight, entry: Dict[str, str]):
+        try:
+            pipeline = redis_client.pipeline(transaction=False)
+            pipeline.xadd(flight.stream, entry)
+            pipeline.expire(flight.stream, self.retention)
+            await pipeline.execute()
+            await self._release_lock(keys=[flight.key], args=[flight.flight_id])
+        except Exception as e:
+            logger.error(f"Error while ending the chat generation {flight.flight_id}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Returns the counters of the single flight in this API replica
+
+        Returns:
+            Dict[str, Any]: The number of generations led, of questions that subscribed to another generation and of
+                questions answered on their own because the generation they joined failed
+        """
+        return {
+            "enabled": self.enabled,
+            "running": len(self._generations),
+            **self._stats,
+        }
+
+
+chat_single_flight = ChatSingleFlight(
+    enabled=CHAT_SINGLE_FLIGHT_ENABLED,
+    ttl=CHAT_SINGLE_FLIGHT_TTL,
+    timeout=CHAT_SINGLE_FLIGHT_TIMEOUT,
+    retention=CHAT_SINGLE_FLIGHT_RETENTION,
+)
@@ -0,0 +1,254 @@
+import hashlib
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+# This module is imported by the parsing worker processes, like app.ds.parsers it only depends on the standard library
+
+ATX_HEADING_PATTERN = re.compile(r"^ {0,3}(#{1,6})\s+(.*?)(?:\s+#+)?\s*$")
+SETEXT_UNDERLINE_PATTERN = re.compile(r"^ {0,3}(=+|-+)\s*$")
+FENCE_PATTERN = re.compile(r"^ {0,3}(```|~~~)")
+LIST_ITEM_PATTERN = re.compile(r"^ {0,3}([-*+]|\d+[.)])\s+")
+
+
+@dataclass
+class TextElement:
+    """A block of text (paragraph, list item, code block...) or a heading"""
+    text: str
+    is_title: bool = False
+
+
+def decode_text(content: bytes) -> str:
+    """Decodes the content of a text file, utf-8 is expected and windows-1252 is used as a fallback
+
+    Args:
+        content (bytes): Raw content of the file
+
+    Returns:
+        str: The text
+    """
+    try:
+        return content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return content.decode("cp1252", errors="replace")
+
+
+def split_plain_text(text: str) -> List[TextElement]:
+    """Splits a plain text into paragraphs, separated by blank lines
+
+    Args:
+        text (str): Input text
+
+    Returns:
+        List[TextElement]: The paragraphs, whose line breaks are replaced by spaces
+    """
+    paragraphs = re.split(r"\n\s*\n", text.replace("\r\n", "\n"))
+    return [
+        TextElement(text=" ".join(paragraph.split()))
+        for paragraph in paragraphs if len(paragraph.strip()) > 0
+    ]
+
+
+def split_markdown(text: str) -> List[TextElement]:
+    """Splits a markdown text into headings, paragraphs, list items and code blocks
+
+    Args:
+        text (str): Input text
+
+    Returns:
+        List[TextElement]: The elements, in the order of the text
+    """
+    elements = []
+    paragraph = []
+    fence = None
+    code = []
+
+    def close_paragraph():
+        if len(paragraph) > 0:
+            elements.append(TextElement(text=" ".join(" ".join(paragraph).split())))
+            paragraph.clear()
+
+    for line in text.replace("\r\n", "\n").split("\n"):
+        if fence is not None:
+            # Code blocks are kept as is, line breaks included
+            if line.strip().startswith(fence):
+                elements.append(TextElement(text="\n".join(code)))
+                fence, code = None, []
+            else:
+                code.append(line)
+            continue
+
+        if (match := FENCE_PATTERN.match(line)) is not None:
+            close_paragraph()
+            fence = match.group(1)
+        elif (match := ATX_HEADING_PATTERN.match(line)) is not None:
+            close_paragraph()
+            if len(match.group(2)) > 0:
+                elements.append(TextElement(text=match.group(2), is_title=True))
+        elif len(paragraph) == 1 and SETEXT_UNDERLINE_PATTERN.match(line) is not None:
+            # A single line underlined with === or --- is a heading
+            elements.append(TextElement(text=paragraph.pop().strip(), is_title=True))
+        elif len(line.strip()) == 0:
+            close_paragraph()
+        elif LIST_ITEM_PATTERN.match(line) is not None:
+            close_paragraph()
+            paragraph.append(LIST_ITEM_PATTERN.sub("", line, count=1))
+        else:
+            paragraph.append(line)
+
+    if fence is not None and len(code) > 0:
+        elements.append(TextElement(text="\n".join(code)))
+    close_paragraph()
+    return [element for element in elements if len(element.text.strip()) > 0]
+
+
+def overlap_tail(text: str, overlap: int) -> str:
+    """Returns the end of a text that is repeated at the start of the next chunk, without any truncated word
+
+    Args:
+        text (str): Text of the previous chunk
+        overlap (int): Maximum number of characters of the tail
+
+    Returns:
+        str: The tail
+    """
+    if len(text) <= overlap:
+        return text.strip()
+    tail = text[-overlap:]
+    if not text[-overlap - 1].isspace():
+        # The tail starts in the middle of a word, we drop that word
+        tail = tail.split(maxsplit=1)[1] if len(tail.split(maxsplit=1)) > 1 else ""
+    return tail.strip()
+
+
+def split_long_text(text: str, max_characters: int, overlap: int, first_window: int = None) -> List[str]:
+    """Splits a text longer than max_characters into windows ending on whitespaces, overlapping by `overlap`
+
+    Args:
+        text (str): Input text
+        max_characters (int): Maximum number of characters of a window
+        overlap (int): Number of characters repeated from one window to the next
+        first_window (int, optional): Maximum number of characters of the first window, defaults to max_characters
+
+    Returns:
+        List[str]: The windows
+    """
+    windows = []
+    start = 0
+    while start < len(text):
+        size = first_window if len(windows) == 0 and first_window is not None else max_characters
+        end = min(start + size, len(text))
+        if end < len(text):
+            # We cut on the last whitespace of the window, if there is one in its second half
+            cut = text.rfind(" ", start + size // 2, end)
+            end = cut if cut > 0 else end
+        windows.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+        # The next window starts at a word boundary
+        while start < end and not text[start - 1].isspace():
+            start += 1
+    return [window for window in windows if len(window) > 0]
+
+
+def chunk_elements(
+        elements: List[TextElement],
+        max_characters: int,
+        overlap: int,
+        overlap_all: bool,
+        by_title: bool,
+) -> List[str]:
+    """Combines elements into chunks of at most max_characters
+
+    Like the unstructured 'by_title' strategy: a heading starts a new chunk, consecutive elements are combined
+    while they fit, an element too long on its own is split into overlapping windows, and with overlap_all the end
+    of each chunk is repeated at the start of the next one
+
+    Args:
+        elements (List[TextElement]): The elements of the document
+        max_characters (int): Maximum number of characters of a chunk
+        overlap (int): Number of characters repeated from one chunk to the next
+        overlap_all (bool): Whether the overlap is applied between all the chunks, or only inside long elements
+        by_title (bool): Whether the headings start new chunks
+
+    Returns:
+        List[str]: The chunks texts
+    """
+    # With overlap_all, room is kept for the overlap so that the chunks do not exceed max_characters
+    budget = max_characters - overlap if overlap_all and overlap < max_characters else max_characters
+    chunks: List[Tuple[str, bool]] = []  # (text, whether it continues a long element)
+    current: List[str] = []
+    length = 0
+
+    def close_chunk():
+        nonlocal length
+        if len(current) > 0:
+            chunks.append(("\n\n".join(current), False))
+            current.clear()
+            length = 0
+
+    for element in elements:
+        if element.is_title and by_title:
+            close_chunk()
+        if len(element.text) > budget:
+            # The first window fills the current chunk when there is enough room left (after a heading...)
+            room = budget - length - 2
+            if len(current) == 0 or room < budget // 4:
+                close_chunk()
+                room = budget
+            windows = split_long_text(element.text, budget, overlap, first_window=room)
+            current.append(windows[0])
+            close_chunk()
+            chunks.extend((window, True) for window in windows[1:])
+            continue
+        separator = 2 if len(current) > 0 else 0
+        if length + separator + len(element.text) > budget:
+            close_chunk()
+            separator = 0
+        current.append(element.text)
+        length += separator + len(element.text)
+    close_chunk()
+
+    if not overlap_all or overlap <= 0:
+        return [text for text, _ in chunks]
+    texts = []
+    for i, (text, is_continuation) in enumerate(chunks):
+        tail = overlap_tail(chunks[i - 1][0], overlap) if i > 0 and not is_continuation else ""
+        texts.append(f"{tail} {text}" if len(tail) > 0 else text)
+    return texts
+
+
+def chunk_text_file(filename: str, content: bytes, chunking_params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Parses and chunks a .txt or .md file without unstructured
+
+    Args:
+        filename (str): filename to get extension
+        content (bytes): Raw content of the uploaded file
+        chunking_params (Dict[str, Any]): max_characters, overlap, overlap_all and chunking_strategy
+
+    Returns:
+        List[Dict[str, Any]]: The chunk records, with the columns of the unstructured records used downstream
+    """
+    text = decode_text(content)
+    if filename.lower().endswith(".md"):
+        elements, filetype = split_markdown(text), "text/markdown"
+    else:
+        elements, filetype = split_plain_text(text), "text/plain"
+
+    chunks = chunk_elements(
+        elements,
+        max_characters=chunking_params["max_characters"],
+        overlap=chunking_params["overlap"],
+        overlap_all=chunking_params["overlap_all"],
+        by_title=chunking_params["chunking_strategy"] == "by_title",
+    )
+    return [
+        {
+            "type": "CompositeElement",
+            "element_id": hashlib.sha256(f"{filename}:{i}:{chunk}".encode("utf-8")).hexdigest()[:32],
+            "text": chunk,
+            "filetype": filetype,
+        }
+        for i, chunk in enumerate(chunks)
+    ]
@@ -0,0 +1,183 @@
+import functools
+import os
+import threading
+from typing import Iterable, Iterator, List, Set, Tuple
+
+import enchant
+import marisa_trie
+import pandas as pd
+
+from app.config.ingestion import VOCABULARY_CACHE_SIZE, VOCABULARY_DICTIONARY_DIRS
+from app.config.logger import logger
+
+LANGUAGES = ("fr_FR", "en_US")
+
+
+# Entries whose flags carry one of these options are not words on their own (stems needing an affix, forbidden
+# words, parts of compounds), hunspell and enchant reject them
+EXCLUDING_OPTIONS = ("NEEDAFFIX", "PSEUDOROOT", "FORBIDDENWORD", "ONLYINCOMPOUND")
+
+
+def read_affix_options(aff_path: str) -> Tuple[str, str, Set[str], List[str]]:
+    """Reads the options of a hunspell affix file needed to read the entries of its dictionary
+
+    Args:
+        aff_path (str): Path of the affix file
+
+    Returns:
+        Tuple[str, str, Set[str], List[str]]: The encoding of the dictionary, the type of its flags, the flags
+            excluding an entry and the flag aliases (AF)
+    """
+    encoding, flag_type, excluding_flags, aliases = "utf-8", "char", set(), []
+    if not os.path.exists(aff_path):
+        return encoding, flag_type, excluding_flags, aliases
+    with open(aff_path, "r", encoding="latin-1") as aff_file:
+        for line in aff_file:
+            fields = line.split()
+            if len(fields) < 2:
+                continue
+            if fields[0] == "SET":
+                encoding = fields[1]
+            elif fields[0] == "FLAG":
+                flag_type = fields[1]
+            elif fields[0] in EXCLUDING_OPTIONS:
+                excluding_flags.add(fields[1])
+            elif fields[0] == "AF" and not fields[1].isdigit():
+                # The first AF line holds the number of aliases, the next ones a set of flags each
+                aliases.append(fields[1])
+    return encoding, flag_type, excluding_flags, aliases
+
+
+def split_flags(flags: str, flag_type: str) -> Set[str]:
+    """Splits the flags of a dictionary entry
+
+    Args:
+        flags (str): The flags of the entry
+        flag_type (str): The type of the flags declared by FLAG in the affix file (char, long, num, UTF-8)
+
+    Returns:
+        Set[str]: The flags
+    """
+    if flag_type == "long":
+        return {flags[i:i + 2] for i in range(0, len(flags), 2)}
+    if flag_type == "num":
+        return set(flags.split(","))
+    return set(flags)
+
+
+def read_dictionary_words(language: str, dictionary_dirs: List[str]) -> Iterator[str]:
+    """Reads the words of a hunspell dictionary
+
+    Only the lowercase entries that are words on their own are kept: the inflected forms and the capitalized entries
+    (proper nouns, ...) are left to enchant, and the entries flagged as stems needing an affix, forbidden words or
+    compound parts are dropped, so that the verdicts stay the same as enchant ones
+
+    Args:
+        language (str): Dictionary language (fr_FR, en_US, ...)
+        dictionary_dirs (List[str]): Directories where to look for the dictionary
+
+    Returns:
+        Iterator[str]: The words
+    """
+    for directory in dictionary_dirs:
+        dic_path = os.path.join(directory, f"{language}.dic")
+        if not os.path.exists(dic_path):
+            continue
+
+        # The encoding of the dictionary and the meaning of its flags are declared in its affix file
+        encoding, flag_type, excluding_flags, aliases = read_affix_options(
+            os.path.join(directory, f"{language}.aff")
+        )
+        # The flags are read as the text of the affix file, which is decoded as latin-1
+        excluding_flags = {flag.encode("latin-1").decode(encoding, errors="ignore") for flag in excluding_flags}
+        aliases = [alias.encode("latin-1").decode(encoding, errors="ignore") for alias in aliases]
+
+        with open(dic_path, "r", encoding=encoding, errors="ignore") as dic_file:
+            next(dic_file, None)  # The first line holds the number of entries
+            for line in dic_file:
+                entry = line.split()[0] if line.strip() else ""
+                word, _, flags = entry.partition("/")
+                if not word or not word.islower():
+                    continue
+                if len(aliases) > 0 and flags.isdigit():
+                    flags = aliases[int(flags) - 1] if 0 < int(flags) <= len(aliases) else ""
+                if excluding_flags.isdisjoint(split_flags(flags, flag_type)):
+                    yield word
+        return
+    logger.warning(f"No {language} hunspell dictionary found in {dictionary_dirs}")
+
+
+class VocabularyScorer:
+    """Scores the quality of texts by their ratio of dictionary words
+
+    The dictionaries words are loaded once into a trie, the words that are not in it are checked with enchant
+    (inflected forms, ...) and every verdict is memoized in a bounded LRU.
+
+    Args:
+        languages (Iterable[str]): Languages of the dictionaries
+        dictionary_dirs (List[str]): Directories where to look for the hunspell dictionaries
+        cache_size (int): Number of word verdicts memoized
+    """
+
+    def __init__(self, languages: Iterable[str], dictionary_dirs: List[str], cache_size: int) -> None:
+        self._trie = marisa_trie.Trie(
+            word for language in languages for word in read_dictionary_words(language, dictionary_dirs)
+        )
+        self._dictionaries = [enchant.Dict(language) for language in languages]
+        # enchant dictionaries are not thread-safe, and several files are ingested concurrently
+        self._dictionaries_lock = threading.Lock()
+        self.is_known = functools.lru_cache(maxsize=cache_size)(self._is_known)
+        logger.info(f"Vocabulary scorer loaded with {len(self._trie)} words")
+
+    def _is_known(self, word: str) -> bool:
+        if word in self._trie:
+            return True
+        with self._dictionaries_lock:
+            return any(dictionary.check(word) for dictionary in self._dictionaries)
+
+    def score(self, texts: pd.Series, custom_vocabulary: Iterable[str] = ()) -> pd.Series:
+        """Returns the ratio of known words of each text
+
+        Args:
+            texts (pd.Series): Input texts
+            custom_vocabulary (Iterable[str], optional): Additional vocabulary to consider as known
+
+        Returns:
+            pd.Series: The ratio of each text, NaN for the texts without any word
+        """
+        custom_vocabulary = set(custom_vocabulary)
+        # One row per word, indexed by the position of its text
+        words = texts.reset_index(drop=True).str.lower().str.split().explode()
+        verdicts = {
+            word: self.is_known(word) or word in custom_vocabulary
+            for word in words.dropna().unique()
+        }
+        ratios = words.map(verdicts).astype(float).groupby(level=0).mean()
+        return pd.Series(ratios.reindex(range(len(texts))).to_numpy(), index=texts.index)
+
+    def need_fiab(self, texts: pd.Series, custom_vocabulary: Iterable[str] = (), threshold: float = 0.8) -> pd.Series:
+        """Indicates the texts whose ratio of known words is below the threshold
+
+        Args:
+            texts (pd.Series): Input texts
+            custom_vocabulary (Iterable[str], optional): Additional vocabulary to consider as known
+            threshold (float, optional): Minimal ratio of known words. Defaults to 0.8.
+
+        Returns:
+            pd.Series: A boolean per text, True when the text should go through the LLM reliability
+        """
+        return self.score(texts, custom_vocabulary=custom_vocabulary) < threshold
+
+
+@functools.lru_cache(maxsize=1)
+def get_vocabulary_scorer() -> VocabularyScorer:
+    """Returns the vocabulary scorer of the process, loading it on first use
+
+    Returns:
+        VocabularyScorer: The vocabulary scorer
+    """
+    return VocabularyScorer(
+        languages=LANGUAGES,
+        dictionary_dirs=VOCABULARY_DICTIONARY_DIRS,
+        cache_size=VOCABULARY_CACHE_SIZE,
+    )
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import traceback
 from contextlib import asynccontextmanager
@@ -8,8 +9,16 @@ from fastapi import FastAPI
 from app.config.logger import logger as custom_logger
 from app.config.mongo import init as init_mongo, client as mongo_client
 from .dependencies.ai_models import init_eval_message_type_model
+from .config.ingestion import FIAB_MODE
+from .ds.fiab_worker import run_fiab_worker
+from .ds.parsing_pool import start_parsing_pool, shutdown_parsing_pool
+from .ds.rag_pipeline import warm_up_rag_pipelines
 from .exceptions.custom_exception import CustomException
-from .routers import chat, settings, collections, evaluation
+from .routers import chat, settings, collections, evaluation, metrics, jobs
+from .utils.input_sanitizers import warm_up_guards
+from .config.qdrant import BASE_COLLECTION_NAME
+from .config.rag import MODELS
+from .utils.qdrant import MODEL_NAMES
 
 # PASS IN ENV VARIABLE
 
@@ -23,8 +32,31 @@ async def lifespan(app: FastAPI):
     # Load the ML model
     init_eval_message_type_model(model_path="ai_models/clf_pr.skops")
 
+    # Start the parsing workers
+    await asyncio.to_thread(start_parsing_pool)
+
+    # Build the llm_guard scanners once for the whole process
+    await asyncio.to_thread(warm_up_guards)
+
+    # Build the RAG pipelines once for the whole process, the messages only bind their index to them
+    try:
+        await asyncio.to_thread(warm_up_rag_pipelines, BASE_COLLECTION_NAME, MODELS)
+    except Exception as e:
+        # They are built on the first message instead
+        custom_logger.warning(f"Could not build the RAG pipelines at startup: {e!r}")
+
+    # Start the background reliability worker when the reliability is deferred
+    fiab_worker = None
+    if FIAB_MODE == "deferred":
+        fiab_worker = asyncio.create_task(
+            run_fiab_worker(embedding_model=MODEL_NAMES["embed_model"], fiab_model=MODEL_NAMES["fiab_llm_model"])
+        )
+
     yield
 
+    if fiab_worker is not None:
+        fiab_worker.cancel()
+    shutdown_parsing_pool()
     mongo_client.close()
 
 
@@ -40,6 +72,8 @@ def create_app() -> FastAPI:
     app.include_router(chat.router)
     app.include_router(collections.router)
     app.include_router(evaluation.router)
+    app.include_router(metrics.router)
+    app.include_router(jobs.router)
 
     return app
 
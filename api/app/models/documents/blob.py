@@ -0,0 +1,25 @@
+from datetime import datetime
+from typing import Optional
+
+from beanie import Document, Indexed
+
+
+class Blob(Document):
+    """A file content stored once in the bucket, shared by all the collection files having this content"""
+    sha256: Indexed(str, unique=True)
+    size: int
+    content_type: str
+    # Each new blob of a content gets its own object, so that a removed blob never deletes the object of a new one
+    object_name: str
+    # Number of collection files pointing to the blob, the blob and its object are removed when it drops to 0
+    ref_count: int = 0
+    # Whether the object has been uploaded to the bucket
+    stored: bool = False
+    # A file whose chunks were recorded from this content, they are copied for the next files with this content
+    ingested_index: Optional[str] = None
+    ingested_filename: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Settings:
+        name = "blobs"
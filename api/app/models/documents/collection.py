@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 from beanie import Document, PydanticObjectId
 from bson import ObjectId
@@ -13,6 +13,8 @@ class CollectionFile(BaseModel):
     size: int
     content_type: str
     updated_at: datetime
+    # Content of the file in the blobs, None for the files uploaded before the blobs
+    blob_sha256: Optional[str] = None
 
     class Config:
         json_encoders = {
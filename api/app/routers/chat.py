@@ -1,24 +1,38 @@
 import asyncio
 import json
-from typing import Annotated, List
+from typing import Annotated, AsyncIterator, Awaitable, Callable, List
 
 from fastapi import APIRouter, File, Form, UploadFile, status, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
 import app.ds.rag_pipeline as rag
+from app.config.jobs import INGESTION_MODE
 from app.config.logger import logger
 from app.config.minio import COLLECTIONS_BUCKET_NAME
 from app.config.qdrant import BASE_COLLECTION_NAME
 from app.config.rag import MODELS, PRECISION
 from app.config.redis import client as redis_client
+from app.ds.answer_cache import answer_cache, get_index_version_async
+from app.ds.ingestion_jobs import enqueue_job, follow_jobs_progress, new_job_id
+from app.ds.query_embedding import query_embedding_service
+from app.ds.single_flight import chat_single_flight
 from app.exceptions.custom_exception import CustomException
 from app.models.app.success_response import SuccessResponse
 from app.models.documents.user_feedback import UserFeedback as UserFeedbackModel
 from app.models.user_prompt_request import UserPromptRequest
-from app.utils.file import UploadFile as CustomUploadFile
-from app.utils.input_sanitizers import sanitize_input
+from app.utils.file import UploadFile as CustomUploadFile, fork_upload_file
+from app.utils.executors import (
+    ingestion_admission,
+    ingestion_executor,
+    notify_ingestion_wait,
+    object_storage_executor,
+    redis_executor,
+    run_in_executor,
+)
+from app.utils.input_sanitizers import asanitize_input
 from app.utils.minio import remove_files_from_bucket, upload_file_to_bucket, token_pattern
+from app.utils.progress import ProgressStream
 from app.utils.qdrant import remove_qdrant_index, ingest_file
 
 router = APIRouter(
@@ -79,21 +93,46 @@ async def upload_file_to_bucket_async(token: str, file: UploadFile):
 
         """
 
-    return await asyncio.to_thread(upload_file_to_bucket, COLLECTIONS_BUCKET_NAME, f"{token}/{file.filename}", file)
+    return await run_in_executor(
+        object_storage_executor, upload_file_to_bucket, COLLECTIONS_BUCKET_NAME, f"{token}/{file.filename}", file,
+    )
 
 
-async def ingest_file_async(token: str, file: UploadFile):
+async def ingest_file_async(token: str, file: UploadFile, progress: Callable[[str, str], None] = None):
     """Ingest a file into the Qdrant vector store | async version
 
     Args:
         token (str): User token
         file (UploadFile): File to ingest
+        progress (Callable[[str, str], None], optional): Called with (stage, message) as the ingestion progresses
 
     Returns:
         None
 
     """
-    return await asyncio.to_thread(ingest_file, token, file, None, False)
+    async with ingestion_admission.slot(on_wait=notify_ingestion_wait(progress)):
+        return await run_in_executor(ingestion_executor, ingest_file, token, file, None, False, progress)
+
+
+async def upload_and_ingest_file_async(token: str, file: UploadFile, progress: Callable[[str, str], None] = None):
+    """Uploads a file to the bucket while it is ingested into the Qdrant vector store | async version
+
+    The upload and the parsing read the file at the same time, each with its own reader of the file
+
+    Args:
+        token (str): User token
+        file (UploadFile): File to upload and ingest
+        progress (Callable[[str, str], None], optional): Called with (stage, message) as the ingestion progresses
+
+    Returns:
+        None
+
+    """
+    uploaded_file, ingested_file = fork_upload_file(file)
+    await asyncio.gather(
+        upload_file_to_bucket_async(token, uploaded_file),
+        ingest_file_async(token, ingested_file, progress),
+    )
 
 
 async def upload_and_ingest_files(token: str, files: List[UploadFile]):
@@ -113,41 +152,57 @@ async def upload_and_ingest_files(token: str, files: List[UploadFile]):
     try:
         # We start by cleaning any potential files associated with that token
         try:
-            await asyncio.to_thread(check_and_remove_files, token)
+            await run_in_executor(object_storage_executor, check_and_remove_files, token)
         except Exception as e:
             logger.error("Error while cleaning potentially existing files from the bucket and vector store")
             raise e
 
-        # We can now upload all the files concurrently into the bucket
+        # We can now upload all the files into the bucket and ingest them concurrently
         try:
             yield f"""{json.dumps({
                 "event": "uploadFeedback",
                 "data": {
-                    "message": "Récupération des fichiers...",
+                    "message": "Récupération et formatage des fichiers...",
                 },
             })}\n"""
-            upload_files_to_bucket_tasks = [upload_file_to_bucket_async(token, file) for file in files]
-            await asyncio.gather(*upload_files_to_bucket_tasks)
+            if INGESTION_MODE == "queue":
+                # The ingestion workers take the files from the bucket, they are uploaded first
+                await asyncio.gather(*[upload_file_to_bucket_async(token, file) for file in files])
+                job_ids = [new_job_id() for _ in files]
+                await asyncio.gather(*[
+                    run_in_executor(
+                        redis_executor, enqueue_job, job_id, token, file.filename, file.filename,
+                        COLLECTIONS_BUCKET_NAME, f"{token}/{file.filename}", False, False,
+                    )
+                    for job_id, file in zip(job_ids, files)
+                ])
+                # The jobs go on if the client disconnects, the token must be tracked right away
+                await run_in_executor(redis_executor, redis_client.set, token, 1)
+                yield f"""{json.dumps({
+                    "event": "jobs",
+                    "data": {
+                        "message": "Fichiers en attente de traitement...",
+                        "jobs": [{"id": job_id, "filename": file.filename} for job_id, file in zip(job_ids, files)],
+                    },
+                })}\n"""
+                messages = follow_jobs_progress(job_ids)
+            else:
+                progress = ProgressStream()
+                upload_and_ingest_tasks = [
+                    upload_and_ingest_file_async(token, file, progress.callback(file.filename)) for file in files
+                ]
+                messages = progress.follow(asyncio.gather(*upload_and_ingest_tasks))
+            async for message in messages:
+                yield f"""{json.dumps({
+                    "event": "uploadFeedback",
+                    "data": {
+                        "message": message,
+                    },
+                })}\n"""
         except Exception:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Error while uploading files to the bucket",
-            )
-
-        # We then ingest all the files concurrently
-        try:
-            yield f"""{json.dumps({
-                "event": "uploadFeedback",
-                "data": {
-                    "message": "Formatage des fichiers...",
-                },
-            })}\n"""
-            ingest_data_tasks = [ingest_file_async(token, file) for file in files]
-            await asyncio.gather(*ingest_data_tasks)
-        except Exception:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Error while ingesting files into the vector store",
+                detail=f"Error while uploading and ingesting files",
             )
 
         # Once the upload is done, we can store the token in redis to keep track of further client requests
@@ -247,12 +302,13 @@ def removed_files(files_metadata: RemoveFilesMetaDataRequest):
         )
 
 
-def generate_user_prompt_response(generator, sources):
-    """Generate a stream of data containing the sources and the response message
+async def generate_user_prompt_response(generator, sources, on_complete: Callable[[str], Awaitable] = None):
+    """Generate a stream of data containing the sources and the response message | async version
 
     Args:
-        generator: The response generator
+        generator: The response async generator
         sources: The sources that helped generate the response
+        on_complete (Callable[[str], Awaitable], optional): Called with the whole response message once it is sent
 
     Returns:
         None
@@ -268,7 +324,9 @@ def generate_user_prompt_response(generator, sources):
     })}$$$\n"""
 
     # We return the chunks that constitute the content of the response message
-    for chunk in generator:
+    chunks = []
+    async for chunk in generator:
+        chunks.append(chunk)
         yield f"""{json.dumps({
             "event": "content",
             "data": {
@@ -276,12 +334,27 @@ def generate_user_prompt_response(generator, sources):
             },
         })}$$$\n"""
 
+    if on_complete is not None:
+        await on_complete("".join(chunks))
+
+
+async def replay_response(response: str) -> AsyncIterator[str]:
+    """Replays a response message already generated, as a response generator
+
+    Args:
+        response (str): The response message
+
+    Returns:
+        AsyncIterator[str]: The response generator
+    """
+    yield response
+
 
 @router.post(
     "/message",
     response_description="Answer user prompt request",
 )
-def process_message(user_prompt_request: UserPromptRequest):
+async def process_message(user_prompt_request: UserPromptRequest):
     try:
         """Process the user prompt request and generate an accurate answer
         
@@ -324,36 +397,86 @@ def process_message(user_prompt_request: UserPromptRequest):
 
         # We execute our RAG pipeline
         # Check message for LLM security purpose
-        if not sanitize_input(message=message):
+        if not await asanitize_input(message=message):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Error while sanitizing input for LLM",
             )
 
-        response = rag_pipeline.query(message, precision=PRECISION)
-
-        # We extract the sources that helped generate the response
-        sources = [
-            {
-                "id": n.id_,
-                "content": n.text,
-                "file": {
-                    # Fixme: Some values are not always present, we'll comment them out for now
-                    "name": n.metadata["filename"],
-                    # "path": n.metadata["path"],
-                    "type": n.metadata["filetype"]
-                    if "filetype" in n.metadata.keys()
-                    else "preprocessed",
-                    # "index": n.metadata["index"],
-                    # "page_number": n.metadata["page_number"],
-                },
-                "score": n.score
-            }
-            for n in response.source_nodes
-        ]
-        # We return a stream of data containing the sources and the response message
+        # The questions asked about a collection are answered from the answer cache when a similar enough question
+        # was asked since the last change of the collection files
+        on_complete = None
+        version = None
+        if answer_cache.enabled and user_prompt_request.mode == "collection":
+            version = await get_index_version_async(index)
+        if version is not None:
+            embedding = await query_embedding_service.embed(message, model=MODELS["embed_model"])
+            if (cached_answer := await answer_cache.get(index, version, workflow, MODELS, embedding)) is not None:
+                return StreamingResponse(
+                    generate_user_prompt_response(replay_response(cached_answer["answer"]), cached_answer["sources"]),
+                    media_type="text/event-stream",
+                    headers={
+                        "Cache-Control": "no-cache",
+                        "X-Accel-Buffering": "no",
+                    }
+                )
+
+        # The identical questions asked while an answer is being generated subscribe to its generation
+        if (flight := await chat_single_flight.join(index, workflow, message)) is not None and not flight.leader:
+            if (events := await chat_single_flight.subscribe(flight)) is not None:
+                return StreamingResponse(
+                    events,
+                    media_type="text/event-stream",
+                    headers={
+                        "Cache-Control": "no-cache",
+                        "X-Accel-Buffering": "no",
+                    }
+                )
+            # The generation failed before its first event, the question is answered by this request
+            flight = None
+
+        try:
+            # The retrieval and the completion run on the async qdrant and LLM clients, the message does not hold
+            # a thread
+            response = await rag_pipeline.aquery(message, precision=PRECISION)
+
+            # We extract the sources that helped generate the response
+            sources = [
+                {
+                    "id": n.id_,
+                    "content": n.text,
+                    "file": {
+                        # Fixme: Some values are not always present, we'll comment them out for now
+                        "name": n.metadata["filename"],
+                        # "path": n.metadata["path"],
+                        "type": n.metadata["filetype"]
+                        if "filetype" in n.metadata.keys()
+                        else "preprocessed",
+                        # "index": n.metadata["index"],
+                        # "page_number": n.metadata["page_number"],
+                    },
+                    "score": n.score
+                }
+                for n in response.source_nodes
+            ]
+        except Exception as e:
+            # The questions waiting for this generation answer on their own
+            if flight is not None:
+                await chat_single_flight.abort(flight, e)
+            raise e
+
+        # The answers without sources are not cached, the collection may have been empty
+        if version is not None and len(sources) > 0:
+            async def on_complete(answer: str):
+                await answer_cache.set(index, version, workflow, MODELS, embedding, answer, sources)
+
+        # We return a stream of data containing the sources and the response message, shared with the identical
+        # questions when the request leads their generation
+        events = generate_user_prompt_response(response.async_response_gen(), sources, on_complete)
+        if flight is not None:
+            events = chat_single_flight.lead(flight, events)
         return StreamingResponse(
-            generate_user_prompt_response(response.response_gen, sources),
+            events,
             media_type="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
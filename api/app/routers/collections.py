@@ -2,20 +2,50 @@ import asyncio
 import json
 import os
 from datetime import datetime
-from typing import Annotated, List
+from typing import Annotated, AsyncIterator, Callable, List, Optional
 
 from beanie import PydanticObjectId
-from fastapi import APIRouter, UploadFile, File, HTTPException, status, Form
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, status, Form, Header
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
+from minio.error import S3Error
 from pydantic import BaseModel, Field
-
-from app.config.minio import COLLECTIONS_BUCKET_NAME, client as minio_client
+from urllib3 import BaseHTTPResponse
+
+from app.config.jobs import INGESTION_MODE
+from app.config.minio import (
+    COLLECTIONS_BUCKET_NAME,
+    MINIO_DOWNLOAD_CHUNK_SIZE,
+    MINIO_DOWNLOAD_MODE,
+    client as minio_client,
+)
+from app.ds.answer_cache import bump_index_version_async
+from app.ds.ingestion_jobs import SUCCEEDED, enqueue_job, follow_jobs_progress, get_job, new_job_id
 from app.exceptions.custom_exception import CustomException
+from app.models.documents.blob import Blob
 from app.models.documents.collection import Collection as CollectionModel, CollectionFile
-from app.utils.file import UploadFile as CustomUploadFile
-from app.utils.minio import remove_files_from_bucket, upload_file_to_bucket
-from app.utils.qdrant import ingest_file, remove_qdrant_index, create_qdrant_collection_index, \
-    remove_files_from_qdrant_index
+from app.utils.blobs import (
+    acquire_blob,
+    copy_blob_chunks,
+    get_blob,
+    hash_file,
+    mark_blob_ingested,
+    mark_blob_stored,
+    release_blob,
+)
+from app.utils.executors import (
+    ingestion_admission,
+    ingestion_executor,
+    notify_ingestion_wait,
+    object_storage_executor,
+    redis_executor,
+    run_in_executor,
+    vector_store_executor,
+)
+from app.utils.file import UploadFile as CustomUploadFile, content_disposition, fork_upload_file, parse_range_header
+from app.utils.minio import get_presigned_download_url, remove_files_from_bucket, upload_file_to_bucket
+from app.utils.progress import ProgressStream
+from app.utils.qdrant import ingest_file, create_qdrant_collection_index, update_file
+from app.utils.teardown import teardown_collection, teardown_files
 
 router = APIRouter(
     prefix="/collections",
@@ -103,7 +133,7 @@ async def create_qdrant_collection_index_async(index: str):
     Returns:
         None
     """
-    await asyncio.to_thread(create_qdrant_collection_index, index)
+    await run_in_executor(vector_store_executor, create_qdrant_collection_index, index)
 
 
 @router.post(
@@ -248,6 +278,20 @@ async def patch_collection(collection_id: str, collection: UpdateCollectionReque
         )
 
 
+def get_file_object_name(collection_id: str, file_id: str, name: str) -> str:
+    """Returns the name of the object of a collection file in the bucket
+
+    Args:
+        collection_id (str): The collection id
+        file_id (str): The file id
+        name (str): The name of the uploaded file
+
+    Returns:
+        str: The object name
+    """
+    return f"collections/{collection_id}/file/{file_id}/{name}"
+
+
 async def upload_file_to_bucket_async(object_name: str, file: UploadFile):
     """Uploads a file to the bucket | async version
 
@@ -258,14 +302,20 @@ async def upload_file_to_bucket_async(object_name: str, file: UploadFile):
     Returns:
         None
     """
-    await asyncio.to_thread(upload_file_to_bucket, COLLECTIONS_BUCKET_NAME, object_name, file)
+    await run_in_executor(object_storage_executor, upload_file_to_bucket, COLLECTIONS_BUCKET_NAME, object_name, file)
 
 
 # -------------------------------------------------------------------------------------------------------------------- #
 # ADD files to Collection -------------------------------------------------------------------------------------------- #
 # -------------------------------------------------------------------------------------------------------------------- #
 
-async def ingest_file_async(collection_id: str, file: UploadFile, filename: str, preprocessed: bool):
+async def ingest_file_async(
+        collection_id: str,
+        file: UploadFile,
+        filename: str,
+        preprocessed: bool,
+        progress: Callable[[str, str], None] = None,
+):
     """Ingests a file into qdrant collection | async version
 
     Args:
@@ -273,8 +323,71 @@ async def ingest_file_async(collection_id: str, file: UploadFile, filename: str,
         file (UploadFile): The file to ingest
         filename (str): The file name
         preprocessed (bool): Whether the file is already preprocessed
+        progress (Callable[[str, str], None], optional): Called with (stage, message) as the ingestion progresses
+    """
+    async with ingestion_admission.slot(on_wait=notify_ingestion_wait(progress)):
+        await run_in_executor(ingestion_executor, ingest_file, collection_id, file, filename, preprocessed, progress)
+
+
+async def upload_and_ingest_file_async(
+        collection_id: str,
+        object_name: str,
+        file: UploadFile,
+        filename: str,
+        preprocessed: bool,
+        progress: Callable[[str, str], None] = None,
+):
+    """Uploads a file to the bucket while it is ingested into qdrant collection | async version
+
+    The upload and the parsing read the file at the same time, each with its own reader of the file
+
+    Args:
+        collection_id(str): The collection id
+        object_name (str): The object name
+        file (UploadFile): The file to upload and ingest
+        filename (str): The file name
+        preprocessed (bool): Whether the file is already preprocessed
+        progress (Callable[[str, str], None], optional): Called with (stage, message) as the ingestion progresses
     """
-    await asyncio.to_thread(ingest_file, collection_id, file, filename, preprocessed)
+    uploaded_file, ingested_file = fork_upload_file(file)
+    await asyncio.gather(
+        upload_file_to_bucket_async(object_name, uploaded_file),
+        ingest_file_async(collection_id, ingested_file, filename, preprocessed, progress),
+    )
+
+
+async def store_and_ingest_file_async(
+        collection_id: str,
+        blob: Blob,
+        file: UploadFile,
+        filename: str,
+        preprocessed: bool,
+        progress: Callable[[str, str], None] = None,
+):
+    """Stores a file in the blobs and ingests it into qdrant collection | async version
+
+    The file is only uploaded when its content is not stored yet, and the chunks of a file with the same content are
+    copied instead of parsing and embedding the file again
+
+    Args:
+        collection_id(str): The collection id
+        blob (Blob): The blob of the file content
+        file (UploadFile): The file to store and ingest
+        filename (str): The file name
+        preprocessed (bool): Whether the file is already preprocessed
+        progress (Callable[[str, str], None], optional): Called with (stage, message) as the ingestion progresses
+    """
+    if await copy_blob_chunks(blob, collection_id, filename):
+        if progress is not None:
+            progress("completed", "Fichier déjà intégré, chunks réutilisés")
+        if not blob.stored:
+            await upload_file_to_bucket_async(blob.object_name, file)
+    elif blob.stored:
+        await ingest_file_async(collection_id, file, filename, preprocessed, progress)
+    else:
+        await upload_and_ingest_file_async(collection_id, blob.object_name, file, filename, preprocessed, progress)
+    if not blob.stored:
+        await mark_blob_stored(blob.sha256)
 
 
 async def upload_files_to_collection(collection_id: str, files: list[UploadFile], preprocessed: bool):
@@ -292,6 +405,20 @@ async def upload_files_to_collection(collection_id: str, files: list[UploadFile]
                 },
             })}\n"""
 
+            # Each file points to the blob of its content, the contents already stored are shared
+            try:
+                sha256s = await asyncio.gather(*[
+                    run_in_executor(object_storage_executor, hash_file, file) for file in files
+                ])
+                blobs = await asyncio.gather(*[
+                    acquire_blob(sha256, file.size, file.content_type) for sha256, file in zip(sha256s, files)
+                ])
+            except Exception:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Error while referencing the files contents for collection {collection_id}",
+                )
+
             # async with await mongo_client.start_session() as s:
             #     async with s.start_transaction():
             # We start by creating a list of files to embed
@@ -304,7 +431,8 @@ async def upload_files_to_collection(collection_id: str, files: list[UploadFile]
                         size=file.size,
                         content_type=file.content_type,
                         updated_at=current_date,
-                    ) for index, file in enumerate(files)
+                        blob_sha256=sha256,
+                    ) for sha256, file in zip(sha256s, files)
                 ]
 
                 # We can now extend the list of files in our collection
@@ -313,58 +441,115 @@ async def upload_files_to_collection(collection_id: str, files: list[UploadFile]
                 # We persist the changes in the database
                 await existing_collection.save()
             except Exception:
+                # No file points to the blobs
+                await asyncio.gather(*[release_blob(sha256, collection_id, "") for sha256 in sha256s])
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=f"Error while adding files to mongodb for collection {collection_id}",
                 )
 
-            # We can now upload all the files concurrently into the minio bucket
-            # try:
-            #     yield f"""{json.dumps({
-            #         "event": "uploadFeedback",
-            #         "data": {
-            #             "message": "Récupération des fichiers...",
-            #         },
-            #     })}\n"""
-
-            #     upload_files_to_bucket_tasks = [
-            #         upload_file_to_bucket_async(
-            #             f"collections/{collection_id}/file/{collection_files[index].id}/{file.filename}",
-            #             file
-            #         ) for index, file in enumerate(files)
-            #     ]
-            #     await asyncio.gather(*upload_files_to_bucket_tasks)
-                
-            # except Exception:
-            #     raise HTTPException(
-            #         status_code=status.HTTP_400_BAD_REQUEST,
-            #         detail=f"Error while uploading files to minio for collection {collection_id}",
-            #     )
-
-            # We then ingest all the files concurrently
+            # We can now upload all the files into the minio bucket and ingest them concurrently
             try:
                 yield f"""{json.dumps({
                     "event": "uploadFeedback",
                     "data": {
-                        "message": "Formatage des fichiers...",
+                        "message": "Récupération et formatage des fichiers...",
                     },
                 })}\n"""
-                ingest_data_tasks = [
-                    ingest_file_async(
-                        collection_id,
-                        file,
-                        # Fixme: test files without extension
-                        f"{collection_files[index].id}{collection_files[index].extension if collection_files[index].extension else ''}",
-                        preprocessed
-                    )
-                    for index, file in enumerate(files)
+                # Fixme: test files without extension
+                filenames = [
+                    f"{collection_file.id}{collection_file.extension if collection_file.extension else ''}"
+                    for collection_file in collection_files
                 ]
-                await asyncio.gather(*ingest_data_tasks)
+                if INGESTION_MODE == "queue":
+                    # The chunks of the contents already ingested are copied, the other files go to the workers
+                    copied = await asyncio.gather(*[
+                        copy_blob_chunks(blob, collection_id, filename) for blob, filename in zip(blobs, filenames)
+                    ])
+                    for file in [file for is_copied, file in zip(copied, files) if is_copied]:
+                        yield f"""{json.dumps({
+                            "event": "uploadFeedback",
+                            "data": {
+                                "message": f"{file.filename} : Fichier déjà intégré, chunks réutilisés",
+                            },
+                        })}\n"""
+
+                    # The ingestion workers take the files from the bucket, they are uploaded first
+                    new_blobs = {blob.sha256: (blob, file) for blob, file in zip(blobs, files) if not blob.stored}
+                    await asyncio.gather(*[
+                        upload_file_to_bucket_async(blob.object_name, file) for blob, file in new_blobs.values()
+                    ])
+                    await asyncio.gather(*[mark_blob_stored(sha256) for sha256 in new_blobs])
+                    queued = [
+                        (blob, file, filename)
+                        for is_copied, blob, file, filename in zip(copied, blobs, files, filenames) if not is_copied
+                    ]
+                    job_ids = [new_job_id() for _ in queued]
+                    await asyncio.gather(*[
+                        run_in_executor(
+                            redis_executor, enqueue_job, job_id, collection_id, filename, file.filename,
+                            COLLECTIONS_BUCKET_NAME, blob.object_name, preprocessed, False,
+                        )
+                        for job_id, (blob, file, filename) in zip(job_ids, queued)
+                    ])
+                    yield f"""{json.dumps({
+                        "event": "jobs",
+                        "data": {
+                            "message": "Fichiers en attente de traitement...",
+                            "jobs": [
+                                {"id": job_id, "filename": file.filename}
+                                for job_id, (_, file, _) in zip(job_ids, queued)
+                            ],
+                        },
+                    })}\n"""
+                    messages = follow_jobs_progress(job_ids)
+                else:
+                    progress = ProgressStream()
+                    store_and_ingest_tasks = [
+                        store_and_ingest_file_async(
+                            collection_id, blob, file, filename, preprocessed, progress.callback(file.filename)
+                        )
+                        for blob, filename, file in zip(blobs, filenames, files)
+                    ]
+                    messages = progress.follow(asyncio.gather(*store_and_ingest_tasks))
+                ingestion_error = None
+                try:
+                    async for message in messages:
+                        yield f"""{json.dumps({
+                            "event": "uploadFeedback",
+                            "data": {
+                                "message": message,
+                            },
+                        })}\n"""
+                except Exception as e:
+                    ingestion_error = e
+
+                # The chunks of the files ingested successfully can now be copied for the next files with the same
+                # contents, the files of the failed jobs have no chunks
+                if INGESTION_MODE == "queue":
+                    jobs = await asyncio.gather(*[
+                        run_in_executor(redis_executor, get_job, job_id) for job_id in job_ids
+                    ])
+                    ingested = [
+                        (blob.sha256, filename)
+                        for job, (blob, _, filename) in zip(jobs, queued)
+                        if job is not None and job["state"] == SUCCEEDED
+                    ]
+                else:
+                    ingested = list(zip(sha256s, filenames)) if ingestion_error is None else []
+                await asyncio.gather(*[
+                    mark_blob_ingested(sha256, collection_id, filename) for sha256, filename in ingested
+                ])
+                if ingestion_error is not None:
+                    raise ingestion_error
             except Exception:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Error while ingesting files to qdrant for collection {collection_id}",
+                    detail=f"Error while uploading and ingesting files for collection {collection_id}",
                 )
+            finally:
+                # The answers cached for the collection no longer match its files
+                await bump_index_version_async(collection_id)
         else:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -412,6 +597,214 @@ async def upload_files(
     )
 
 
+# -------------------------------------------------------------------------------------------------------------------- #
+# UPDATE file in Collection ------------------------------------------------------------------------------------------ #
+# -------------------------------------------------------------------------------------------------------------------- #
+
+async def update_file_async(
+        collection_id: str,
+        file: UploadFile,
+        filename: str,
+        progress: Callable[[str, str], None] = None,
+):
+    """Replaces a file already ingested into qdrant collection by its new version | async version
+
+    Args:
+        collection_id(str): The collection id
+        file (UploadFile): The new version of the file
+        filename (str): The name under which the file was ingested
+        progress (Callable[[str, str], None], optional): Called with (stage, message) as the update progresses
+    """
+    async with ingestion_admission.slot(on_wait=notify_ingestion_wait(progress)):
+        await run_in_executor(ingestion_executor, update_file, collection_id, file, filename, progress)
+
+
+async def upload_and_update_file_async(
+        collection_id: str,
+        object_name: str,
+        file: UploadFile,
+        filename: str,
+        progress: Callable[[str, str], None] = None,
+):
+    """Uploads the new version of a file to the bucket while its chunks are updated in qdrant collection | async version
+
+    The upload and the parsing read the file at the same time, each with its own reader of the file
+
+    Args:
+        collection_id(str): The collection id
+        object_name (str): The object name of the new version
+        file (UploadFile): The new version of the file
+        filename (str): The name under which the file was ingested
+        progress (Callable[[str, str], None], optional): Called with (stage, message) as the update progresses
+    """
+    uploaded_file, updated_file = fork_upload_file(file)
+    await asyncio.gather(
+        upload_file_to_bucket_async(object_name, uploaded_file),
+        update_file_async(collection_id, updated_file, filename, progress),
+    )
+
+
+async def update_file_in_collection(collection_id: str, file_id: str, file: UploadFile):
+    try:
+        # We check if the collection and the file exist
+        existing_collection = await CollectionModel.get(collection_id)
+        existing_file = next(
+            (
+                collection_file for collection_file in (existing_collection.files if existing_collection else [])
+                if str(collection_file.id) == file_id
+            ),
+            None
+        )
+        if existing_file is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"File {file_id} to update in collection {collection_id} not found"
+            )
+
+        # The file is recorded in qdrant under its id and its extension, the new version must keep the extension
+        extension = os.path.splitext(file.filename)[1]
+        if extension != existing_file.extension:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"The new version of the file {file_id} must have the {existing_file.extension} extension",
+            )
+        filename = f"{existing_file.id}{existing_file.extension if existing_file.extension else ''}"
+
+        # The new version points to the blob of its content
+        try:
+            yield f"""{json.dumps({
+                "event": "uploadFeedback",
+                "data": {
+                    "message": "Mise à jour du fichier...",
+                },
+            })}\n"""
+            sha256 = await run_in_executor(object_storage_executor, hash_file, file)
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Error while hashing the new version of the file {file_id}",
+            )
+
+        # We then store the new content and update the chunks that changed, unless the content is the same
+        if sha256 != existing_file.blob_sha256:
+            blob = await acquire_blob(sha256, file.size, file.content_type)
+            try:
+                if INGESTION_MODE == "queue":
+                    # The ingestion workers take the file from the bucket, it is uploaded first
+                    job_id = new_job_id()
+                    if not blob.stored:
+                        await upload_file_to_bucket_async(blob.object_name, file)
+                        await mark_blob_stored(sha256)
+                    await run_in_executor(
+                        redis_executor, enqueue_job, job_id, collection_id, filename, file.filename,
+                        COLLECTIONS_BUCKET_NAME, blob.object_name, False, False, "update",
+                    )
+                    yield f"""{json.dumps({
+                        "event": "jobs",
+                        "data": {
+                            "message": "Fichier en attente de traitement...",
+                            "jobs": [{"id": job_id, "filename": file.filename}],
+                        },
+                    })}\n"""
+                    messages = follow_jobs_progress([job_id])
+                else:
+                    progress = ProgressStream()
+                    if blob.stored:
+                        update_task = update_file_async(collection_id, file, filename, progress.callback(file.filename))
+                    else:
+                        update_task = upload_and_update_file_async(
+                            collection_id, blob.object_name, file, filename, progress.callback(file.filename)
+                        )
+                    messages = progress.follow(update_task)
+                async for message in messages:
+                    yield f"""{json.dumps({
+                        "event": "uploadFeedback",
+                        "data": {
+                            "message": message,
+                        },
+                    })}\n"""
+                if INGESTION_MODE != "queue" and not blob.stored:
+                    await mark_blob_stored(sha256)
+            except Exception:
+                # The file still points to its previous content
+                await release_blob(sha256, collection_id, filename)
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Error while uploading and updating the file {file_id} for collection {collection_id}",
+                )
+            finally:
+                # The answers cached for the collection no longer match its files
+                await bump_index_version_async(collection_id)
+
+        # We persist the new version of the file in mongodb
+        previous_sha256 = existing_file.blob_sha256
+        try:
+            existing_file.name = file.filename
+            existing_file.size = file.size
+            existing_file.content_type = file.content_type
+            existing_file.updated_at = datetime.now()
+            existing_file.blob_sha256 = sha256
+            await existing_collection.save()
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Error while updating the file {file_id} in mongodb for collection {collection_id}",
+            )
+
+        # The previous content is no longer referenced by the file, and the chunks of the new one can be copied
+        if sha256 != previous_sha256:
+            try:
+                if previous_sha256 is not None:
+                    await release_blob(previous_sha256, collection_id, filename)
+                else:
+                    await remove_files_from_bucket_async(f"collections/{collection_id}/file/{file_id}/")
+                await mark_blob_ingested(sha256, collection_id, filename)
+            except Exception:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Error while releasing the previous version of the file {file_id}",
+                )
+    except Exception as e:
+        raise CustomException(
+            message=f"Error while updating the file {file_id} of the collection {collection_id}",
+            original_exception=e
+        )
+    finally:
+        # Fixme: Due to an issue, we manually close the files for now until a fix is provided by fastapi
+        await file.close()
+
+
+@router.put("/{collection_id}/files/{file_id}")
+async def put_file(
+        collection_id: str,
+        file_id: str,
+        file: Annotated[UploadFile, File()],
+):
+    """Replaces a file of a collection by its new version
+
+    Only the chunks whose content changed are processed: the new ones are embedded and recorded, the ones that
+    vanished are removed from qdrant
+
+    Args:
+        collection_id (str): The collection id
+        file_id (str): The file id
+        file (UploadFile): The new version of the file
+
+    Returns:
+        StreamingResponse: The streaming response
+
+    """
+    return StreamingResponse(
+        # Fixme: Due to a fastapi issue, we'll convert our file into a custom UploadFile instance
+        update_file_in_collection(collection_id, file_id, CustomUploadFile(file)),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        }
+    )
+
+
 # -------------------------------------------------------------------------------------------------------------------- #
 # GET single collection ---------------------------------------------------------------------------------------------- #
 # -------------------------------------------------------------------------------------------------------------------- #
@@ -450,33 +843,45 @@ async def get_files(collection_id: str):
 # DOWNLOAD collection file ------------------------------------------------------------------------------------------- #
 # -------------------------------------------------------------------------------------------------------------------- #
 
-async def get_file_from_bucket_async(object_name: str, output_file_path: str):
-    """"Downloads a file from minio | async version
+async def stream_object(response: BaseHTTPResponse) -> AsyncIterator[bytes]:
+    """Streams an object opened in minio to the client, chunk after chunk | async version
 
     Args:
-        object_name (str): The object name
-        output_file_path (str): The output file path
+        response (BaseHTTPResponse): The minio response of the object, or of a range of the object
 
     Returns:
-        None
-
+        AsyncIterator[bytes]: The chunks of the object
     """
-    await asyncio.to_thread(minio_client.fget_object, COLLECTIONS_BUCKET_NAME, object_name, output_file_path)
+    try:
+        chunks = response.stream(MINIO_DOWNLOAD_CHUNK_SIZE)
+        while (chunk := await run_in_executor(object_storage_executor, next, chunks, None)) is not None:
+            yield chunk
+    finally:
+        response.close()
+        response.release_conn()
 
 
 @router.get(
     "/{collection_id}/files/{file_id}",
     response_description="Download a file from a collection",
 )
-async def download_file(collection_id: str, file_id: str):
+async def download_file(
+        collection_id: str,
+        file_id: str,
+        range_header: Annotated[Optional[str], Header(alias="Range")] = None,
+):
     """Download a file from a collection
-    
+
+    The file is streamed from minio as it is read, a single byte range can be requested with the Range header.
+    With MINIO_DOWNLOAD_MODE=presigned, the client is redirected to a presigned minio url instead
+
     Args:
         collection_id (str): The collection id
         file_id (str): The file id
+        range_header (str, optional): The Range header of the request
 
     Returns:
-        FileResponse: The file response
+        StreamingResponse | RedirectResponse: The file response, or the redirection to minio
 
     Raises:
         HTTPException
@@ -499,42 +904,71 @@ async def download_file(collection_id: str, file_id: str):
             ]
         ).to_list(length=None)
 
-        if (existing_file := existing_files[0]) is not None:
-            # We retrieve the file from minio and store in it a temporary file
-            try:
-                # Let's store the file in a temporary location
-                tmp_file_path = f"/tmp/{collection_id}-{file_id}"
-
-                # We retrieve the file from minio
-                await get_file_from_bucket_async(
-                    f"collections/{collection_id}/file/{file_id}/{existing_file['files']['name']}",
-                    tmp_file_path
-                )
+        if len(existing_files) == 0:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"File {file_id} to download from collection {collection_id} not found",
+            )
 
-            except HTTPException:
+        filename = existing_files[0]['files']['name']
+        object_name = get_file_object_name(collection_id, file_id, filename)
+        # The files uploaded since the blobs are stored in the blob of their content
+        if (blob_sha256 := existing_files[0]['files'].get('blob_sha256')) is not None:
+            if (blob := await get_blob(blob_sha256)) is None:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"Error while retrieving file {file_id} from collection {collection_id} from minio",
+                    detail=f"Content of the file {file_id} from collection {collection_id} not found",
                 )
+            object_name = blob.object_name
 
-            # We check if the file has been correctly created
-            if not os.path.exists(tmp_file_path):
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"Unable to create file (collection_id: {collection_id}, file_id: {file_id}) for download"
-                )
+        # The client downloads the file from minio, the API only signs the url
+        if MINIO_DOWNLOAD_MODE == "presigned":
+            url = await run_in_executor(
+                object_storage_executor, get_presigned_download_url, COLLECTIONS_BUCKET_NAME, object_name, filename
+            )
+            return RedirectResponse(url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
 
-            # We serve the file to the client
-            return FileResponse(
-                tmp_file_path,
-                media_type='application/octet-stream',
-                filename=existing_file['files']['name']
+        # We retrieve the size of the file in minio, to answer the range requests
+        try:
+            stat = await run_in_executor(
+                object_storage_executor, minio_client.stat_object, COLLECTIONS_BUCKET_NAME, object_name
             )
-        else:
+        except S3Error:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"File {file_id} to download from collection {collection_id} not found",
+                detail=f"Error while retrieving file {file_id} from collection {collection_id} from minio",
+            )
+
+        headers = {
+            "Accept-Ranges": "bytes",
+            "Content-Disposition": content_disposition(filename),
+        }
+        try:
+            byte_range = parse_range_header(range_header, stat.size)
+        except ValueError:
+            return Response(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={**headers, "Content-Range": f"bytes */{stat.size}"},
             )
+
+        # We open the file, or the requested range of the file, and stream it to the client
+        if byte_range is None:
+            offset, length, status_code = 0, stat.size, status.HTTP_200_OK
+        else:
+            offset, length, status_code = byte_range[0], byte_range[1] - byte_range[0] + 1, \
+                status.HTTP_206_PARTIAL_CONTENT
+            headers["Content-Range"] = f"bytes {byte_range[0]}-{byte_range[1]}/{stat.size}"
+        headers["Content-Length"] = str(length)
+        response = await run_in_executor(
+            object_storage_executor, minio_client.get_object, COLLECTIONS_BUCKET_NAME, object_name,
+            offset=offset, length=length,
+        )
+        return StreamingResponse(
+            stream_object(response),
+            status_code=status_code,
+            media_type='application/octet-stream',
+            headers=headers,
+        )
     except Exception as e:
         raise CustomException(
             message=f"Error while downloading the file {file_id} from collection {collection_id}",
@@ -555,19 +989,7 @@ async def remove_files_from_bucket_async(prefix: str):
     Returns:
         None
     """
-    await asyncio.to_thread(remove_files_from_bucket, COLLECTIONS_BUCKET_NAME, prefix)
-
-
-async def remove_qdrant_index_async(index: str):
-    """Remove the qdrant index | async version
-    
-    Args:
-        index (str): The index to remove
-    
-    Returns:
-        None
-    """
-    await asyncio.to_thread(remove_qdrant_index, index)
+    await run_in_executor(object_storage_executor, remove_files_from_bucket, COLLECTIONS_BUCKET_NAME, prefix)
 
 
 @router.delete(
@@ -577,7 +999,9 @@ async def remove_qdrant_index_async(index: str):
 )
 async def delete_collection(collection_id: str):
     """Deletes a collection
-    
+
+    Its files are removed from qdrant, minio and mongodb concurrently
+
     Args:
         collection_id (str): The collection id
         
@@ -594,31 +1018,13 @@ async def delete_collection(collection_id: str):
     try:
         # We start by checking if the collection exists
         if (existing_collection := await CollectionModel.get(collection_id)) is not None:
-            # We remove all files from minio
-            # try:
-            #     await remove_files_from_bucket_async(f"collections/{existing_collection.id}")
-            # except Exception:
-            #     raise HTTPException(
-            #         status_code=status.HTTP_400_BAD_REQUEST,
-            #         detail=f"Error while deleting the collection {collection_id} files from minio",
-            #     )
-
-            # We delete the collection index in qdrant
+            # We delete the collection index in qdrant, its files in minio and the collection in mongodb
             try:
-                await remove_qdrant_index_async(str(collection_id))
+                await teardown_collection(existing_collection)
             except Exception:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Error while deleting the collection {collection_id} files from qdrant",
-                )
-
-            # We delete the collection and all its associated files in mongodb
-            try:
-                await existing_collection.delete()
-            except Exception:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Error while deleting the collection {collection_id} from mongodb",
+                    detail=f"Error while deleting the collection {collection_id}",
                 )
         else:
             raise HTTPException(
@@ -633,18 +1039,39 @@ async def delete_collection(collection_id: str):
 
 
 # -------------------------------------------------------------------------------------------------------------------- #
-# DELETE file from collection ---------------------------------------------------------------------------------------- #
+# DELETE files from collection --------------------------------------------------------------------------------------- #
 # -------------------------------------------------------------------------------------------------------------------- #
 
+async def delete_files_from_collection(collection_id: str, file_ids: List[str]):
+    """Removes files from a collection, in qdrant, minio and mongodb
 
-async def remove_files_from_qdrant_index_async(index: str, filename: str):
-    """
-    Removes a file from a specific qdrant index | async version
-    :param index:
-    :param filename:
-    :return:
+    Args:
+        collection_id (str): The collection id
+        file_ids (List[str]): The file ids
+
+    Raises:
+        HTTPException
     """
-    await asyncio.to_thread(remove_files_from_qdrant_index, index, filename)
+    # We check if the files actually exist in the collection
+    existing_collection = await CollectionModel.get(collection_id)
+    existing_files = {
+        str(collection_file.id): collection_file
+        for collection_file in (existing_collection.files if existing_collection else [])
+    }
+    if (missing_file_ids := [file_id for file_id in file_ids if file_id not in existing_files]):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Files {missing_file_ids} to delete not found in collection {collection_id}",
+        )
+
+    # We delete the files in qdrant, minio and mongodb
+    try:
+        await teardown_files(existing_collection, [existing_files[file_id] for file_id in dict.fromkeys(file_ids)])
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Error while deleting the files {file_ids} from collection {collection_id}",
+        )
 
 
 @router.delete(
@@ -668,75 +1095,43 @@ async def delete_file(collection_id: str, file_id: str):
     """
 
     try:
-        # We check if the file actually exists in the collection
-        # Fixme: refactor request used multiple times, maybe attach to Collection model directly
-        existing_files = await CollectionModel.aggregate(
-            [
-                {
-                    "$unwind": {"path": "$files"}
-                },
-                {
-                    "$match": {
-                        "_id": PydanticObjectId(collection_id),
-                        "files._id": PydanticObjectId(file_id)
-                    }
-                }
-            ]
-        ).to_list(length=None)
+        await delete_files_from_collection(collection_id, [file_id])
+    except Exception as e:
+        raise CustomException(
+            message=f"Error while deleting the file {file_id} from collection {collection_id}",
+            original_exception=e
+        )
 
-        if (existing_file := existing_files[0]) is not None:
-            # We delete the file in qdrant
-            try:
-                await remove_files_from_qdrant_index_async(
-                    collection_id,
-                    f"{existing_file['files']['_id']}{existing_file['files']['extension'] if existing_file['files']['extension'] else ''}",
-                )
-            except Exception:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Error while deleting the file {file_id} from qdrant",
-                )
 
-            # We then delete the file in minio
-            try:
-                await remove_files_from_bucket_async(f"collections/{collection_id}/file/{file_id}")
-            except Exception:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Error while deleting the file {file_id} from minio",
-                )
+# Request body format model
+class DeleteFilesRequest(BaseModel):
+    file_ids: List[str] = Field(min_length=1)
 
-            # We delete the file in mongodb
-            try:
-                # We grab the corresponding collection that has the file first
-                existing_collections = await CollectionModel.find(
-                    CollectionModel.id == PydanticObjectId(collection_id),
-                    CollectionModel.files._id == PydanticObjectId(file_id),
-                ).to_list(length=None)
-
-                # We then pop the file out from the collection
-                await existing_collections[0].update(
-                    {
-                        "$pull": {
-                            "files": {
-                                "_id": PydanticObjectId(file_id)
-                            }
-                        }
-                    }
-                )
 
-            except Exception as e:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Error while deleting the file {file_id} from mongodb",
-                )
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"File {file_id} to delete not found",
-            )
+@router.post(
+    "/{collection_id}/files/delete",
+    response_description="Delete files",
+    status_code=status.HTTP_204_NO_CONTENT,
+)
+async def delete_files(collection_id: str, request: DeleteFilesRequest):
+    """Remove files from a qdrant collection, with a single removal per store
+
+    Args:
+        collection_id (str): The collection id
+        request (DeleteFilesRequest): The ids of the files to remove
+
+    Returns:
+        None
+
+    Raises:
+        HTTPException
+        CustomException
+    """
+
+    try:
+        await delete_files_from_collection(collection_id, request.file_ids)
     except Exception as e:
         raise CustomException(
-            message=f"Error while deleting the file {file_id} from collection {collection_id}",
+            message=f"Error while deleting {len(request.file_ids)} files from collection {collection_id}",
             original_exception=e
         )
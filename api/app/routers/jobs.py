@@ -0,0 +1,84 @@
+import json
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette import status
+
+from ..ds.ingestion_jobs import follow_jobs, get_job
+from ..exceptions.custom_exception import CustomException
+from ..utils.executors import redis_executor, run_in_executor
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["jobs"],
+)
+
+
+@router.get("/{job_id}")
+async def get_ingestion_job(job_id: str):
+    """Return an ingestion job
+
+    Args:
+        job_id (str): The job id
+
+    Returns:
+        dict: The job, with its state, its current stage and message, its attempts and the time spent in each stage
+
+    Raises:
+        CustomException
+    """
+    try:
+        try:
+            job = await run_in_executor(redis_executor, get_job, job_id)
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Error while fetching the ingestion job {job_id}",
+            )
+        if job is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Ingestion job {job_id} not found",
+            )
+        return job
+    except Exception as e:
+        raise CustomException(
+            message=f"Error while fetching the ingestion job {job_id}",
+            original_exception=e
+        )
+
+
+async def stream_job(job_id: str):
+    try:
+        async for job in follow_jobs([job_id]):
+            yield f"""{json.dumps({
+                "event": "jobStatus",
+                "data": job,
+            })}\n"""
+    except Exception as e:
+        raise CustomException(
+            message=f"Error while following the ingestion job {job_id}",
+            original_exception=e
+        )
+
+
+@router.get("/{job_id}/events")
+async def get_ingestion_job_events(job_id: str):
+    """Stream the updates of an ingestion job until it is finished
+
+    The ingestion goes on if the client disconnects, the stream can be opened again at any time
+
+    Args:
+        job_id (str): The job id
+
+    Returns:
+        StreamingResponse: A stream of jobStatus events
+    """
+    return StreamingResponse(
+        stream_job(job_id),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        }
+    )
@@ -0,0 +1,166 @@
+from fastapi import APIRouter, HTTPException
+from starlette import status
+
+from ..ds.answer_cache import answer_cache
+from ..ds.embedding_cache import embedding_cache
+from ..ds.query_embedding import query_embedding_service
+from ..ds.single_flight import chat_single_flight
+from ..ds.rag_pipeline import rag_pipeline_registry
+from ..exceptions.custom_exception import CustomException
+from ..utils.executors import get_executors_stats, redis_executor, run_in_executor
+from ..utils.input_sanitizers import get_guard_stats
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["metrics"],
+)
+
+
+@router.get("/embedding-cache")
+async def get_embedding_cache_metrics():
+    """Return the embeddings cache counters
+
+    Returns:
+        dict: The number of hot / cold hits and misses, and the number of entries in the hot tier
+
+    Raises:
+        CustomException
+    """
+    try:
+        return await run_in_executor(redis_executor, embedding_cache.get_stats)
+    except Exception:
+        raise CustomException(
+            original_exception=HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Error while fetching the embedding cache metrics",
+            )
+        )
+
+
+@router.get("/query-embeddings")
+async def get_query_embeddings_metrics():
+    """Return the counters of the query embedding service of this API replica
+
+    Returns:
+        dict: The hits of the memory and redis caches, the questions that shared a pending embedding, the questions
+            embedded and the number of embeddings requests
+
+    Raises:
+        CustomException
+    """
+    try:
+        return query_embedding_service.get_stats()
+    except Exception:
+        raise CustomException(
+            original_exception=HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Error while fetching the query embeddings metrics",
+            )
+        )
+
+
+@router.get("/answer-cache")
+async def get_answer_cache_metrics():
+    """Return the counters of the answer cache of this API replica
+
+    Returns:
+        dict: The number of answers served from the cache, of questions answered by the pipeline and of answers stored
+
+    Raises:
+        CustomException
+    """
+    try:
+        return answer_cache.get_stats()
+    except Exception:
+        raise CustomException(
+            original_exception=HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Error while fetching the answer cache metrics",
+            )
+        )
+
+
+@router.get("/single-flight")
+async def get_single_flight_metrics():
+    """Return the counters of the chat single flight of this API replica
+
+    Returns:
+        dict: The number of generations led and running, of questions that subscribed to another generation and of
+            questions answered on their own because the generation they joined failed
+
+    Raises:
+        CustomException
+    """
+    try:
+        return chat_single_flight.get_stats()
+    except Exception:
+        raise CustomException(
+            original_exception=HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Error while fetching the single flight metrics",
+            )
+        )
+
+
+@router.get("/guard")
+async def get_guard_metrics():
+    """Return the llm_guard metrics of this API replica
+
+    Returns:
+        dict: For each guard, the verdicts cache counters and the time spent in each scanner
+
+    Raises:
+        CustomException
+    """
+    try:
+        return get_guard_stats()
+    except Exception:
+        raise CustomException(
+            original_exception=HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Error while fetching the guard metrics",
+            )
+        )
+
+
+@router.get("/executors")
+async def get_executors_metrics():
+    """Return the counters of the executors and of the ingestion admission control of this API replica
+
+    Returns:
+        dict: For each executor, its size and its queued, running and completed tasks, and the admitted and waiting
+            ingestions
+
+    Raises:
+        CustomException
+    """
+    try:
+        return get_executors_stats()
+    except Exception:
+        raise CustomException(
+            original_exception=HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Error while fetching the executors metrics",
+            )
+        )
+
+
+@router.get("/rag-pipelines")
+async def get_rag_pipelines_metrics():
+    """Return the counters of the RAG pipelines registry of this API replica
+
+    Returns:
+        dict: The number of pipelines built, of messages served by an existing pipeline and the pipelines keys
+
+    Raises:
+        CustomException
+    """
+    try:
+        return rag_pipeline_registry.get_stats()
+    except Exception:
+        raise CustomException(
+            original_exception=HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Error while fetching the RAG pipelines metrics",
+            )
+        )
@@ -0,0 +1,198 @@
+import asyncio
+import hashlib
+import os
+from collections import Counter
+from datetime import datetime
+from typing import List, Tuple
+
+from bson import ObjectId
+from fastapi import UploadFile
+from pymongo import ReturnDocument, UpdateOne
+
+from app.config.logger import logger
+from app.config.minio import COLLECTIONS_BUCKET_NAME
+from app.models.documents.blob import Blob
+from app.utils.executors import object_storage_executor, run_in_executor, vector_store_executor
+from app.utils.file import fork_upload_file
+from app.utils.minio import remove_objects_from_bucket
+from app.utils.qdrant import copy_file
+
+BLOBS_PREFIX = "blobs"
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(file: UploadFile) -> str:
+    """Computes the SHA-256 of an uploaded file, with its own reader so that the position of the file is kept
+
+    Args:
+        file (UploadFile): The uploaded file
+
+    Returns:
+        str: The hexadecimal digest
+    """
+    reader = fork_upload_file(file, nb_readers=1)[0].file
+    sha256 = hashlib.sha256()
+    while len(chunk := reader.read(HASH_CHUNK_SIZE)) > 0:
+        sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+async def acquire_blob(sha256: str, size: int, content_type: str) -> Blob:
+    """Adds a reference to the blob of a content, the blob is created if the content is new
+
+    Args:
+        sha256 (str): The SHA-256 of the content
+        size (int): The size of the content
+        content_type (str): The content type of the uploaded file
+
+    Returns:
+        Blob: The blob, whose object must be uploaded when it is not stored yet
+    """
+    current_date = datetime.now()
+    # A single atomic upsert, so that concurrent uploads of the same content share the same blob
+    document = await Blob.get_motor_collection().find_one_and_update(
+        {"sha256": sha256},
+        {
+            "$inc": {"ref_count": 1},
+            "$set": {"updated_at": current_date},
+            "$setOnInsert": {
+                "size": size,
+                "content_type": content_type or "application/octet-stream",
+                "object_name": f"{BLOBS_PREFIX}/{sha256[:2]}/{sha256}/{ObjectId()}",
+                "stored": False,
+                "ingested_index": None,
+                "ingested_filename": None,
+                "created_at": current_date,
+            },
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return Blob.model_validate(document)
+
+
+async def get_blob(sha256: str) -> Blob | None:
+    """Returns the blob of a content
+
+    Args:
+        sha256 (str): The SHA-256 of the content
+
+    Returns:
+        Blob | None: The blob, None if no file has this content
+    """
+    return await Blob.find_one(Blob.sha256 == sha256)
+
+
+async def mark_blob_stored(sha256: str):
+    """Records that the object of a blob has been uploaded
+
+    Args:
+        sha256 (str): The SHA-256 of the content
+    """
+    await Blob.get_motor_collection().update_one(
+        {"sha256": sha256},
+        {"$set": {"stored": True, "updated_at": datetime.now()}},
+    )
+
+
+async def mark_blob_ingested(sha256: str, index: str, filename: str):
+    """Records a file whose chunks can be copied for the next files with the same content, if there is none yet
+
+    Args:
+        sha256 (str): The SHA-256 of the content
+        index (str): The collection id
+        filename (str): The name under which the file was ingested
+    """
+    await Blob.get_motor_collection().update_one(
+        {"sha256": sha256, "ingested_index": None},
+        {"$set": {"ingested_index": index, "ingested_filename": filename, "updated_at": datetime.now()}},
+    )
+
+
+async def copy_blob_chunks(blob: Blob, index: str, filename: str) -> bool:
+    """Records the chunks of a file from the chunks of another file with the same content | async version
+
+    Args:
+        blob (Blob): The blob of the file
+        index (str): The collection id
+        filename (str): The name under which the file is ingested
+
+    Returns:
+        bool: Whether the chunks were copied, otherwise the file must be ingested
+    """
+    if blob.ingested_index is None or blob.ingested_filename is None:
+        return False
+    if (blob.ingested_index, blob.ingested_filename) == (index, filename):
+        return False
+    # The parsing depends on the extension, the chunks of a .txt are not those of the same content as a .md
+    if os.path.splitext(blob.ingested_filename)[1].lower() != os.path.splitext(filename)[1].lower():
+        return False
+    nb_chunks = await run_in_executor(
+        vector_store_executor, copy_file, blob.ingested_index, blob.ingested_filename, index, filename
+    )
+    if nb_chunks == 0:
+        # The recorded file has no chunks, the next file ingested with this content takes its place
+        await Blob.get_motor_collection().update_one(
+            {"sha256": blob.sha256, "ingested_index": blob.ingested_index, "ingested_filename": blob.ingested_filename},
+            {"$set": {"ingested_index": None, "ingested_filename": None, "updated_at": datetime.now()}},
+        )
+    return nb_chunks > 0
+
+
+async def release_blobs(index: str, references: List[Tuple[str, str]]) -> List[str]:
+    """Removes the references of collection files to their blobs, the blobs losing their last reference are removed
+
+    Args:
+        index (str): The collection id
+        references (List[Tuple[str, str]]): The SHA-256 of the content and the ingested name of each file
+
+    Returns:
+        List[str]: The objects of the removed blobs, to remove from the bucket
+    """
+    if len(references) == 0:
+        return []
+    collection = Blob.get_motor_collection()
+    # The chunks of the files are removed with them, they can no longer be copied
+    await collection.update_many(
+        {"ingested_index": index, "ingested_filename": {"$in": [filename for _, filename in references]}},
+        {"$set": {"ingested_index": None, "ingested_filename": None}},
+    )
+    current_date = datetime.now()
+    released = Counter(sha256 for sha256, _ in references)
+    await collection.bulk_write(
+        [
+            UpdateOne({"sha256": sha256}, {"$inc": {"ref_count": -count}, "$set": {"updated_at": current_date}})
+            for sha256, count in released.items()
+        ],
+        ordered=False,
+    )
+
+    # The blobs are only removed if no upload referenced them meanwhile, a later upload creates a new object
+    unreferenced = await collection.find(
+        {"sha256": {"$in": list(released)}, "ref_count": {"$lte": 0}}, {"sha256": 1}
+    ).to_list(length=None)
+    removed = await asyncio.gather(*[
+        collection.find_one_and_delete({"sha256": document["sha256"], "ref_count": {"$lte": 0}})
+        for document in unreferenced
+    ])
+    return [document["object_name"] for document in removed if document is not None]
+
+
+async def release_blob(sha256: str, index: str, filename: str):
+    """Removes the reference of a collection file to a blob, the blob and its object are removed with the last one
+
+    Args:
+        sha256 (str): The SHA-256 of the content
+        index (str): The collection id
+        filename (str): The name under which the file was ingested
+    """
+    object_names = await release_blobs(index, [(sha256, filename)])
+    if len(object_names) > 0:
+        try:
+            await run_in_executor(
+                object_storage_executor, remove_objects_from_bucket, COLLECTIONS_BUCKET_NAME, object_names
+            )
+        except Exception as e:
+            logger.error(f"Error while removing the object of the blob {sha256}")
+            raise e
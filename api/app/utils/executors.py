@@ -0,0 +1,189 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict
+
+from app.config.executors import (
+    INGESTION_CONCURRENCY,
+    OBJECT_STORAGE_WORKERS,
+    REDIS_WORKERS,
+    VECTOR_STORE_WORKERS,
+)
+
+
+class MonitoredThreadPoolExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that counts its queued, running and completed tasks
+
+    Args:
+        name (str): Name of the executor, used in the metrics and as threads name prefix
+        max_workers (int): Maximum number of threads
+    """
+
+    def __init__(self, name: str, max_workers: int) -> None:
+        super().__init__(max_workers=max_workers, thread_name_prefix=name)
+        self.name = name
+        self.max_workers = max_workers
+        self._stats_lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+
+    def _run(self, fn: Callable, *args, **kwargs):
+        with self._stats_lock:
+            self._queued -= 1
+            self._running += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._stats_lock:
+                self._running -= 1
+                self._completed += 1
+
+    def submit(self, fn: Callable, /, *args, **kwargs) -> Future:
+        with self._stats_lock:
+            self._queued += 1
+        try:
+            return super().submit(self._run, fn, *args, **kwargs)
+        except Exception as e:
+            with self._stats_lock:
+                self._queued -= 1
+            raise e
+
+    def get_stats(self) -> Dict[str, int]:
+        """Returns the counters of the executor
+
+        Returns:
+            Dict[str, int]: The maximum number of threads and the number of queued, running and completed tasks
+        """
+        with self._stats_lock:
+            return {
+                "max_workers": self.max_workers,
+                "queued": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+            }
+
+
+executors: Dict[str, MonitoredThreadPoolExecutor] = {}
+
+
+def create_executor(name: str, max_workers: int) -> MonitoredThreadPoolExecutor:
+    """Creates a named executor, registered for the metrics
+
+    Args:
+        name (str): Name of the executor
+        max_workers (int): Maximum number of threads
+
+    Returns:
+        MonitoredThreadPoolExecutor: The executor
+    """
+    executor = MonitoredThreadPoolExecutor(name=name, max_workers=max_workers)
+    executors[name] = executor
+    return executor
+
+
+# Executors of the blocking calls made from the event loop
+ingestion_executor = create_executor("ingestion", INGESTION_CONCURRENCY)
+object_storage_executor = create_executor("object_storage", OBJECT_STORAGE_WORKERS)
+vector_store_executor = create_executor("vector_store", VECTOR_STORE_WORKERS)
+redis_executor = create_executor("redis", REDIS_WORKERS)
+
+
+async def run_in_executor(executor: ThreadPoolExecutor, fn: Callable, *args, **kwargs) -> Any:
+    """Runs a blocking function in an executor without blocking the event loop, like asyncio.to_thread
+
+    Args:
+        executor (ThreadPoolExecutor): The executor
+        fn (Callable): The blocking function
+        *args: Its positional arguments
+        **kwargs: Its keyword arguments
+
+    Returns:
+        Any: The result of the function
+    """
+    return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+
+class AdmissionControl:
+    """Bounds the number of operations running at once in the process, the other ones wait for a slot
+
+    Args:
+        name (str): Name of the operations, used in the metrics
+        limit (int): Maximum number of operations running at once
+    """
+
+    def __init__(self, name: str, limit: int) -> None:
+        self.name = name
+        self.limit = limit
+        self._semaphore = None
+        self._waiting = 0
+        self._admitted = 0
+
+    @asynccontextmanager
+    async def slot(self, on_wait: Callable[[], None] = None) -> AsyncIterator[None]:
+        """Waits for a slot and holds it until the end of the block
+
+        Args:
+            on_wait (Callable[[], None], optional): Called when the operation has to wait for a slot
+        """
+        if self._semaphore is None:
+            # Created on first use so that it belongs to the event loop of the API
+            self._semaphore = asyncio.Semaphore(self.limit)
+        if self._semaphore.locked() and on_wait is not None:
+            on_wait()
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        self._admitted += 1
+        try:
+            yield
+        finally:
+            self._admitted -= 1
+            self._semaphore.release()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Returns the counters of the admission control
+
+        Returns:
+            Dict[str, int]: The limit and the number of admitted and waiting operations
+        """
+        return {
+            "limit": self.limit,
+            "admitted": self._admitted,
+            "waiting": self._waiting,
+        }
+
+
+# Files ingested at once by the process, it matches the ingestion executor size so that admitted files get a thread
+ingestion_admission = AdmissionControl("ingestion", INGESTION_CONCURRENCY)
+
+
+def notify_ingestion_wait(progress: Callable[[str, str], None] = None) -> Callable[[], None]:
+    """Builds the on_wait callback of the ingestion admission control, that tells the user the file is waiting
+
+    Args:
+        progress (Callable[[str, str], None], optional): Called with (stage, message) as the ingestion progresses
+
+    Returns:
+        Callable[[], None]: The callback, that does nothing without progress
+    """
+    def on_wait():
+        if progress is not None:
+            progress("admission", "En attente d'un créneau d'ingestion...")
+    return on_wait
+
+
+def get_executors_stats() -> Dict[str, Any]:
+    """Returns the metrics of all the executors and of the ingestion admission control
+
+    Returns:
+        Dict[str, Any]: The counters of each executor, by name, and the ingestion admission counters
+    """
+    return {
+        "executors": {name: executor.get_stats() for name, executor in executors.items()},
+        "admission": {ingestion_admission.name: ingestion_admission.get_stats()},
+    }
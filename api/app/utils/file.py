@@ -1,3 +1,8 @@
+import io
+import threading
+from typing import List, Optional, Tuple
+from urllib.parse import quote
+
 from fastapi import UploadFile as _UploadFile
 
 
@@ -29,3 +34,134 @@ class UploadFile(_UploadFile):
 
     async def close(self) -> None:  # noqa: D102
         await self._close()
+
+
+class SharedFileReader(io.RawIOBase):
+    """Reader of a file shared with other readers, each reader having its own position in the file
+
+    Args:
+        file (BinaryIO): The shared file, seekable
+        lock (threading.Lock): The lock shared by all the readers of the file
+        size (int): The size of the file
+    """
+
+    def __init__(self, file, lock: threading.Lock, size: int) -> None:
+        super().__init__()
+        self._file = file
+        self._lock = lock
+        self._size = size
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self._size + offset
+        else:
+            raise ValueError(f"Invalid whence ({whence})")
+        if position < 0:
+            raise ValueError(f"Negative seek position {position}")
+        self._position = position
+        return position
+
+    def read(self, size: int = -1) -> bytes:
+        # The position of the shared file is only moved while holding the lock
+        with self._lock:
+            self._file.seek(self._position)
+            data = self._file.read(size if size is not None else -1)
+        self._position += len(data)
+        return data
+
+    def readall(self) -> bytes:
+        return self.read(-1)
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def fork_upload_file(upload_file: _UploadFile, nb_readers: int = 2) -> List[_UploadFile]:
+    """Gives each consumer of an uploaded file (bucket upload, parsing...) its own reader of the file
+
+    The consumers read the file at the same time without copying it, each one at its own pace
+
+    Args:
+        upload_file (UploadFile): The uploaded file, spooled by the framework
+        nb_readers (int, optional): The number of readers
+
+    Returns:
+        List[UploadFile]: The uploaded files of the consumers, with the name, size and headers of the uploaded file
+    """
+    lock = threading.Lock()
+    size = upload_file.size
+    if size is None:
+        with lock:
+            size = upload_file.file.seek(0, io.SEEK_END)
+    return [
+        _UploadFile(
+            file=SharedFileReader(upload_file.file, lock, size),
+            size=size,
+            filename=upload_file.filename,
+            headers=upload_file.headers,
+        )
+        for _ in range(nb_readers)
+    ]
+
+
+def content_disposition(filename: str) -> str:
+    """Returns the Content-Disposition header value of a file downloaded as an attachment, like FileResponse
+
+    Args:
+        filename (str): The name of the file
+
+    Returns:
+        str: The header value
+    """
+    quoted_filename = quote(filename)
+    if quoted_filename != filename:
+        return f"attachment; filename*=utf-8''{quoted_filename}"
+    return f'attachment; filename="{filename}"'
+
+
+def parse_range_header(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parses the Range header of a download, only single byte ranges are supported
+
+    Args:
+        range_header (str, optional): The Range header value, e.g. "bytes=0-1023", "bytes=1024-" or "bytes=-512"
+        size (int): The size of the file
+
+    Returns:
+        Optional[Tuple[int, int]]: The first and last bytes of the range, None to send the whole file
+
+    Raises:
+        ValueError: If the range is outside the file
+    """
+    if range_header is None or not range_header.startswith("bytes=") or "," in range_header:
+        # Multiple ranges are not supported, the whole file is sent as the RFC 9110 allows it
+        return None
+    first, _, last = range_header[len("bytes="):].strip().partition("-")
+    if not all(bound == "" or bound.isdigit() for bound in (first, last)) or first == last == "":
+        return None
+    if first == "":
+        # Suffix range, the last bytes of the file
+        if int(last) == 0 or size == 0:
+            raise ValueError(f"Unsatisfiable range {range_header}")
+        return max(size - int(last), 0), size - 1
+    if int(first) >= size:
+        raise ValueError(f"Unsatisfiable range {range_header}")
+    end = min(int(last), size - 1) if last != "" else size - 1
+    if end < int(first):
+        return None
+    return int(first), end
@@ -0,0 +1,42 @@
+import hashlib
+import json
+import re
+import unicodedata
+from typing import Any, Dict
+
+
+def normalize_text(text: str) -> str:
+    """Normalizes a text before hashing it: unicode NFC form, collapsed whitespaces
+
+    Args:
+        text (str): Input text
+
+    Returns:
+        str: normalized text
+    """
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def text_hash(text: str) -> str:
+    """Returns the SHA-256 hex digest of the normalized text
+
+    Args:
+        text (str): Input text
+
+    Returns:
+        str: hash of the text
+    """
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def record_hash(record: Dict[str, Any]) -> str:
+    """Returns the SHA-256 hex digest of a record, its text being normalized
+
+    Args:
+        record (Dict[str, Any]): Input record, with a 'text' field
+
+    Returns:
+        str: hash of the record
+    """
+    record = {**record, "text": normalize_text(str(record["text"]))}
+    return hashlib.sha256(json.dumps(record, sort_keys=True, default=str).encode("utf-8")).hexdigest()
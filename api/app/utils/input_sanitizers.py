@@ -1,45 +1,203 @@
-from llm_guard import scan_prompt, scan_output
-from llm_guard.input_scanners import (
-    PromptInjection,
-    TokenLimit,
-    Toxicity,
-    BanTopics,
-    InvisibleText,
-)
-
-
-def sanitize_input(message: str) -> str | bool:
-    """Controls user's input  using LLM guard
-    Args:
-        text (str): User's input query
-
-    Returns:
-        str | bool : Filter on LLM_guard 
-    """
-    input_scanners = [
-        TokenLimit(limit=512),
-        InvisibleText(),
-    ]
-    sanitize_message, result_valid, result_score = scan_prompt(input_scanners, message)
-    if any(not result for result in result_valid.values()):
-        return False
-    else:
-        return True
-
-
-def sanitize_input_docs(text: str) -> str | bool :
-    """Controls user's input docs using LLM guard
-    Args:
-        text (str): document as a text
-
-    Returns:
-        str | bool : Filter on LLM_guard 
-    """
-    # Initialize scanners
-    input_scanners = [InvisibleText()]
-    sanitize_doc, result_valid, result_score = scan_prompt(input_scanners, text)
-    if any(not result for result in result_valid.values()):
-        # If the
-        return False
-    else:
-        return sanitize_doc
+import asyncio
+import hashlib
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from cachetools import LRUCache
+from llm_guard.input_scanners import (
+    PromptInjection,
+    TokenLimit,
+    Toxicity,
+    BanTopics,
+    InvisibleText,
+)
+
+from app.config.guard import GUARD_CACHE_SIZE, GUARD_MESSAGE_TOKEN_LIMIT, GUARD_WORKERS
+from app.utils.executors import create_executor
+
+# Scans are CPU bound and some scanners load models, they run on their own threads so that they neither block
+# the event loop nor compete with the default executor
+guard_executor = create_executor("guard", GUARD_WORKERS)
+
+
+class Guard:
+    """Runs a list of llm_guard input scanners, created once per process, and caches the verdicts
+
+    The scanners are built on first use, verdicts are kept in a bounded LRU keyed by the hash of the scanned text
+    and the time spent in each scanner is recorded.
+
+    Args:
+        name (str): Name of the guard, used in the metrics
+        scanner_factories (List[Callable[[], Any]]): Functions building the scanners, in the order they are run
+        cache_size (int): Maximum number of verdicts kept in memory
+    """
+
+    def __init__(self, name: str, scanner_factories: List[Callable[[], Any]], cache_size: int) -> None:
+        self.name = name
+        self._scanner_factories = scanner_factories
+        self._scanners = None
+        self._scanners_lock = threading.Lock()
+        self._verdicts = LRUCache(maxsize=cache_size)
+        self._verdicts_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._timings: Dict[str, Dict[str, float]] = {}
+        self._cache_hits = 0
+        self._cache_misses = 0
+
+    @property
+    def scanners(self) -> List[Any]:
+        if self._scanners is None:
+            with self._scanners_lock:
+                if self._scanners is None:
+                    self._scanners = [factory() for factory in self._scanner_factories]
+        return self._scanners
+
+    @staticmethod
+    def _key(text: str) -> str:
+        # The exact text is hashed: the sanitized text is cached along with the verdict
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _record_timing(self, scanner: str, elapsed: float):
+        with self._stats_lock:
+            timing = self._timings.setdefault(scanner, {"calls": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            timing["calls"] += 1
+            timing["total_seconds"] += elapsed
+            timing["max_seconds"] = max(timing["max_seconds"], elapsed)
+
+    def _run_scanners(self, text: str) -> Tuple[str, bool]:
+        # Same behaviour as llm_guard.scan_prompt (each scanner gets the output of the previous one),
+        # with the time spent in each scanner
+        sanitized = text
+        is_valid = True
+        for scanner in self.scanners:
+            start = time.perf_counter()
+            sanitized, scanner_valid, _ = scanner.scan(sanitized)
+            self._record_timing(type(scanner).__name__, time.perf_counter() - start)
+            is_valid = is_valid and scanner_valid
+        return sanitized, is_valid
+
+    def scan(self, text: str) -> Tuple[str, bool]:
+        """Scans a text, the verdict is taken from the cache when the text was already scanned
+
+        Args:
+            text (str): Input text
+
+        Returns:
+            Tuple[str, bool]: The sanitized text and whether all the scanners accepted the text
+        """
+        key = self._key(text)
+        with self._verdicts_lock:
+            verdict = self._verdicts.get(key)
+        with self._stats_lock:
+            if verdict is None:
+                self._cache_misses += 1
+            else:
+                self._cache_hits += 1
+        if verdict is None:
+            verdict = self._run_scanners(text)
+            with self._verdicts_lock:
+                self._verdicts[key] = verdict
+        return verdict
+
+    def scan_many(self, texts: List[str]) -> List[Tuple[str, bool]]:
+        """Scans a list of texts on the guard executor, each distinct text being scanned once
+
+        Must not be called from the guard executor itself.
+
+        Args:
+            texts (List[str]): Input texts
+
+        Returns:
+            List[Tuple[str, bool]]: The sanitized texts and their verdicts, in the same order as the texts
+        """
+        unique_texts = list(dict.fromkeys(texts))
+        verdicts = dict(zip(unique_texts, guard_executor.map(self.scan, unique_texts)))
+        return [verdicts[text] for text in texts]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Returns the cache counters and the time spent in each scanner
+
+        Returns:
+            Dict[str, Any]: The metrics of the guard
+        """
+        with self._stats_lock:
+            return {
+                "cache_hits": self._cache_hits,
+                "cache_misses": self._cache_misses,
+                "cache_entries": len(self._verdicts),
+                "scanners": {
+                    scanner: {
+                        **timing,
+                        "mean_seconds": timing["total_seconds"] / timing["calls"] if timing["calls"] > 0 else 0.0,
+                    }
+                    for scanner, timing in self._timings.items()
+                },
+            }
+
+
+message_guard = Guard(
+    name="message",
+    scanner_factories=[
+        lambda: TokenLimit(limit=GUARD_MESSAGE_TOKEN_LIMIT),
+        InvisibleText,
+    ],
+    cache_size=GUARD_CACHE_SIZE,
+)
+
+docs_guard = Guard(
+    name="docs",
+    scanner_factories=[InvisibleText],
+    cache_size=GUARD_CACHE_SIZE,
+)
+
+
+def warm_up_guards():
+    """Builds the scanners of all the guards, so that the first request does not pay for it"""
+    for guard in (message_guard, docs_guard):
+        guard.scanners
+
+
+def get_guard_stats() -> Dict[str, Any]:
+    """Returns the metrics of all the guards
+
+    Returns:
+        Dict[str, Any]: The metrics of each guard, by guard name
+    """
+    return {guard.name: guard.get_stats() for guard in (message_guard, docs_guard)}
+
+
+def sanitize_input(message: str) -> bool:
+    """Controls user's input  using LLM guard
+    Args:
+        message (str): User's input query
+
+    Returns:
+        bool : Whether the message passes the LLM guard filter
+    """
+    _, is_valid = guard_executor.submit(message_guard.scan, message).result()
+    return is_valid
+
+
+async def asanitize_input(message: str) -> bool:
+    """Controls user's input  using LLM guard | async version
+    Args:
+        message (str): User's input query
+
+    Returns:
+        bool : Whether the message passes the LLM guard filter
+    """
+    loop = asyncio.get_running_loop()
+    _, is_valid = await loop.run_in_executor(guard_executor, message_guard.scan, message)
+    return is_valid
+
+
+def sanitize_input_docs(texts: List[str]) -> List[str | bool]:
+    """Controls user's input docs using LLM guard
+    Args:
+        texts (List[str]): documents chunks as texts
+
+    Returns:
+        List[str | bool] : For each chunk, the sanitized text or False if it does not pass the LLM guard filter
+    """
+    return [sanitized if is_valid else False for sanitized, is_valid in docs_guard.scan_many(texts)]
@@ -1,7 +1,31 @@
+import base64
+import hashlib
+from collections import deque
+from concurrent.futures import wait
+from datetime import timedelta
+from typing import BinaryIO, Iterable, Iterator, Tuple
+
 from fastapi import UploadFile
+from minio.datatypes import Part
 from minio.deleteobjects import DeleteObject
 
-from app.config.minio import client as minio_client
+from app.config.logger import logger
+from app.config.minio import (
+    MINIO_MULTIPART_THRESHOLD,
+    MINIO_PART_SIZE,
+    MINIO_PRESIGNED_URL_EXPIRY,
+    MINIO_UPLOAD_CONCURRENCY,
+    client as minio_client,
+    presign_client,
+)
+from app.utils.executors import create_executor
+from app.utils.file import content_disposition
+
+# Parts of all the multipart uploads, the uploads themselves run on the object storage executor.
+# The multipart uploads use the private methods of the minio client (_create_multipart_upload, _upload_part, ...):
+# put_object neither sends the Content-MD5 of each part nor shares a bounded pool of parts between the uploads.
+# Their signatures are those of minio 7.2, pinned in requirements.txt
+upload_parts_executor = create_executor("object_storage_parts", MINIO_UPLOAD_CONCURRENCY)
 
 token_pattern = r'^[a-zA-Z0-9]{16}-[a-zA-Z0-9]{16}$'
 
@@ -30,6 +54,35 @@ def remove_files_from_bucket(bucket_name: str, prefix: str):
         print("An error occurred whi deleting object", error)
 
 
+def list_object_names(bucket_name: str, prefix: str) -> Iterator[str]:
+    """Lists the objects of a bucket with a specific prefix
+
+    Args:
+        bucket_name (str): The bucket name
+        prefix (str): The prefix
+
+    Returns:
+        Iterator[str]: The object names
+    """
+    return (item.object_name for item in minio_client.list_objects(bucket_name, prefix, recursive=True))
+
+
+def remove_objects_from_bucket(bucket_name: str, object_names: Iterable[str]):
+    """Removes objects from a bucket, minio sends them by batches of 1000 objects per request
+
+    Args:
+        bucket_name (str): The bucket name
+        object_names (Iterable[str]): The object names, they are consumed as the batches are sent
+
+    Raises:
+        IOError: If some objects could not be removed
+    """
+    errors = list(minio_client.remove_objects(bucket_name, (DeleteObject(name) for name in object_names)))
+    if len(errors) > 0:
+        logger.error(f"{len(errors)} objects could not be removed from {bucket_name}, first error: {errors[0]}")
+        raise IOError(f"{len(errors)} objects could not be removed from {bucket_name}")
+
+
 def upload_file_to_bucket(bucket_name: str, object_name: str, file: UploadFile):
     """Upload a file to the bucket
 
@@ -43,10 +96,130 @@ def upload_file_to_bucket(bucket_name: str, object_name: str, file: UploadFile):
 
     """
 
-    minio_client.put_object(
+    if file.size is not None and file.size >= MINIO_MULTIPART_THRESHOLD:
+        put_object_in_parts(bucket_name, object_name, file.file, file.size, file.content_type)
+    else:
+        minio_client.put_object(
+            bucket_name,
+            object_name,
+            file.file,
+            file.size,
+            file.content_type,
+        )
+
+
+def read_part(data: BinaryIO, size: int) -> bytes:
+    """Reads a part of a file, the reads are repeated until the part is complete or the file ends
+
+    Args:
+        data (BinaryIO): The file
+        size (int): The size of the part
+
+    Returns:
+        bytes: The part
+    """
+    chunks = []
+    remaining = size
+    while remaining > 0 and len(chunk := data.read(remaining)) > 0:
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def upload_part(bucket_name: str, object_name: str, upload_id: str, part_number: int, part_data: bytes) -> Part:
+    """Uploads a part of a multipart upload, with its MD5 checked by minio
+
+    Args:
+        bucket_name (str): The bucket name
+        object_name (str): The object name
+        upload_id (str): The multipart upload id
+        part_number (int): The part number, starting at 1
+        part_data (bytes): The content of the part
+
+    Returns:
+        Part: The part number and its etag
+    """
+    # minio rejects the part (BadDigest) when the received content does not match its Content-MD5
+    headers = {"Content-MD5": base64.b64encode(hashlib.md5(part_data).digest()).decode()}
+    etag = minio_client._upload_part(bucket_name, object_name, part_data, headers, upload_id, part_number)
+    return Part(part_number, etag)
+
+
+def put_object_in_parts(
+        bucket_name: str,
+        object_name: str,
+        data: BinaryIO,
+        length: int,
+        content_type: str = None,
+        part_size: int = MINIO_PART_SIZE,
+) -> Tuple[str, int]:
+    """Uploads a file to the bucket in parts uploaded concurrently on the parts executor
+
+    The file is read part after part, at most MINIO_UPLOAD_CONCURRENCY parts of the file are held in memory,
+    and the multipart upload is aborted if a part fails
+
+    Args:
+        bucket_name (str): The bucket name
+        object_name (str): The object name
+        data (BinaryIO): The file, read from its current position
+        length (int): The number of bytes to upload
+        content_type (str, optional): The content type of the object
+        part_size (int, optional): The size of the parts, except the last one
+
+    Returns:
+        Tuple[str, int]: The etag of the object and the number of parts
+    """
+    headers = {"Content-Type": content_type or "application/octet-stream"}
+    upload_id = minio_client._create_multipart_upload(bucket_name, object_name, headers)
+    uploads = deque()
+    parts = []
+    try:
+        uploaded_size = 0
+        part_number = 0
+        while uploaded_size < length:
+            if len(uploads) >= MINIO_UPLOAD_CONCURRENCY:
+                # We wait for the oldest part before reading the next one
+                parts.append(uploads.popleft().result())
+            part_number += 1
+            part_data = read_part(data, min(part_size, length - uploaded_size))
+            if len(part_data) == 0:
+                raise IOError(f"{object_name}: the file ended after {uploaded_size} bytes, {length} expected")
+            uploads.append(
+                upload_parts_executor.submit(
+                    upload_part, bucket_name, object_name, upload_id, part_number, part_data
+                )
+            )
+            uploaded_size += len(part_data)
+        parts.extend(upload.result() for upload in uploads)
+        result = minio_client._complete_multipart_upload(bucket_name, object_name, upload_id, parts)
+    except Exception as e:
+        logger.error(f"Error while uploading {object_name} in parts, the upload is aborted")
+        for upload in uploads:
+            upload.cancel()
+        # The parts already being uploaded cannot be cancelled, none of them must complete after the abort
+        wait(uploads)
+        try:
+            minio_client._abort_multipart_upload(bucket_name, object_name, upload_id)
+        except Exception:
+            logger.error(f"Error while aborting the multipart upload of {object_name}")
+        raise e
+    return result.etag, len(parts)
+
+
+def get_presigned_download_url(bucket_name: str, object_name: str, filename: str) -> str:
+    """Returns a presigned url from which the client downloads a file directly from minio
+
+    Args:
+        bucket_name (str): The bucket name
+        object_name (str): The object name
+        filename (str): The name under which the file is downloaded
+
+    Returns:
+        str: The url, valid for MINIO_PRESIGNED_URL_EXPIRY seconds
+    """
+    return presign_client.presigned_get_object(
         bucket_name,
         object_name,
-        file.file,
-        file.size,
-        file.content_type,
+        expires=timedelta(seconds=MINIO_PRESIGNED_URL_EXPIRY),
+        response_headers={"response-content-disposition": content_disposition(filename)},
     )
@@ -0,0 +1,54 @@
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+
+class ProgressStream:
+    """Forwards the progress messages emitted by ingestion threads to the event loop of a streaming response
+
+    Must be instantiated from the event loop.
+    """
+
+    def __init__(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._messages: asyncio.Queue[str] = asyncio.Queue()
+
+    def callback(self, label: str) -> Callable[[str, str], None]:
+        """Returns a thread-safe progress callback that prefixes its messages with a label
+
+        Args:
+            label (str): Label of the messages (usually the file name)
+
+        Returns:
+            Callable[[str, str], None]: The callback, called with (stage, message)
+        """
+
+        def on_progress(stage: str, message: str):
+            self._loop.call_soon_threadsafe(self._messages.put_nowait, f"{label} : {message}")
+
+        return on_progress
+
+    async def follow(self, awaitable: Awaitable[Any]) -> AsyncIterator[str]:
+        """Yields the progress messages until the awaitable completes
+
+        Args:
+            awaitable (Awaitable[Any]): The operation reporting its progress, its exception is raised if it fails
+
+        Returns:
+            AsyncIterator[str]: The progress messages
+        """
+        operation = asyncio.ensure_future(awaitable)
+        try:
+            while not operation.done():
+                next_message = asyncio.ensure_future(self._messages.get())
+                await asyncio.wait({operation, next_message}, return_when=asyncio.FIRST_COMPLETED)
+                if next_message.done():
+                    yield next_message.result()
+                else:
+                    next_message.cancel()
+            while not self._messages.empty():
+                yield self._messages.get_nowait()
+            # We raise the exception of the operation if any
+            operation.result()
+        finally:
+            if not operation.done():
+                operation.cancel()
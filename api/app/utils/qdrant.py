@@ -1,8 +1,10 @@
+from typing import Callable, Dict, List, Optional
+
 from fastapi import UploadFile
 from qdrant_client.http import models
 
 from app.config.qdrant import client as qdrant_client, BASE_COLLECTION_NAME
-from app.ds.parsing_loading_utils import ingest_data
+from app.ds.parsing_loading_utils import copy_recorded_chunks, ingest_data, update_data
 
 MODEL_NAMES = {
     "embed_model": "text-embedding-3-small",
@@ -29,7 +31,13 @@ def create_qdrant_collection_index(index: str):
     )
 
 
-def ingest_file(index: str, file: UploadFile, filename: str = None, preprocessed: bool = False):
+def ingest_file(
+        index: str,
+        file: UploadFile,
+        filename: str = None,
+        preprocessed: bool = False,
+        progress: Optional[Callable[[str, str], None]] = None,
+):
     """Ingest a file into the Qdrant vector store
 
     Args:
@@ -37,6 +45,7 @@ def ingest_file(index: str, file: UploadFile, filename: str = None, preprocessed
         file (UploadFile): File to ingest
         filename (str, optional): File name, defaults to file.filename
         preprocessed (bool, optional): Whether the file is already preprocessed
+        progress (Callable[[str, str], None], optional): Called with (stage, message) as the ingestion progresses
 
     Returns:
         None
@@ -50,7 +59,60 @@ def ingest_file(index: str, file: UploadFile, filename: str = None, preprocessed
         embedding_model=MODEL_NAMES["embed_model"],
         fiab_model=MODEL_NAMES["fiab_llm_model"],
         apply_fiab=True,
-        preprocessed=preprocessed
+        preprocessed=preprocessed,
+        progress=progress,
+    )
+
+
+def update_file(
+        index: str,
+        file: UploadFile,
+        filename: str,
+        progress: Optional[Callable[[str, str], None]] = None,
+) -> Dict[str, int]:
+    """Replaces a file already ingested into the Qdrant vector store by its new version
+
+    Args:
+        index (str): User token or collection id
+        file (UploadFile): New version of the file
+        filename (str): The name under which the file was ingested
+        progress (Callable[[str, str], None], optional): Called with (stage, message) as the update progresses
+
+    Returns:
+        Dict[str, int]: The number of chunks added, removed and unchanged
+
+    """
+
+    return update_data(
+        filename=filename,
+        data=file.file,
+        index=index,
+        embedding_model=MODEL_NAMES["embed_model"],
+        fiab_model=MODEL_NAMES["fiab_llm_model"],
+        apply_fiab=True,
+        progress=progress,
+    )
+
+
+def copy_file(source_index: str, source_filename: str, index: str, filename: str) -> int:
+    """Records in the Qdrant vector store the chunks of a file already ingested with the same content
+
+    Args:
+        source_index (str): User token or collection id under which the chunks were recorded
+        source_filename (str): The name under which the chunks were recorded
+        index (str): User token or collection id
+        filename (str): The name under which the file is ingested
+
+    Returns:
+        int: The number of chunks recorded, 0 when the source file has no chunks anymore
+
+    """
+
+    return copy_recorded_chunks(
+        source_index=source_index,
+        source_filename=source_filename,
+        index=index,
+        filename=filename,
     )
 
 
@@ -75,12 +137,12 @@ def remove_qdrant_index(index: str):
     )
 
 
-def remove_files_from_qdrant_index(index: str, filename: str):
-    """Removes a file from a specific qdrant index
+def remove_files_from_qdrant_index(index: str, filenames: List[str]):
+    """Removes files from a specific qdrant index, with a single request
 
     Args:
         index (str): The index
-        filename (str): The filename
+        filenames (List[str]): The filenames
 
     Returns:
         None
@@ -97,7 +159,7 @@ def remove_files_from_qdrant_index(index: str, filename: str):
                     ),
                     models.FieldCondition(
                         key="filename",
-                        match=models.MatchValue(value=str(filename)),
+                        match=models.MatchAny(any=[str(filename) for filename in filenames]),
                     ),
                 ],
             )
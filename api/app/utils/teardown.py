@@ -0,0 +1,158 @@
+import asyncio
+import itertools
+from typing import Awaitable, Dict, List, Optional, Set
+
+from app.config.logger import logger
+from app.config.minio import COLLECTIONS_BUCKET_NAME
+from app.ds.answer_cache import bump_index_version_async
+from app.models.documents.collection import Collection, CollectionFile
+from app.utils.blobs import release_blobs
+from app.utils.executors import object_storage_executor, run_in_executor, vector_store_executor
+from app.utils.minio import list_object_names, remove_objects_from_bucket
+from app.utils.qdrant import remove_files_from_qdrant_index, remove_qdrant_index
+
+
+def get_ingested_filename(collection_file: CollectionFile) -> str:
+    """Returns the name under which a collection file is recorded in qdrant
+
+    Args:
+        collection_file (CollectionFile): The collection file
+
+    Returns:
+        str: The file id followed by its extension
+    """
+    return f"{collection_file.id}{collection_file.extension if collection_file.extension else ''}"
+
+
+def remove_collection_objects(collection_id: str, blob_object_names: List[str], legacy_file_ids: Optional[Set[str]]):
+    """Removes the objects of collection files from the bucket, all of them within the same batched removal
+
+    Args:
+        collection_id (str): The collection id
+        blob_object_names (List[str]): The objects of the blobs that lost their last reference
+        legacy_file_ids (Set[str], optional): The files uploaded before the blobs, stored under their own prefix,
+            None for all the files of the collection
+    """
+    if legacy_file_ids is None:
+        legacy_object_names = list_object_names(COLLECTIONS_BUCKET_NAME, f"collections/{collection_id}/")
+    elif len(legacy_file_ids) > 0:
+        # A single listing of the collection files instead of one per file, the object names are
+        # collections/{collection_id}/file/{file_id}/{name}
+        legacy_object_names = (
+            object_name
+            for object_name in list_object_names(COLLECTIONS_BUCKET_NAME, f"collections/{collection_id}/file/")
+            if object_name.split("/")[3] in legacy_file_ids
+        )
+    else:
+        legacy_object_names = []
+    remove_objects_from_bucket(COLLECTIONS_BUCKET_NAME, itertools.chain(blob_object_names, legacy_object_names))
+
+
+async def run_teardown_steps(steps: Dict[str, Awaitable]):
+    """Runs teardown steps concurrently, each step goes to its end even if another one fails
+
+    Args:
+        steps (Dict[str, Awaitable]): The steps, by name
+
+    Raises:
+        RuntimeError: If some steps failed
+    """
+    results = await asyncio.gather(*steps.values(), return_exceptions=True)
+    failed = [name for name, result in zip(steps, results) if isinstance(result, BaseException)]
+    for name, result in zip(steps, results):
+        if isinstance(result, BaseException):
+            logger.error(f"Teardown step {name} failed: {result!r}")
+    if len(failed) > 0:
+        raise RuntimeError(f"Teardown steps {failed} failed")
+
+
+async def remove_files_objects(collection_id: str, files: List[CollectionFile], whole_collection: bool):
+    """Releases the blobs of collection files and removes the objects that are no longer referenced | async version
+
+    Args:
+        collection_id (str): The collection id
+        files (List[CollectionFile]): The files
+        whole_collection (bool): Whether all the files of the collection are removed
+    """
+    blob_object_names = await release_blobs(
+        collection_id,
+        [(file.blob_sha256, get_ingested_filename(file)) for file in files if file.blob_sha256 is not None],
+    )
+    legacy_file_ids = None if whole_collection else {str(file.id) for file in files if file.blob_sha256 is None}
+    await run_in_executor(
+        object_storage_executor, remove_collection_objects, collection_id, blob_object_names, legacy_file_ids
+    )
+
+
+async def remove_files_records(
+    collection_id: str,
+    files: List[CollectionFile],
+    remove_records: Awaitable,
+    whole_collection: bool,
+):
+    """Removes collection files from mongodb, then releases their blobs and removes their objects | async version
+
+    The blobs are only released once the files are no longer recorded: a removal retried after a failure does not
+    find the files again, so their blobs are never released twice
+
+    Args:
+        collection_id (str): The collection id
+        files (List[CollectionFile]): The files
+        remove_records (Awaitable): The removal of the files from mongodb
+        whole_collection (bool): Whether all the files of the collection are removed
+    """
+    await remove_records
+    await remove_files_objects(collection_id, files, whole_collection=whole_collection)
+
+
+async def teardown_files(collection: Collection, files: List[CollectionFile]):
+    """Removes files of a collection from qdrant, concurrently with their removal from mongodb then minio
+
+    Args:
+        collection (Collection): The collection
+        files (List[CollectionFile]): The files to remove
+
+    Raises:
+        RuntimeError: If some removals failed
+    """
+    collection_id = str(collection.id)
+    try:
+        await run_teardown_steps({
+            "qdrant": run_in_executor(
+                vector_store_executor,
+                remove_files_from_qdrant_index,
+                collection_id,
+                [get_ingested_filename(file) for file in files],
+            ),
+            "mongodb and minio": remove_files_records(
+                collection_id,
+                files,
+                collection.update({"$pull": {"files": {"_id": {"$in": [file.id for file in files]}}}}),
+                whole_collection=False,
+            ),
+        })
+    finally:
+        # The answers cached for the collection no longer match its files
+        await bump_index_version_async(collection_id)
+
+
+async def teardown_collection(collection: Collection):
+    """Removes a collection and all its files from qdrant, concurrently with their removal from mongodb then minio
+
+    Args:
+        collection (Collection): The collection
+
+    Raises:
+        RuntimeError: If some removals failed
+    """
+    collection_id = str(collection.id)
+    try:
+        await run_teardown_steps({
+            "qdrant": run_in_executor(vector_store_executor, remove_qdrant_index, collection_id),
+            "mongodb and minio": remove_files_records(
+                collection_id, collection.files, collection.delete(), whole_collection=True
+            ),
+        })
+    finally:
+        # The answers cached for the collection are removed
+        await bump_index_version_async(collection_id)
@@ -0,0 +1,166 @@
+"""Ingestion worker: executes the ingestion jobs enqueued by the API when INGESTION_MODE is 'queue'
+
+Run it with `python -m app.worker`, as many worker processes as needed can be started
+"""
+import shutil
+import signal
+import threading
+from tempfile import SpooledTemporaryFile
+from typing import Any, Dict
+
+from app.config.jobs import JOBS_LEASE_TIMEOUT, JOBS_WORKER_CONCURRENCY
+from app.config.logger import logger
+from app.config.minio import client as minio_client
+from app.ds.answer_cache import bump_index_version
+from app.ds.ingestion_jobs import JobProgress, claim_job, complete_job, fail_job, heartbeat, requeue_expired_jobs
+from app.ds.parsing_loading_utils import ingest_data, update_data
+from app.ds.parsing_pool import shutdown_parsing_pool, start_parsing_pool
+from app.utils.input_sanitizers import warm_up_guards
+from app.utils.qdrant import MODEL_NAMES
+
+# Files bigger than this are spilled to disk while they are ingested
+SPOOL_MAX_SIZE = 16 * 1024 * 1024
+
+
+class IngestionWorker:
+    """Claims ingestion jobs from the queue and executes them, `concurrency` at a time
+
+    The leases of the running jobs are renewed while they are executed, a job whose worker is killed is put back
+    in the queue once its lease expires.
+
+    Args:
+        concurrency (int): Number of jobs executed concurrently
+    """
+
+    def __init__(self, concurrency: int) -> None:
+        self.concurrency = concurrency
+        self._stop = threading.Event()
+        self._running = set()
+        self._running_lock = threading.Lock()
+
+    def stop(self, *args):
+        """Stops claiming new jobs, the running ones are completed"""
+        logger.info("Ingestion worker stopping, waiting for the running jobs...")
+        self._stop.set()
+
+    @staticmethod
+    def _remove_source(job: Dict[str, Any]):
+        try:
+            minio_client.remove_object(job["bucket_name"], job["object_name"])
+        except Exception as e:
+            logger.warning(f"Error while removing the file of the ingestion job {job['id']}: {e}")
+
+    @staticmethod
+    def execute(job: Dict[str, Any]):
+        """Ingests the file of a job, or replaces the file already ingested for an 'update' job
+
+        Args:
+            job (Dict[str, Any]): The job
+        """
+        progress = JobProgress(job["id"])
+        try:
+            with SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as data:
+                response = minio_client.get_object(job["bucket_name"], job["object_name"])
+                try:
+                    shutil.copyfileobj(response, data)
+                finally:
+                    response.close()
+                    response.release_conn()
+                if job.get("operation") == "update":
+                    update_data(
+                        filename=job["filename"],
+                        data=data,
+                        index=job["index"],
+                        embedding_model=MODEL_NAMES["embed_model"],
+                        fiab_model=MODEL_NAMES["fiab_llm_model"],
+                        apply_fiab=True,
+                        progress=progress,
+                    )
+                else:
+                    ingest_data(
+                        filename=job["filename"],
+                        data=data,
+                        index=job["index"],
+                        embedding_model=MODEL_NAMES["embed_model"],
+                        fiab_model=MODEL_NAMES["fiab_llm_model"],
+                        apply_fiab=True,
+                        preprocessed=job["preprocessed"],
+                        progress=progress,
+                    )
+        finally:
+            progress.close()
+            # The answers cached for the index no longer match its files
+            bump_index_version(job["index"])
+
+    def _run_jobs(self):
+        while not self._stop.is_set():
+            try:
+                job = claim_job(timeout=5)
+            except Exception as e:
+                logger.error(f"Error while claiming an ingestion job: {e}")
+                self._stop.wait(5)
+                continue
+            if job is None:
+                continue
+
+            with self._running_lock:
+                self._running.add(job["id"])
+            logger.info(f"Ingestion job {job['id']} started (attempt {job['attempts']}/{job['max_attempts']})")
+            try:
+                self.execute(job)
+                complete_job(job["id"])
+                logger.info(f"Ingestion job {job['id']} succeeded")
+                if job["delete_source"]:
+                    self._remove_source(job)
+            except Exception as e:
+                logger.exception(f"Ingestion job {job['id']} failed")
+                if fail_job(job["id"], repr(e)) and job["delete_source"]:
+                    self._remove_source(job)
+            finally:
+                with self._running_lock:
+                    self._running.discard(job["id"])
+
+    def run(self):
+        """Runs the worker until it is stopped"""
+        threads = [
+            threading.Thread(target=self._run_jobs, name=f"ingestion-job-{i}") for i in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        logger.info(f"Ingestion worker started with {self.concurrency} concurrent jobs")
+
+        # The main thread renews the leases of the running jobs and recovers the jobs of the dead workers
+        while any(thread.is_alive() for thread in threads):
+            try:
+                with self._running_lock:
+                    running = list(self._running)
+                if len(running) > 0:
+                    heartbeat(running)
+                expired = requeue_expired_jobs()
+                if len(expired) > 0:
+                    logger.warning(f"Ingestion jobs {expired} were abandoned by their worker, they are retried")
+            except Exception as e:
+                logger.error(f"Error while maintaining the ingestion jobs leases: {e}")
+            self._stop.wait(JOBS_LEASE_TIMEOUT / 3)
+            # Once stopping, we keep renewing the leases until the running jobs are completed
+            if self._stop.is_set():
+                for thread in threads:
+                    thread.join(timeout=JOBS_LEASE_TIMEOUT / 3)
+                    if thread.is_alive():
+                        break
+
+
+def main():
+    start_parsing_pool()
+    warm_up_guards()
+    worker = IngestionWorker(concurrency=JOBS_WORKER_CONCURRENCY)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    try:
+        worker.run()
+    finally:
+        shutdown_parsing_pool()
+
+
+if __name__ == "__main__":
+    main()
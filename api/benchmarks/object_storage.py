@@ -0,0 +1,64 @@
+"""Compares the throughput of the minio put_object with the parallel multipart upload of app.utils.minio
+
+Usage (from the api directory, with the MINIO_* variables of a running minio):
+    docker run -d -p 9000:9000 -e MINIO_ROOT_USER=minio -e MINIO_ROOT_PASSWORD=minio123 minio/minio server /data
+    MINIO_ENDPOINT=localhost:9000 MINIO_ACCESS_KEY=minio MINIO_SECRET_KEY=minio123 \\
+        python -m benchmarks.object_storage [--sizes 8 64 256] [--part-sizes 8 16 32] [--repeat N]
+
+The sizes are in MiB. The objects are uploaded to a temporary bucket, removed at the end.
+"""
+import argparse
+import os
+import statistics
+import time
+import uuid
+from io import BytesIO
+
+from app.config.minio import MINIO_UPLOAD_CONCURRENCY, client as minio_client
+from app.utils.minio import put_object_in_parts, remove_files_from_bucket
+
+MIB = 1024 * 1024
+
+
+def measure(function, repeat: int) -> float:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[8, 64, 256], help="Sizes of the files, in MiB")
+    parser.add_argument("--part-sizes", type=int, nargs="+", default=[8, 16, 32], help="Sizes of the parts, in MiB")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs, the median duration is reported")
+    args = parser.parse_args()
+
+    bucket_name = f"benchmark-{uuid.uuid4().hex[:8]}"
+    minio_client.make_bucket(bucket_name)
+    print(f"Parallel parts: {MINIO_UPLOAD_CONCURRENCY} (MINIO_UPLOAD_CONCURRENCY)")
+    print(f"{'size (MiB)':>10} {'method':<22} {'time (s)':>9} {'MiB/s':>8}")
+    try:
+        for size in args.sizes:
+            content = os.urandom(size * MIB)
+            candidates = {
+                "put_object": lambda: minio_client.put_object(
+                    bucket_name, "put_object", BytesIO(content), len(content)
+                ),
+            }
+            for part_size in args.part_sizes:
+                candidates[f"parts of {part_size} MiB"] = lambda part_size=part_size: put_object_in_parts(
+                    bucket_name, f"parts-{part_size}", BytesIO(content), len(content), part_size=part_size * MIB
+                )
+            for name, function in candidates.items():
+                duration = measure(function, args.repeat)
+                print(f"{size:>10} {name:<22} {duration:>9.3f} {size / duration:>8.1f}")
+    finally:
+        remove_files_from_bucket(bucket_name, "")
+        minio_client.remove_bucket(bucket_name)
+
+
+if __name__ == "__main__":
+    main()
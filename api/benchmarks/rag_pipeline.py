@@ -0,0 +1,62 @@
+"""Compares the setup time of a chat message with a RAG pipeline built per message and with the pipelines registry
+
+Only the setup is measured (models, vector store, index, prompts and query engine), no LLM is called.
+
+Usage (from the api directory, with the QDRANT_* and MODELS_* variables of a running qdrant):
+    docker run -d -p 6333:6333 qdrant/qdrant
+    QDRANT_ENDPOINT=http://localhost:6333 QDRANT_BASE_COLLECTION_NAME=benchmark \\
+        MODELS_EMBED=text-embedding-3-small MODELS_LLM=mixtral-instruct \\
+        python -m benchmarks.rag_pipeline [--workflows classique check] [--repeat N]
+"""
+import argparse
+import statistics
+import time
+import uuid
+
+from app.config.qdrant import BASE_COLLECTION_NAME
+from app.config.rag import MODELS
+from app.ds.rag_pipeline import RAG_PIPELINES, get_rag_pipeline
+
+
+def measure(function, repeat: int) -> float:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workflows", nargs="+", default=list(RAG_PIPELINES), help="Workflows to measure")
+    parser.add_argument("--repeat", type=int, default=50, help="Number of messages, the median duration is reported")
+    args = parser.parse_args()
+
+    print(f"{'workflow':<10} {'setup':<12} {'time (ms)':>10}")
+    for workflow in args.workflows:
+        candidates = {
+            # The pipeline is built for every message, as before the registry
+            "per message": lambda workflow=workflow: RAG_PIPELINES[workflow](
+                collection_name=BASE_COLLECTION_NAME,
+                embed_model_name=MODELS["embed_model"],
+                llm_model_name=MODELS["llm_model"],
+                filters={"index": uuid.uuid4().hex},
+            ).get_query_engine(),
+            # The shared pipeline is only bound to the index of the message
+            "registry": lambda workflow=workflow: get_rag_pipeline(
+                workflow=workflow,
+                collection_name=BASE_COLLECTION_NAME,
+                filters={"index": uuid.uuid4().hex},
+                model_names=MODELS,
+            ).get_query_engine(),
+        }
+        # The first message builds the shared pipeline, it is not part of the measure
+        candidates["registry"]()
+        for name, function in candidates.items():
+            duration = measure(function, args.repeat)
+            print(f"{workflow:<10} {name:<12} {duration * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Compares the native .txt / .md chunker with the unstructured one
+
+Usage (from the api directory):
+    python -m benchmarks.text_chunker [FILE ...] [--repeat N]
+
+Without files, a synthetic markdown corpus is generated.
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from io import BytesIO
+
+from app.ds.parsers import CHUNKING_PARAMS, elements_to_records, partition_file
+from app.ds.text_chunker import chunk_text_file
+
+WORDS = "le la les un une des document fichier texte analyse données collection recherche modèle réponse".split()
+
+
+def synthetic_markdown(nb_sections: int = 200) -> bytes:
+    random.seed(0)
+    sections = []
+    for i in range(nb_sections):
+        paragraphs = [
+            " ".join(random.choice(WORDS) for _ in range(random.randint(20, 400)))
+            for _ in range(random.randint(1, 5))
+        ]
+        items = [f"- {' '.join(random.choice(WORDS) for _ in range(8))}" for _ in range(random.randint(0, 4))]
+        sections.append("\n\n".join([f"## Section {i}", *paragraphs, "\n".join(items)]))
+    return "\n\n".join(["# Corpus", *sections]).encode("utf-8")
+
+
+def measure(function, repeat: int):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        records = function()
+        durations.append(time.perf_counter() - start)
+    return records, statistics.median(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help=".txt or .md files")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs, the median duration is reported")
+    args = parser.parse_args()
+
+    if len(args.files) > 0:
+        inputs = [(os.path.basename(path), open(path, "rb").read()) for path in args.files]
+    else:
+        inputs = [("synthetic.md", synthetic_markdown())]
+
+    print(f"{'file':<30} {'size (kB)':>10} {'chunker':<12} {'chunks':>7} {'mean len':>9} {'time (s)':>9} {'MB/s':>7}")
+    for filename, content in inputs:
+        candidates = {
+            "unstructured": lambda: elements_to_records(partition_file(filename, BytesIO(content))),
+            "native": lambda: chunk_text_file(filename, content, CHUNKING_PARAMS),
+        }
+        durations = {}
+        for name, function in candidates.items():
+            records, duration = measure(function, args.repeat)
+            durations[name] = duration
+            mean_length = statistics.mean(len(record["text"]) for record in records) if len(records) > 0 else 0
+            print(
+                f"{filename:<30} {len(content) / 1024:>10.1f} {name:<12} {len(records):>7} {mean_length:>9.0f} "
+                f"{duration:>9.3f} {len(content) / 1e6 / duration:>7.2f}"
+            )
+        print(f"{filename:<30} speedup x{durations['unstructured'] / durations['native']:.1f}")
+
+
+if __name__ == "__main__":
+    main()